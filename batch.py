@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+
+'''Schedule a season of events in one go: every config in a directory, in parallel.
+
+Each config is built and solved in its own worker process (a fresh one per event),
+and gets its own output directory, <outdir>/<config name>/, with the schedule CSVs
+and a log of everything the model and solver printed. The summary, one row per
+event, goes to <outdir>/summary.csv as the events finish, and is printed at the end.
+
+Configs which fail the preflight checks are reported without solving.'''
+
+import os
+import sys
+import csv
+import glob
+import time
+import traceback
+import contextlib
+import multiprocessing
+
+from schedulingModel import ScheduleModel, checkSchedule
+from preflight import Preflight
+from benchmark import makeSolver, runSolver
+
+summaryFields = ('config', 'status', 'teams', 'matches', 'seconds', 'duplicateTables', 'minTravel', 'notes')
+
+
+def scheduleEvent(task):
+    '''Schedule one config (the worker). task is (configFile, outDir, engine, timeLimit, slotModel).
+    Returns the summary row; errors are reported in it, not raised.'''
+
+    configFile, outDir, engine, timeLimit, slotModel = task
+    name = os.path.splitext(os.path.basename(configFile))[0]
+    eventDir = os.path.join(outDir, name)
+    os.makedirs(eventDir, exist_ok=True)
+
+    row = {'config': name, 'status': 'error', 'notes': ''}
+    startT = time.time()
+    with open(os.path.join(eventDir, 'log.txt'), 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            config = {}
+            with open(configFile, 'rb') as file:
+                exec(file.read(), None, config)
+
+            model = ScheduleModel(config, slotModel=slotModel)
+            row['teams'] = len(model.teams)
+            row['matches'] = len(model.matchList.matches)
+
+            preflight = Preflight(model)
+            problems = preflight.check()
+            if problems:
+                preflight.report(sys.stdout)
+                row['status'] = 'infeasible'
+                row['notes'] = problems[0] + (' (+{} more)'.format(len(problems) - 1) if len(problems) > 1 else '')
+            else:
+                solver = makeSolver(engine, model)
+                if not runSolver(engine, solver, timeLimit):
+                    row['status'] = 'no solution'
+                    row['notes'] = 'nothing found in {}s'.format(timeLimit)
+                else:
+                    solver.assignResults()
+                    row['status'] = 'ok' if checkSchedule(model) else 'check failed'
+                    model.writeOutput(os.path.join(eventDir, 'schedule'))
+                    row['duplicateTables'] = sum([t.countDuplicateTables() for t in model.teams])
+                    row['minTravel'] = min([t.travelTime() for t in model.teams])
+        except SystemExit as e:
+            # the model exits on configs it cannot build; its message is in the log
+            row['notes'] = 'exit {}, see log.txt'.format(e.code)
+        except Exception as e:
+            traceback.print_exc()
+            row['notes'] = '{}: {}'.format(type(e).__name__, e)
+
+    row['seconds'] = round(time.time() - startT, 1)
+    return row
+
+
+class BatchScheduler(object):
+    def __init__(self, configFiles, outDir, engine='mip', timeLimit=600, slotModel=False, jobs=None):
+        self.configFiles = configFiles
+        self.outDir = outDir
+        self.engine = engine
+        self.timeLimit = timeLimit
+        self.slotModel = slotModel
+        self.jobs = jobs or os.cpu_count() or 1
+        self.rows = []
+        return
+
+    def run(self):
+        '''Schedule all the configs. Returns the summary rows, in config order.'''
+
+        os.makedirs(self.outDir, exist_ok=True)
+        tasks = [(f, self.outDir, self.engine, self.timeLimit, self.slotModel) for f in self.configFiles]
+
+        self.rows = []
+        with open(os.path.join(self.outDir, 'summary.csv'), 'w', newline='') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=summaryFields)
+            writer.writeheader()
+            outfile.flush()
+
+            # a fresh process per event: the solvers hold on to a lot of memory
+            with multiprocessing.Pool(min(self.jobs, len(tasks)), maxtasksperchild=1) as pool:
+                for row in pool.imap_unordered(scheduleEvent, tasks):
+                    writer.writerow(row)
+                    outfile.flush()
+                    self.rows.append(row)
+                    print('{}: {} ({}s, {} of {} done)'.format(
+                        row['config'], row['status'], row['seconds'], len(self.rows), len(tasks)), file=sys.stderr)
+
+        order = {os.path.splitext(os.path.basename(f))[0]: i for i, f in enumerate(self.configFiles)}
+        self.rows.sort(key=lambda r: order[r['config']])
+        return self.rows
+
+    def report(self, outfile=sys.stdout):
+        outfile.write('{:24s} {:12s} {:>5s} {:>7s} {:>8s} {:>5s} {:>6s}  {}\n'.format(
+            'Config', 'Status', 'Teams', 'Matches', 'Seconds', 'Dups', 'Travel', 'Notes'))
+        for r in self.rows:
+            outfile.write('{:24s} {:12s} {:>5} {:>7} {:>8} {:>5} {:>6}  {}\n'.format(
+                r['config'], r['status'], r.get('teams', ''), r.get('matches', ''), r['seconds'],
+                r.get('duplicateTables', ''), r.get('minTravel', ''), r['notes']))
+        nOK = sum([1 for r in self.rows if r['status'] == 'ok'])
+        outfile.write('{} of {} events scheduled\n'.format(nOK, len(self.rows)))
+        return
+
+
+# ====================================================================================================
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Schedule many FLL events (config files) in parallel')
+    parser.add_argument('-o', '--outdir', default='batch', help='Output directory, one subdirectory per event (default batch)')
+    parser.add_argument('-j', '--jobs', type=int, help='Events solved at once (default: number of cores)')
+    parser.add_argument('--engine', choices=('mip', 'lazy', 'cpsat', 'decomp', 'anneal', 'pairing'), default='mip',
+                        help='Solver engine (default mip)')
+    parser.add_argument('--time-limit', type=int, default=600, help='Time limit per event (seconds, default 600)')
+    parser.add_argument('-s', '--slots', action='store_true',
+                        help='Use the slot-based match model (fewer binaries, many more rows)')
+    parser.add_argument('configs', nargs='+', help='Config files, or directories of them (*.py)')
+
+    args = parser.parse_args()
+
+    configFiles = []
+    for c in args.configs:
+        if os.path.isdir(c):
+            configFiles.extend(sorted(glob.glob(os.path.join(c, '*.py'))))
+        else:
+            configFiles.append(c)
+    if not configFiles:
+        parser.error('no config files (*.py) in {}'.format(' '.join(args.configs)))
+    names = [os.path.splitext(os.path.basename(f))[0] for f in configFiles]
+    if len(set(names)) != len(names):
+        parser.error('config file names must be unique, they name the output directories')
+
+    batch = BatchScheduler(configFiles, args.outdir, engine=args.engine, timeLimit=args.time_limit,
+                           slotModel=args.slots, jobs=args.jobs)
+    batch.run()
+    batch.report()
+    sys.exit(0 if all([r['status'] == 'ok' for r in batch.rows]) else 1)
@@ -0,0 +1,315 @@
+#!/usr/bin/python3
+
+'''Generate FLL configs over a grid of sizes and layouts, and time each stage on them.
+
+For each config this records the model build time and size (GMPL text, and the PuLP
+model's variables, constraints and nonzeros), the solve time of each engine, and the
+time to parse a solution file and write the output. The report is a CSV file with one
+row per config, written as it goes, so a long run can be watched or cut short.
+
+The generated configs are sized to be plausible (judge rooms for about 4 sessions in
+the morning, enough tables to finish the matches in the day), not guaranteed to be
+feasible. The "found" columns say which engines got a schedule.'''
+
+import io
+import os
+import sys
+import csv
+import math
+import time
+import pprint
+import tempfile
+import itertools
+import contextlib
+
+from schedulingModel import ScheduleModel
+
+eventNames = ('Robot Design', 'Core Values', 'Project', 'Technical')
+subEventNames = ('Technical', 'CoreValues', 'Project')
+fieldColours = ('Blue', 'Green', 'Red', 'Purple', 'Orange', 'Yellow', 'White', 'Black', 'Silver', 'Gold')
+
+
+def generateConfig(nTeams, nEvents=1, subEvents=False, tables=(2, 2), gamesPerTeam=3, breaks='lunch', nBlocks=0):
+    '''Build a config dict, in the same form as the config files.
+
+    tables: (number of table sets, fields per set), as in matchInfo['tableNames'].
+    breaks: 'none', 'lunch', or 'full' (lunch plus a break mid morning and mid afternoon).
+    nBlocks: number of scheduleBlocks, splitting the day evenly (0 for none).'''
+
+    lunch = (('12:00', '12:45'), )
+    matchBreaks = ()
+    judgeBreaks = ()
+    if breaks in ('lunch', 'full'):
+        matchBreaks = lunch
+        judgeBreaks = lunch
+    if breaks == 'full':
+        matchBreaks = (('10:30', '10:45'), ) + lunch + (('14:30', '14:45'), )
+
+    judgeEvents = []
+    if subEvents:
+        # one judging block, rotating through the sub-events like the templates
+        nSub = len(subEventNames)
+        nSess = 4
+        # the rotation needs at least as many rooms as sub-events
+        roomsPerSub = max(nSub, int(math.ceil(float(nTeams) / nSess / nSub)))
+        judgeSpan = int(math.ceil(float(nTeams) / (nSub * roomsPerSub))) * 20 * nSub
+        judgeEvents.append({'name': 'Judging',
+                            'sessionLen': 20 * nSub - 10,
+                            'sessionBreak': 10,
+                            'rooms': range(nSub * roomsPerSub),
+                            'breakTimes': judgeBreaks,
+                            'subEvents': {
+                                'sessionLen': 10,
+                                'sessionBreak': 10,
+                                'events': tuple([{'name': n, 'rooms': tuple(['{} {}'.format(n, r + 1) for r in range(roomsPerSub)])}
+                                                 for n in subEventNames]), }, })
+    else:
+        nSess = 8
+        judgeSpan = nSess * 20
+        for name in eventNames[:nEvents]:
+            nRooms = int(math.ceil(float(nTeams) / nSess))
+            judgeEvents.append({'name': name,
+                                'sessionLen': 15,
+                                'sessionBreak': 5,
+                                'rooms': range(nRooms),
+                                'breakTimes': judgeBreaks, })
+
+    nSets, perSet = tables
+    names = list(fieldColours)
+    while len(names) < nSets * perSet:
+        names.append('Table{}'.format(len(names) + 1))
+    tableNames = tuple([tuple(names[i * perSet:(i + 1) * perSet]) for i in range(nSets)])
+
+    # spread the matches over a bit more than the judging, so that the judged teams can play
+    matchLen = 5
+    rounds = int(math.ceil(nTeams * gamesPerTeam / 2.0 / perSet))
+    matchBreak = max(0, int(math.ceil(1.25 * judgeSpan / rounds)) - matchLen)
+
+    config = {
+        'startTime': '9:00',
+        'travelTime': 10,
+        'judgeEvents': tuple(judgeEvents),
+        'matchInfo': {
+            'matchLen': matchLen,
+            'matchBreak': matchBreak,
+            'gamesPerTeam': gamesPerTeam,
+            'tableNames': tableNames,
+            'extraMatches': 0,
+            'breakTimes': matchBreaks,
+        },
+        'teams': tuple([(i + 1, 'Team {}'.format(i + 1)) for i in range(nTeams)]),
+    }
+
+    if nBlocks > 0:
+        # split the whole day evenly. The judged events count in every block
+        model = ScheduleModel(config)
+        dt = model.eventDuration // nBlocks
+        evts = tuple([e['name'] for e in judgeEvents])
+        config['scheduleBlocks'] = tuple([(model.clock.format(b * dt), model.clock.format((b + 1) * dt), evts)
+                                          for b in range(nBlocks)])
+    return config
+
+
+def writeConfig(config, fname):
+    '''Write a config dict as a config file'''
+    with open(fname, 'w') as outfile:
+        outfile.write('#!/usr/bin/env python\n\n# generated by benchmark.py\n\n')
+        for key, val in config.items():
+            outfile.write('{} = {}\n\n'.format(key, pprint.pformat(val, width=100)))
+    return
+
+
+def makeSolver(engine, model):
+    if engine == 'cpsat':
+        from cpsatSolver import CPSATSolver
+        return CPSATSolver(model)
+    if engine == 'decomp':
+        from decomposition import DecomposedSolver
+        return DecomposedSolver(model)
+    if engine == 'anneal':
+        from localSearch import AnnealingScheduler
+        return AnnealingScheduler(model)
+    if engine == 'lazy':
+        from lazySolver import LazySolver
+        return LazySolver(model)
+    if engine == 'pairing':
+        from pairings import PairingScheduler
+        return PairingScheduler(model)
+    from mipSolver import MIPSolver
+    return MIPSolver(model)
+
+
+def runSolver(engine, solver, timeLimit):
+    if engine == 'cpsat':
+        # CP-SAT logs straight to fd 1, which would end up in the CSV
+        return solver.solve(timeLimit=timeLimit, msg=False)
+    if engine == 'pairing':
+        return solver.solve(timeLimit=timeLimit)
+    if engine == 'anneal':
+        return solver.run(timeLimit=timeLimit)
+    return solver.solve(timeLimit=timeLimit, msg=False)
+
+
+class Benchmark(object):
+    def __init__(self, engines=('mip', ), timeLimit=60, configDir=None, symmetryBreaking=False):
+        self.engines = engines
+        self.timeLimit = timeLimit
+        self.configDir = configDir
+        self.symmetryBreaking = symmetryBreaking
+        return
+
+    def fieldNames(self):
+        fields = ['name', 'teams', 'events', 'subEvents', 'tables', 'games', 'breaks', 'blocks',
+                  'matches', 'sessions', 'timeBlocks',
+                  'gmplTime', 'gmplBytes', 'buildTime', 'variables', 'constraints', 'nonzeros']
+        for e in self.engines:
+            fields.extend([e + '_time', e + '_found', e + '_problems'])
+        fields.extend(['solutionBytes', 'parseTime', 'outputTime'])
+        return fields
+
+    def measure(self, name, params):
+        '''All the measurements for one config. Returns a dict (a report row).'''
+
+        config = generateConfig(**params)
+        if self.configDir is not None:
+            writeConfig(config, os.path.join(self.configDir, name + '.py'))
+
+        row = {'name': name, 'teams': params['nTeams'], 'events': params['nEvents'], 'subEvents': params['subEvents'],
+               'tables': '{}x{}'.format(*params['tables']), 'games': params['gamesPerTeam'],
+               'breaks': params['breaks'], 'blocks': params['nBlocks']}
+
+        model = ScheduleModel(config, symmetryBreaking=self.symmetryBreaking)
+        row['matches'] = len(model.matchList.matches)
+        row['sessions'] = sum([len(e.sessions) for e in model.judgeEvents.values()])
+        row['timeBlocks'] = model.numTimeBlocks()
+
+        buf = io.StringIO()
+        startT = time.time()
+        with contextlib.redirect_stdout(buf):
+            model.writeModel()
+        row['gmplTime'] = round(time.time() - startT, 3)
+        row['gmplBytes'] = len(buf.getvalue())
+
+        from mipSolver import MIPSolver
+        startT = time.time()
+        prob = MIPSolver(model).build()
+        row['buildTime'] = round(time.time() - startT, 3)
+        row['variables'] = prob.numVariables()
+        row['constraints'] = prob.numConstraints()
+        row['nonzeros'] = sum([len(c) for c in prob.constraints.values()])
+
+        solved = None
+        for engine in self.engines:
+            model = ScheduleModel(config, symmetryBreaking=self.symmetryBreaking)
+            startT = time.time()
+            found = False
+            try:
+                solver = makeSolver(engine, model)
+                found = runSolver(engine, solver, self.timeLimit)
+            except ImportError as e:
+                print('Benchmark: skipping {}: {}'.format(engine, e), file=sys.stderr)
+            row[engine + '_time'] = round(time.time() - startT, 3)
+            row[engine + '_found'] = bool(found)
+            if found:
+                solver.assignResults()
+                from occupancy import OccupancyIndex
+                row[engine + '_problems'] = len(OccupancyIndex(model).validate())
+                if solved is None:
+                    solved = model
+
+        if solved is None:
+            # still time the parsing and output, with a made up schedule
+            solved = ScheduleModel(config)
+            solved.assignFakeSchedule()
+        self._timeOutput(solved, row)
+        return row
+
+    def _timeOutput(self, model, row):
+        '''Time reading a full size (zeros included) solution file, and writing the CSV files'''
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            fname = os.path.join(tmpDir, 'result.txt')
+            with open(fname, 'w') as outfile:
+                model.writeMipStart(outfile)
+            row['solutionBytes'] = os.path.getsize(fname)
+
+            model.clearSchedule()
+            startT = time.time()
+            with model.openResults(fname) as infile:
+                model.readResults(infile)
+            row['parseTime'] = round(time.time() - startT, 3)
+
+            startT = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                model.writeOutput(os.path.join(tmpDir, 'out'))
+            row['outputTime'] = round(time.time() - startT, 3)
+        return
+
+    def run(self, grid, outfile):
+        '''Measure every combination of the parameter lists in grid (a dict), writing CSV rows to outfile'''
+
+        keys = sorted(grid.keys())
+        writer = csv.DictWriter(outfile, fieldnames=self.fieldNames())
+        writer.writeheader()
+        for values in itertools.product(*[grid[k] for k in keys]):
+            params = dict(zip(keys, values))
+            if params['subEvents'] and params['nEvents'] != 1:
+                # sub-events are one judged block
+                continue
+            name = 't{nTeams}_e{nEvents}{sub}_{tables[0]}x{tables[1]}_g{gamesPerTeam}_{breaks}_b{nBlocks}'.format(
+                sub='s' if params['subEvents'] else '', **params)
+            print('Benchmark:', name, file=sys.stderr)
+            writer.writerow(self.measure(name, params))
+            outfile.flush()
+        return
+
+# ====================================================================================================
+
+
+if __name__ == '__main__':
+    import argparse
+
+    def intList(s):
+        return [int(x) for x in s.split(',')]
+
+    def tableList(s):
+        return [tuple([int(y) for y in x.split('x')]) for x in s.split(',')]
+
+    parser = argparse.ArgumentParser(description='Scaling benchmark on generated FLL configs')
+    parser.add_argument('-o', '--output', help='CSV report (default stdout)')
+    parser.add_argument('--teams', type=intList, default=[16, 32, 48, 64, 96, 128, 160], help='Team counts (default 16,32,48,64,96,128,160)')
+    parser.add_argument('--events', type=intList, default=[1, 3], help='Judged event counts, 1-4 (default 1,3)')
+    parser.add_argument('--sub-events', choices=('no', 'yes', 'both'), default='no',
+                        help='Judging as one block with sub-events (only with 1 event)')
+    parser.add_argument('--tables', type=tableList, default=[(2, 2)],
+                        help='Table layouts, as table sets x fields per set (default 2x2)')
+    parser.add_argument('--games', type=intList, default=[3], help='Matches per team (default 3)')
+    parser.add_argument('--breaks', default='lunch', help='Break patterns: none, lunch, full (default lunch)')
+    parser.add_argument('--blocks', type=intList, default=[0], help='Numbers of schedule blocks (default 0)')
+    parser.add_argument('--engines', default='mip', help='Engines to solve with: mip, lazy, decomp, anneal, cpsat, pairing (default mip)')
+    parser.add_argument('--time-limit', type=int, default=60, help='Time limit per solve (seconds, default 60)')
+    parser.add_argument('--symmetry', action='store_true', help='Build and solve with the symmetry breaking orderings')
+    parser.add_argument('--write-configs', metavar='DIR', help='Also write the generated config files to DIR')
+
+    args = parser.parse_args()
+
+    grid = {'nTeams': args.teams,
+            'nEvents': args.events,
+            'subEvents': {'no': [False], 'yes': [True], 'both': [False, True]}[args.sub_events],
+            'tables': args.tables,
+            'gamesPerTeam': args.games,
+            'breaks': args.breaks.split(','),
+            'nBlocks': args.blocks}
+    if args.sub_events != 'no' and 1 not in grid['nEvents']:
+        grid['nEvents'] = grid['nEvents'] + [1]
+
+    if args.write_configs:
+        os.makedirs(args.write_configs, exist_ok=True)
+
+    bench = Benchmark(engines=args.engines.split(','), timeLimit=args.time_limit, configDir=args.write_configs,
+                      symmetryBreaking=args.symmetry)
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            bench.run(grid, outfile)
+    else:
+        bench.run(grid, sys.stdout)
@@ -0,0 +1,201 @@
+'''Solve the schedule with the OR-Tools CP-SAT solver.
+
+Uses the same ScheduleModel objects as the MIP models. Matches are modelled as 2
+sides per match, with an AllDifferent on the pair of teams in each match to stop
+rematches. Each team gets a NoOverlap over its (optional) matches and judge sessions
+using the padded end times, which replaces the teamLocation time blocks.'''
+
+import os
+import sys
+from ortools.sat.python import cp_model
+
+
+class CPSATSolver(object):
+    def __init__(self, model):
+        self.model = model
+        self.cp = None
+        self.solver = None
+
+        self.slotAssign = {}    # (m, s, t) -> bool var
+        self.judgeAssign = {}   # (en, j, t) -> bool var
+        return
+
+    def build(self):
+        self.cp = cp_model.CpModel()
+
+        self._addMatches()
+        self._addJudging()
+        self._addTeamLocation()
+        self._addScheduleBlocks()
+        self._addFieldDistribution()
+        self._addObjective()
+        return self.cp
+
+    def solve(self, timeLimit=None, workers=8, msg=True, seed=None):
+        if self.cp is None:
+            self.build()
+
+        if workers is None:
+            workers = 8
+
+        self.solver = cp_model.CpSolver()
+        if timeLimit is not None:
+            self.solver.parameters.max_time_in_seconds = timeLimit
+        self.solver.parameters.num_workers = workers
+        if workers > (os.cpu_count() or 1):
+            # the different workers are what helps. Run them all, even on a small box
+            self.solver.parameters.interleave_search = True
+        if seed is not None:
+            self.solver.parameters.random_seed = seed
+        self.solver.parameters.log_search_progress = msg
+
+        status = self.solver.Solve(self.cp)
+        print('Solver status:', self.solver.StatusName(status), file=sys.stderr)
+        return status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+    def assignResults(self):
+        '''Copy the solved values into the Match and JudgeSession objects'''
+
+        model = self.model
+        for (m, s, t), var in self.slotAssign.items():
+            if self.solver.BooleanValue(var):
+                model.findMatch(m).assignTeam(model.findTeam(t), s - 1)
+
+        for (en, j, t), var in self.judgeAssign.items():
+            if self.solver.BooleanValue(var):
+                model.findJudgeEvent(en).findSession(j).assignTeam(model.findTeam(t))
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _addMatches(self):
+        model = self.model
+        cp = self.cp
+        nTeams = len(model.teams)
+        nGames = model.matchList.nGamesPerTeam
+        nMatches = len(model.matchList.matches)
+        teamRange = range(1, nTeams + 1)
+
+        pairCodes = []
+        for match in model.matchList.matches:
+            m = match.index
+            sides = []
+            for s in (1, 2):
+                for t in teamRange:
+                    self.slotAssign[(m, s, t)] = cp.NewBoolVar('slotAssign[{},{},{}]'.format(m, s, t))
+                # team number in the side, 0 if empty
+                side = cp.NewIntVar(0, nTeams, 'side[{},{}]'.format(m, s))
+                cp.Add(side == sum(t * self.slotAssign[(m, s, t)] for t in teamRange))
+                cp.AddAtMostOne(self.slotAssign[(m, s, t)] for t in teamRange)
+                sides.append(side)
+
+            used = cp.NewBoolVar('used[{}]'.format(m))
+            filled1 = sum(self.slotAssign[(m, 1, t)] for t in teamRange)
+            filled2 = sum(self.slotAssign[(m, 2, t)] for t in teamRange)
+            if model.matchList.dummyTeam and m == nMatches:
+                # the dummy team is just an empty 2nd slot in the last match
+                cp.Add(filled1 == 1)
+                cp.Add(filled2 == 0)
+                cp.Add(used == 1)
+            else:
+                cp.Add(filled1 == used)
+                cp.Add(filled2 == used)
+                # the sides are interchangeable (tables get sorted out afterwards)
+                cp.Add(sides[0] < sides[1]).OnlyEnforceIf(used)
+
+            # no re-matches: the (side1, side2) pairs must all differ.
+            # Unused matches get a code which cannot clash with a real pair.
+            code = cp.NewIntVar(0, (nTeams + 1) ** 2 * (nMatches + 1), 'pairCode[{}]'.format(m))
+            cp.Add(code == (nTeams + 1) * sides[0] + sides[1] + (nTeams + 1) ** 2 * m * (1 - used))
+            pairCodes.append(code)
+
+        cp.AddAllDifferent(pairCodes)
+
+        for t in teamRange:
+            cp.Add(sum(self._teamMatchVars(t)) == nGames)
+        return
+
+    def _teamMatchVars(self, t, matchRange=None):
+        if matchRange is None:
+            matchRange = range(1, len(self.model.matchList.matches) + 1)
+        return [self.slotAssign[(m, s, t)] for m in matchRange for s in (1, 2)]
+
+    def _addJudging(self):
+        model = self.model
+        cp = self.cp
+        for event in model.judgeEvents.values():
+            for sess in event.sessions:
+                for team in model.teams:
+                    self.judgeAssign[(event.index, sess.index, team.index)] = cp.NewBoolVar(
+                        'judgeAssign[{},{},{}]'.format(event.index, sess.index, team.index))
+
+                cp.Add(sum(self.judgeAssign[(event.index, sess.index, team.index)] for team in model.teams)
+                       <= len(event.rooms))
+
+            for team in model.teams:
+                cp.AddExactlyOne(self.judgeAssign[(event.index, sess.index, team.index)] for sess in event.sessions)
+        return
+
+    def _addTeamLocation(self):
+        model = self.model
+        cp = self.cp
+
+        for team in model.teams:
+            t = team.index
+            intervals = []
+            for match in model.matchList.matches:
+                st = match.startMinute()
+                et = match.endMinute(padded=True)
+                # also stops a team from being on both sides
+                inMatch = cp.NewBoolVar('inMatch[{},{}]'.format(match.index, t))
+                cp.Add(inMatch == self.slotAssign[(match.index, 1, t)] + self.slotAssign[(match.index, 2, t)])
+                intervals.append(cp.NewOptionalFixedSizeIntervalVar(st, et - st, inMatch, ''))
+
+            for event in model.judgeEvents.values():
+                for sess in event.sessions:
+                    st = sess.startMinute()
+                    et = sess.endMinute(padded=True)
+                    intervals.append(cp.NewOptionalFixedSizeIntervalVar(st, et - st, self.judgeAssign[(event.index, sess.index, t)], ''))
+
+            cp.AddNoOverlap(intervals)
+        return
+
+    def _addScheduleBlocks(self):
+        model = self.model
+        for (startMatch, endMatch), sessions in model.scheduleBlockRanges():
+            for team in model.teams:
+                t = team.index
+                lits = []
+                if startMatch is not None:
+                    lits = self._teamMatchVars(t, range(startMatch, endMatch + 1))
+                for evtIndex, startSess, endSess in sessions:
+                    lits.extend(self.judgeAssign[(evtIndex, j, t)] for j in range(startSess, endSess + 1))
+                self.cp.AddBoolOr(lits)
+        return
+
+    def _addFieldDistribution(self):
+        model = self.model
+        maxMatch = model.matchList.maxTeamMatchesPerFields
+        if maxMatch is None:
+            return
+
+        nMatches = len(model.matchList.matches)
+        nFields = sum([len(x) for x in model.matchList.tableNames])
+        for team in model.teams:
+            for sm in range(1, nFields + 1):
+                self.cp.Add(sum(self._teamMatchVars(team.index, range(sm, nMatches + 1, nFields))) <= maxMatch)
+        return
+
+    def _addObjective(self):
+        model = self.model
+        if not model.hasJudgePenalty:
+            return
+
+        terms = []
+        for event in model.judgeEvents.values():
+            for sess in event.sessions:
+                if sess.penalty > 0:
+                    for team in model.teams:
+                        terms.append(sess.penalty * self.judgeAssign[(event.index, sess.index, team.index)])
+        self.cp.Minimize(sum(terms))
+        return
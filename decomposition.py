@@ -0,0 +1,229 @@
+'''Two stage solve: judging first, then the robot matches around it.
+
+Stage 1 is a small MIP with only the judgeAssign variables. It minimizes the judge
+penalties, covers the schedule blocks and keeps enough teams free at every time to
+fill the matches. Stage 2 fixes the judging and solves the match pairings with
+MIPSolver(fixedJudging=True). If stage 2 is infeasible, a cut is added to stage 1
+and the two are solved again.
+
+The judge penalties are minimized in stage 1 only, so the result need not be the
+overall optimum.'''
+
+import sys
+import time
+import pulp
+
+from mipSolver import MIPSolver
+
+
+class DecomposedSolver(object):
+    def __init__(self, model):
+        self.model = model
+        self.prob = None
+        self.judgeAssign = {}   # (en, j, t) -> var
+        self.stage2 = None
+        self.nCuts = 0
+        return
+
+    def build(self):
+        '''Build the stage 1 (judging) model'''
+
+        self.prob = pulp.LpProblem('judging', pulp.LpMinimize)
+        self.judgeAssign = {}
+        self.nCuts = 0
+
+        self._addJudgeVariables()
+        self._addObjective()
+        self._addJudgeConstraints()
+        self._addTeamLocation()
+        self._addMatchCapacity()
+        self._addScheduleBlocks()
+        return self.prob
+
+    def solve(self, timeLimit=None, threads=None, msg=False, solverName=None, maxRounds=20):
+        '''Solve both stages. The judging of the final stage 1 solution is left assigned in the model.
+        The time limit covers all the rounds.'''
+
+        if self.prob is None:
+            self.build()
+
+        startT = time.time()
+        for rnd in range(1, maxRounds + 1):
+            limit = self._remaining(timeLimit, startT)
+            if limit is not None and limit < 1:
+                print('Decomposition: out of time after {} rounds'.format(rnd - 1), file=sys.stderr)
+                return False
+            self.prob.solve(self._solver(limit, threads, msg, solverName))
+            if self.prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+                print('Stage 1 (judging):', pulp.LpStatus[self.prob.status], file=sys.stderr)
+                return False
+
+            self._assignJudging()
+            self.stage2 = MIPSolver(self.model, fixedJudging=True)
+            limit = self._remaining(timeLimit, startT)
+            if limit is not None and limit < 1:
+                print('Decomposition: out of time in round {}'.format(rnd), file=sys.stderr)
+                return False
+            found = self.stage2.solve(timeLimit=limit, threads=threads, msg=msg, solverName=solverName)
+            print('Round {}: stage 2 (matches) {}'.format(rnd, 'solved' if found else 'failed'), file=sys.stderr)
+            if found:
+                return True
+            if self.stage2.prob.status != pulp.LpStatusInfeasible:
+                # ran out of time, a cut would not be valid
+                return False
+            self._addCut()
+
+        return False
+
+    def assignResults(self):
+        '''Copy the matches into the model. The judging is already there.'''
+        self.stage2.assignResults()
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _remaining(timeLimit, startT):
+        if timeLimit is None:
+            return None
+        return timeLimit - (time.time() - startT)
+
+    def _solver(self, timeLimit, threads, msg, solverName):
+        if solverName is None:
+            return pulp.PULP_CBC_CMD(msg=msg, timeLimit=timeLimit, threads=threads)
+        return pulp.getSolver(solverName, msg=msg, timeLimit=timeLimit, threads=threads)
+
+    def _sessions(self):
+        for event in self.model.judgeEvents.values():
+            for sess in event.sessions:
+                yield event, sess
+        return
+
+    def _addJudgeVariables(self):
+        model = self.model
+        for event, sess in self._sessions():
+            for team in model.teams:
+                var = pulp.LpVariable('judgeAssign_{}_{}_{}'.format(event.index, sess.index, team.index), cat=pulp.LpBinary)
+                self.judgeAssign[(event.index, sess.index, team.index)] = var
+        return
+
+    def _addObjective(self):
+        model = self.model
+        terms = []
+        for event, sess in self._sessions():
+            if sess.penalty > 0:
+                for team in model.teams:
+                    terms.append((self.judgeAssign[(event.index, sess.index, team.index)], sess.penalty))
+        # PuLP does not like an empty objective
+        self.prob += pulp.LpAffineExpression(terms, constant=0 if terms else 1), 'f'
+        return
+
+    def _addJudgeConstraints(self):
+        model = self.model
+        for event, sess in self._sessions():
+            self.prob += (pulp.lpSum(self.judgeAssign[(event.index, sess.index, team.index)] for team in model.teams)
+                          <= len(event.rooms)), '{}Slots_{}'.format(event.name, sess.index)
+
+        for event in model.judgeEvents.values():
+            for team in model.teams:
+                self.prob += (pulp.lpSum(self.judgeAssign[(event.index, sess.index, team.index)] for sess in event.sessions)
+                              == 1), 'teamJudgings_{}_{}'.format(event.index, team.index)
+        return
+
+    def _judgeTimes(self):
+        '''time block -> list of (event index, session index) covering it'''
+        judgeTimes = {}
+        for event, sess in self._sessions():
+            for tm in sess.timeBlockRange(padded=True):
+                judgeTimes.setdefault(tm, []).append((event.index, sess.index))
+        return judgeTimes
+
+    def _addTeamLocation(self):
+        '''Judge sessions of different events cannot overlap for a team'''
+
+        if len(self.model.judgeEvents) < 2:
+            return
+
+        for tm, sessions in self._judgeTimes().items():
+            if len(set([en for en, j in sessions])) < 2:
+                continue
+            for team in self.model.teams:
+                self.prob += (pulp.lpSum(self.judgeAssign[(en, j, team.index)] for en, j in sessions)
+                              <= 1), 'teamLocation_{}_{}'.format(team.index, tm)
+        return
+
+    def _addMatchCapacity(self):
+        '''Leave enough teams free at each time block to fill the matches running then.
+
+        At most "spare" match slots are left empty over the whole day, so at a time block
+        with k matches at least 2k - spare teams are playing and cannot be in judging.'''
+
+        model = self.model
+        nTeams = len(model.teams)
+        nMatches = len(model.matchList.matches)
+        spare = 2 * nMatches - nTeams * model.matchList.nGamesPerTeam
+
+        matchCount = {}
+        for match in model.matchList.matches:
+            for tm in match.timeBlockRange(padded=True):
+                matchCount[tm] = matchCount.get(tm, 0) + 1
+
+        for tm, sessions in self._judgeTimes().items():
+            playing = 2 * matchCount.get(tm, 0) - spare
+            if playing <= 0:
+                continue
+            self.prob += (pulp.lpSum(self.judgeAssign[(en, j, team.index)] for en, j in sessions for team in model.teams)
+                          <= nTeams - playing), 'matchCapacity_{}'.format(tm)
+        return
+
+    def _addScheduleBlocks(self):
+        '''Teams which are not judged in a block need a match there, and there are only so many'''
+
+        model = self.model
+        nTeams = len(model.teams)
+        for index, ((startMatch, endMatch), sessions) in enumerate(model.scheduleBlockRanges()):
+            nSlots = 0
+            if startMatch is not None:
+                nSlots = 2 * (endMatch - startMatch + 1)
+            judged = pulp.lpSum(self.judgeAssign[(en, j, team.index)]
+                                for en, startSess, endSess in sessions
+                                for j in range(startSess, endSess + 1) for team in model.teams)
+            # a team could be judged twice in the block, so this is only a bound
+            self.prob += nTeams - judged <= nSlots, 'scheduleBlock{}'.format(index)
+        return
+
+    def _assignJudging(self):
+        model = self.model
+        model.clearSchedule()
+        for (en, j, t), var in self.judgeAssign.items():
+            if var.varValue is not None and var.varValue > 0.5:
+                model.findJudgeEvent(en).findSession(j).assignTeam(model.findTeam(t))
+        return
+
+    def _addCut(self):
+        '''Remove the current stage 1 solution.
+
+        With one judge event the teams are interchangeable, so only the number of teams
+        in each session matters: at least one session must get fewer teams than now.
+        With more events the combination matters, so just this exact assignment is cut.'''
+
+        model = self.model
+        self.nCuts += 1
+        if len(model.judgeEvents) == 1:
+            event = list(model.judgeEvents.values())[0]
+            nRooms = len(event.rooms)
+            fewer = []
+            for sess in event.sessions:
+                count = len([t for t in sess.teams if t is not None])
+                if count == 0:
+                    continue
+                d = pulp.LpVariable('cut{}_{}'.format(self.nCuts, sess.index), cat=pulp.LpBinary)
+                # d = 1 forces the session down to count - 1 teams
+                self.prob += (pulp.lpSum(self.judgeAssign[(event.index, sess.index, team.index)] for team in model.teams)
+                              <= count - 1 + (nRooms - count + 1) * (1 - d)), 'cut{}_{}'.format(self.nCuts, sess.index)
+                fewer.append(d)
+            self.prob += pulp.lpSum(fewer) >= 1, 'cut{}'.format(self.nCuts)
+        else:
+            ones = [var for var in self.judgeAssign.values() if var.varValue is not None and var.varValue > 0.5]
+            self.prob += pulp.lpSum(1 - var for var in ones) >= 1, 'cut{}'.format(self.nCuts)
+        return
@@ -0,0 +1,91 @@
+# FLL schedule model (slot matches)
+
+param nTeams, integer, > 0;
+# 1 if the last match has only one team
+param dummyTeam, binary, default 0;
+param maxTeams := nTeams + dummyTeam;
+param nMatches, integer, > 0;
+param gamesPerTeam, integer, > 0;
+param nJudgeEvents, integer, > 0;
+# maximal sets of overlapping sessions and matches
+param nCliques, integer, > 0;
+
+set teams := 1 .. nTeams;
+set matches := 1 .. nMatches;
+set judgeEvents := 1 .. nJudgeEvents;
+param nJudgeSessions{en in judgeEvents};
+param judgeRooms{en in judgeEvents};
+set judgeSessions{en in judgeEvents} := 1 .. nJudgeSessions[en];
+set cliques := 1 .. nCliques;
+set cliqueSessions{c in cliques}, dimen 2;
+set cliqueMatches{c in cliques};
+
+set slots := 1 .. 2;
+var slotAssign{m in matches, s in slots, t in teams}, binary;
+var pairAssign{m in matches, t1 in teams, t2 in t1+1 .. nTeams}, >= 0;
+var judgeAssign{en in judgeEvents, j in judgeSessions[en], t in teams}, binary;
+param judgePenalties{en in judgeEvents,j in judgeSessions[en]}, default 0, >= 0;
+
+minimize f:
+    sum{en in judgeEvents,j in judgeSessions[en],t in teams} judgePenalties[en,j] * judgeAssign[en,j,t];
+
+# number of matches for each team
+s.t. teamMatches{t in teams}:
+     (sum{m in matches, s in slots} slotAssign[m,s,t]) = gamesPerTeam;
+s.t. dummyMatch{d in 1 .. dummyTeam}:
+     sum{t in teams} slotAssign[nMatches,1,t] = 1;
+s.t. dummySlot{d in 1 .. dummyTeam}:
+     sum{t in teams} slotAssign[nMatches,2,t] = 0;
+# only one team per match slot
+s.t. teamsPerMatch{m in matches, s in slots}:
+     sum{t in teams} slotAssign[m,s,t] <= 1;
+# both sides are filled, or neither
+s.t. slotFill{m in 1 .. nMatches - dummyTeam}:
+     sum{t in teams} slotAssign[m,1,t] = sum{t in teams} slotAssign[m,2,t];
+# no re-matches
+s.t. pairLink{m in matches, t1 in teams, t2 in t1+1 .. nTeams}:
+     sum{s in slots} (slotAssign[m,s,t1] + slotAssign[m,s,t2]) - 1 <= pairAssign[m,t1,t2];
+s.t. rematches{t1 in teams, t2 in t1+1 .. nTeams}:
+     sum{m in matches} pairAssign[m,t1,t2] <= 1;
+
+# number of teams per judge slot
+s.t. judgeSlots{en in judgeEvents, j in judgeSessions[en]}:
+     sum{t in teams} judgeAssign[en,j,t] <= judgeRooms[en];
+# teams get judged exactly once per event type
+s.t. teamJudgings{en in judgeEvents,t in teams}:
+     sum{j in judgeSessions[en]} judgeAssign[en,j,t] = 1;
+
+# team can only be in once place at a time
+s.t. teamLocation{t in teams,c in cliques}:
+     (sum{(je,j) in cliqueSessions[c]} judgeAssign[je,j,t]) +
+     (sum{m in cliqueMatches[c], s in slots} slotAssign[m,s,t]) <= 1;
+
+# each team has a match or a judging session in each schedule block
+param nScheduleBlocks, integer, >= 0, default 0;
+set scheduleBlocks := 0 .. nScheduleBlocks - 1;
+param blockFirstMatch{b in scheduleBlocks}, integer;
+param blockLastMatch{b in scheduleBlocks}, integer;
+set blockSessions{b in scheduleBlocks}, dimen 2;
+s.t. scheduleBlock{b in scheduleBlocks, t in teams}:
+    (sum{m in blockFirstMatch[b] .. blockLastMatch[b], s in slots} slotAssign[m,s,t])
+    + (sum{(en,j) in blockSessions[b]} judgeAssign[en,j,t])
+    >= 1;
+
+# Add constraints to spread the teams across the different fields
+#  Not required, and may slow down the model solving!!
+param nFields, integer, > 0;
+# 0: no limit
+param maxMatchesPerField, integer, >= 0, default 0;
+s.t. maxPerField{t in teams, sm in 1 .. nFields: maxMatchesPerField > 0}:
+    (sum{m in sm .. nMatches by nFields, s in slots} slotAssign[m,s,t]) <= maxMatchesPerField;
+
+# optional symmetry breaking, see ScheduleModel.teamOrderWindows()
+# teams in order of their session in event orderEvent (0: none)
+param orderEvent, integer, >= 0, default 0;
+param orderSessions := if orderEvent > 0 then nJudgeSessions[orderEvent] else 0;
+param orderFirst{t in teams} := if orderEvent > 0 then ceil(t / judgeRooms[orderEvent]) else 1;
+param orderLast{t in teams} :=
+    if orderEvent > 0 then orderSessions + 1 - ceil((nTeams - t + 1) / judgeRooms[orderEvent]) else 0;
+s.t. teamOrder{t in teams: orderFirst[t] > 1 or orderLast[t] < orderSessions}:
+    sum{j in judgeSessions[orderEvent]: j < orderFirst[t] or j > orderLast[t]} judgeAssign[orderEvent,j,t] = 0;
+end;
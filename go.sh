@@ -1,5 +1,6 @@
 #!/bin/bash
 
+# the shipped model with a data file from "schedulingModel.py -b --data-only <config.py> > fllschedule.dat":
 #/home/scratch/builds/glpk-4.60/examples/glpsol --math --model ../fllschedule.mod --data fllschedule.dat --output result.txt
 
 # did not finish in many hours
@@ -8,5 +9,17 @@
 
 #/scratch/build/Cbc/Cbc/src/cbc fllschedule.mod% -randoms $(($RANDOM * 10000 + $RANDOM)) -threads 6 -solve -stat -solution result.txt
 
+# several seeds/settings in parallel, keeping the first optimal solution:
+#   python3 portfolio.py --cbc /scratch/build/Cbc/Cbc/src/cbc -k 8 -o schedule <config.py>
+
+# MPS written directly (no GMPL translation in CBC): "schedulingModel.py --write fllschedule.mps <config.py>",
+#   then drop the % from the -import argument below
+
+# optional 2nd argument: MIP start file, from "schedulingModel.py -b --mipstart <file>"
+mipstart=""
+if [ -n "${2}" ]; then
+    mipstart="-mipstart ${2}"
+fi
+
 datestamp=$(date +%Y%m%d_%H%M)
-stdbuf -o 0 /scratch/build/Cbc/Cbc/src/cbc -threads 6 -slog 2 -import ${1}% -solve -stat -solution result.txt | tee solve_${datestamp}.log
+stdbuf -o 0 /scratch/build/Cbc/Cbc/src/cbc -threads 6 -slog 2 -import ${1}% ${mipstart} -solve -stat -solution result.txt | tee solve_${datestamp}.log
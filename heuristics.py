@@ -0,0 +1,331 @@
+'''Constructive heuristic for building a feasible schedule without a solver.
+
+The result can be used directly, or written out as a MIP start so that CBC begins
+with a feasible incumbent.'''
+
+import sys
+import time
+import random
+
+
+class ConstructiveScheduler(object):
+    '''Greedy construction followed by a repair pass.
+
+    Judge sessions are filled first. Matches are then filled in time order, always
+    picking the teams which are most at risk of not getting all their games in.
+    Travel time (padded end times), rematches, schedule blocks and the max matches
+    per field are all respected. Any team left short is fixed by the repair pass,
+    and if that fails the whole thing is restarted with a different random order.'''
+
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.random = random.Random(seed)
+
+        nFields = sum([len(x) for x in model.matchList.tableNames])
+        blocks = model.scheduleBlockRanges()
+        self.nBlocks = len(blocks)
+
+        # per match: (start, padded end, field, schedule blocks)
+        self.matchInfo = {}
+        for match in model.matchList.matches:
+            m = match.index
+            inBlocks = [b for b, ((sm, em), sess) in enumerate(blocks) if sm is not None and sm <= m <= em]
+            self.matchInfo[m] = (match.startMinute(), match.endMinute(padded=True), (m - 1) % nFields, inBlocks)
+
+        # per judge session: (start, padded end, schedule blocks)
+        self.sessionInfo = {}
+        for event in model.judgeEvents.values():
+            for sess in event.sessions:
+                inBlocks = [b for b, (mr, sessions) in enumerate(blocks)
+                            for en, ss, es in sessions if en == event.index and ss <= sess.index <= es]
+                self.sessionInfo[(event.index, sess.index)] = (sess.startMinute(), sess.endMinute(padded=True), inBlocks)
+
+        self.nFields = nFields
+        self.maxPerField = model.matchList.maxTeamMatchesPerFields
+        self.lastDummy = len(model.matchList.matches) if model.matchList.dummyTeam else None
+        return
+
+    def build(self, maxAttempts=50, timeLimit=None):
+        '''Build a schedule, and assign it into the model. Returns True on success.'''
+
+        startT = time.time()
+        for attempt in range(maxAttempts):
+            if timeLimit is not None and time.time() - startT >= timeLimit:
+                print('Constructive heuristic out of time after {} attempts'.format(attempt), file=sys.stderr)
+                return False
+            self._reset()
+            if not self._assignJudging():
+                continue
+            self._assignMatches()
+            if self._repair():
+                print('Constructed schedule after {} attempt(s)'.format(attempt + 1), file=sys.stderr)
+                self._applyToModel()
+                return True
+
+        print('Constructive heuristic failed after {} attempts'.format(maxAttempts), file=sys.stderr)
+        return False
+
+    def buildJudging(self):
+        '''Only the judge sessions, nothing is assigned into the model.
+        Returns {(event index, team index): session index}, or None if some team did not fit.'''
+
+        self._reset()
+        if not self._assignJudging():
+            return None
+        return dict(self.judged)
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _reset(self):
+        teamRange = range(1, len(self.model.teams) + 1)
+        self.busy = {t: {} for t in teamRange}          # event key -> (start, padded end)
+        self.played = {t: set() for t in teamRange}
+        self.games = {t: 0 for t in teamRange}
+        self.fieldCount = {t: [0] * self.nFields for t in teamRange}
+        self.blockCount = {t: [0] * self.nBlocks for t in teamRange}
+        self.matchTeams = {m: [] for m in self.matchInfo}
+        self.judged = {}     # (en, t) -> session index
+        return
+
+    def _isFree(self, t, start, end):
+        for s, e in self.busy[t].values():
+            if s < end and start < e:
+                return False
+        return True
+
+    def _canPlay(self, t, m, opponent=None):
+        start, end, field, inBlocks = self.matchInfo[m]
+        if t in self.matchTeams[m]:
+            return False
+        if opponent is not None and opponent in self.played[t]:
+            return False
+        if self.maxPerField is not None and self.fieldCount[t][field] >= self.maxPerField:
+            return False
+        return self._isFree(t, start, end)
+
+    def _addMatch(self, m, t):
+        start, end, field, inBlocks = self.matchInfo[m]
+        for opp in self.matchTeams[m]:
+            self.played[t].add(opp)
+            self.played[opp].add(t)
+        self.matchTeams[m].append(t)
+        self.busy[t][('m', m)] = (start, end)
+        self.games[t] += 1
+        self.fieldCount[t][field] += 1
+        for b in inBlocks:
+            self.blockCount[t][b] += 1
+        return
+
+    def _removeMatch(self, m, t):
+        start, end, field, inBlocks = self.matchInfo[m]
+        self.matchTeams[m].remove(t)
+        for opp in self.matchTeams[m]:
+            self.played[t].discard(opp)
+            self.played[opp].discard(t)
+        del self.busy[t][('m', m)]
+        self.games[t] -= 1
+        self.fieldCount[t][field] -= 1
+        for b in inBlocks:
+            self.blockCount[t][b] -= 1
+        return
+
+    def _assignJudging(self):
+        model = self.model
+        teams = [team.index for team in model.teams]
+
+        for event in sorted(model.judgeEvents.values(), key=lambda e: e.index):
+            # penalty sessions only get used once the others are full
+            sessions = sorted(event.sessions, key=lambda s: (s.penalty, s.startMinute()))
+            waiting = list(teams)
+            self.random.shuffle(waiting)
+            for sess in sessions:
+                start, end, inBlocks = self.sessionInfo[(event.index, sess.index)]
+                # teams which still need this session's schedule blocks go first
+                waiting.sort(key=lambda t: -sum(1 for b in inBlocks if self.blockCount[t][b] == 0))
+                placed = 0
+                for t in list(waiting):
+                    if placed >= len(event.rooms):
+                        break
+                    if self._isFree(t, start, end):
+                        self.busy[t][('j', event.index)] = (start, end)
+                        self.judged[(event.index, t)] = sess.index
+                        for b in inBlocks:
+                            self.blockCount[t][b] += 1
+                        waiting.remove(t)
+                        placed += 1
+            if waiting:
+                return False
+        return True
+
+    def _futureFree(self, t, m, block=None):
+        '''Number of matches from m onwards (and in block, if given) which team t could still fit in'''
+        cnt = 0
+        for m2 in range(m, len(self.matchInfo) + 1):
+            start, end, field, inBlocks = self.matchInfo[m2]
+            if (block is None or block in inBlocks) and self._isFree(t, start, end):
+                cnt += 1
+        return cnt
+
+    def _urgency(self, t, m):
+        need = self.model.matchList.nGamesPerTeam - self.games[t]
+        score = need / max(1, self._futureFree(t, m))
+        # missing schedule blocks which this match could cover; the fewer chances left the better
+        for b in self.matchInfo[m][3]:
+            if self.blockCount[t][b] == 0:
+                score += 1 + 1 / max(1, self._futureFree(t, m, b))
+        return score + self.random.random() * 1e-3
+
+    def _assignMatches(self):
+        nGames = self.model.matchList.nGamesPerTeam
+        for m in sorted(self.matchInfo):
+            nSlots = 1 if m == self.lastDummy else 2
+            cands = [t for t in self.games if self.games[t] < nGames and self._canPlay(t, m)]
+            cands.sort(key=lambda t: -self._urgency(t, m))
+
+            for t in cands:
+                if len(self.matchTeams[m]) >= nSlots:
+                    break
+                if all(opp not in self.played[t] for opp in self.matchTeams[m]):
+                    self._addMatch(m, t)
+
+            if len(self.matchTeams[m]) < nSlots:
+                # half filled is no use
+                for t in list(self.matchTeams[m]):
+                    self._removeMatch(m, t)
+        return
+
+    def _missing(self):
+        nGames = self.model.matchList.nGamesPerTeam
+        short = [t for t in self.games if self.games[t] < nGames]
+        noBlock = [(t, b) for t in self.games for b in range(self.nBlocks) if self.blockCount[t][b] == 0]
+        return short, noBlock
+
+    def _repair(self, maxIter=5000):
+        for it in range(maxIter):
+            short, noBlock = self._missing()
+            if not short and not noBlock:
+                return True
+
+            # a failed move is not fatal, another problem may be fixable first
+            if short:
+                self._repairShort(short)
+            else:
+                t, b = noBlock[self.random.randrange(len(noBlock))]
+                self._repairBlock(t, b)
+
+        return False
+
+    def _repairShort(self, short):
+        '''Get a game for a team which is short. Most moves bump another team, which then becomes short.'''
+
+        t = short[self.random.randrange(len(short))]
+        nSlots = {m: 1 if m == self.lastDummy else 2 for m in self.matchInfo}
+
+        progress = []   # moves which reduce the number of missing games
+        neutral = []
+        for m, tlist in self.matchTeams.items():
+            if not self._canPlay(t, m):
+                continue
+
+            if not tlist:
+                if nSlots[m] == 1:
+                    progress.append(('fill', m, None, None))
+                    continue
+                for t2 in short:
+                    if t2 != t and self._canPlay(t2, m, t):
+                        progress.append(('fill', m, t2, None))
+                # pull in a partner from another match, which then gets emptied
+                for m2, tlist2 in self.matchTeams.items():
+                    if len(tlist2) != 2 or t in tlist2:
+                        continue
+                    for u in tlist2:
+                        if self._canPlay(u, m, t):
+                            neutral.append(('pull', m, u, m2))
+
+            elif len(tlist) == nSlots[m]:
+                # bump a team out of a match
+                for out in tlist:
+                    if all(o not in self.played[t] for o in tlist if o != out):
+                        neutral.append(('bump', m, out, None))
+
+        if progress and (not neutral or self.random.random() < 0.8):
+            move = progress[self.random.randrange(len(progress))]
+        elif neutral:
+            move = neutral[self.random.randrange(len(neutral))]
+        else:
+            return False
+
+        kind, m, u, m2 = move
+        if kind == 'fill':
+            self._addMatch(m, t)
+            if u is not None:
+                self._addMatch(m, u)
+        elif kind == 'bump':
+            self._removeMatch(m, u)
+            self._addMatch(m, t)
+        else:
+            for x in list(self.matchTeams[m2]):
+                self._removeMatch(m2, x)
+            # u may have been blocked from m by its own game in m2
+            if self._canPlay(u, m, t):
+                self._addMatch(m, t)
+                self._addMatch(m, u)
+        return True
+
+    def _blockMisses(self, teams):
+        return sum(1 for t in teams for cnt in self.blockCount[t] if cnt == 0)
+
+    def _repairBlock(self, t, b):
+        '''Swap team t into a match in schedule block b, with a team that takes one of t's matches'''
+
+        best = None
+        for m, tlist in self.matchTeams.items():
+            if b not in self.matchInfo[m][3] or t in tlist or not tlist:
+                continue
+            for u in tlist:
+                for (kind, m2) in list(self.busy[t]):
+                    if kind != 'm' or u in self.matchTeams[m2]:
+                        continue
+                    before = self._blockMisses((t, u))
+                    if self._trySwap(t, m2, u, m):
+                        delta = self._blockMisses((t, u)) - before
+                        # undo, just looking for now
+                        self._trySwap(t, m, u, m2)
+                        key = (delta, self.random.random())
+                        if best is None or key < best[0]:
+                            best = (key, m2, u, m)
+
+        if best is None:
+            return False
+        (delta, r), m2, u, m = best
+        # allow sideways moves now and then, to get out of a corner
+        if delta > 0 and self.random.random() > 0.1:
+            return False
+        return self._trySwap(t, m2, u, m)
+
+    def _trySwap(self, t, mt, u, mu):
+        '''Swap team t (in match mt) with team u (in match mu)'''
+        if u in self.matchTeams[mt] or t in self.matchTeams[mu]:
+            return False
+        self._removeMatch(mt, t)
+        self._removeMatch(mu, u)
+        if (self._canPlay(t, mu) and all(o not in self.played[t] for o in self.matchTeams[mu]) and
+                self._canPlay(u, mt) and all(o not in self.played[u] for o in self.matchTeams[mt])):
+            self._addMatch(mu, t)
+            self._addMatch(mt, u)
+            return True
+        self._addMatch(mt, t)
+        self._addMatch(mu, u)
+        return False
+
+    def _applyToModel(self):
+        model = self.model
+        model.clearSchedule()
+        for m, tlist in self.matchTeams.items():
+            match = model.findMatch(m)
+            for slot, t in enumerate(tlist):
+                match.assignTeam(model.findTeam(t), slot)
+
+        for (en, t), j in sorted(self.judged.items()):
+            model.findJudgeEvent(en).findSession(j).assignTeam(model.findTeam(t))
+        return
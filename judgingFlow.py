@@ -0,0 +1,224 @@
+'''Judging around fixed matches, as min cost flows.
+
+With the matches fixed, putting the teams in the sessions of one judged event is a
+transportation problem: each team sends one unit to a session it is free for, each
+session takes up to one team per room, and a session costs its penalty
+(judgePenalties). Min cost flows have integral optima, so this is the optimal judging
+for the event, without any judgeAssign binaries. A team is free for a session if the
+session's padded time blocks (with the travel time, as in teamLocation) miss those of
+its matches and of its other judge sessions.
+
+Several events are not one flow (a team needs a session of each, apart in time), so
+they are solved one at a time, each around the others, and again round the events
+until a whole pass does not lower the penalty. The first try starts from the judging
+in the model if every team has all its sessions, so the result is never worse than
+that. Each event solved on its own, around the matches only and without the blocks,
+gives a lower bound; the tries go on, in random event orders with random tie breaks,
+until one reaches it (the judging is then optimal) or maxTries.
+
+Schedule blocks are only helped along: a team which has no match (or other session)
+in a block gets only sessions in that block, where the event has some. The result is
+checked for the blocks. With no matches assigned it is a judging-first step: the
+teams are all free, and their schedule blocks are left to the matches.'''
+
+import sys
+import time
+import random
+
+from ortools.graph.python import min_cost_flow
+
+
+class JudgingFlow(object):
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.random = random.Random(seed)
+        self.events = sorted(model.judgeEvents.values(), key=lambda e: e.index)
+        self.blocks = model.scheduleBlockRanges()
+        self.teams = [team.index for team in model.teams]
+
+        self.assignment = {}    # (en, t) -> session index
+        self.penalty = 0
+        return
+
+    def solve(self, timeLimit=None, maxTries=50, maxPasses=20):
+        '''Assign all the judged events around the matches assigned in the model. Returns True if every
+        team got a session of every event.'''
+
+        startT = time.time()
+        model = self.model
+
+        # per team: padded time block ranges of its matches, and the schedule blocks they cover
+        self.matchBusy = {t: [] for t in self.teams}
+        self.matchBlocks = {t: set() for t in self.teams}
+        for match in model.matchList.matches:
+            for team in match.teams:
+                if team is not None and team.index in self.matchBusy:
+                    self.matchBusy[team.index].append(match.timeBlockRange(padded=True))
+                    self.matchBlocks[team.index] |= self._matchBlocks(match.index)
+
+        self.sessionBlocks = {}
+        for event in self.events:
+            for sess in event.sessions:
+                self.sessionBlocks[(event.index, sess.index)] = self._sessionBlocks(event, sess)
+
+        bound = 0
+        for event in self.events:
+            alone = {}
+            if not self._solveEvent(event, alone, blocks=False):
+                print('Judging flow: no room for all teams in {}'.format(event.name), file=sys.stderr)
+                return False
+            bound += self._penalty(alone)
+
+        start = self._modelJudging()
+        best = None
+        tries = 0
+        while tries < maxTries and (timeLimit is None or time.time() - startT < timeLimit):
+            tries += 1
+            assignment = self._tryJudging(start if tries == 1 else None, tries > 1, maxPasses)
+            if assignment is not None and not any([self._missingBlocks(t, assignment) for t in self.teams]):
+                penalty = self._penalty(assignment)
+                if best is None or penalty < best[0]:
+                    best = (penalty, assignment)
+                if penalty <= bound:
+                    break
+
+        if best is None:
+            print('Judging flow: no judging found for all teams and schedule blocks', file=sys.stderr)
+            return False
+
+        self.penalty, self.assignment = best
+        msg = 'Judging flow: penalty {}'.format(self.penalty)
+        if start is not None:
+            msg += ' (was {})'.format(self._penalty(start))
+        if self.penalty <= bound:
+            msg += ' (optimal)'
+        else:
+            msg += ' (bound {})'.format(bound)
+        print('{}, {} tries ({:.3f}s)'.format(msg, tries, time.time() - startT), file=sys.stderr)
+        return True
+
+    def assignResults(self):
+        '''Replace the judging in the model with the solution'''
+
+        model = self.model
+        model.clearJudging()
+        for (en, t), j in sorted(self.assignment.items()):
+            model.findJudgeEvent(en).findSession(j).assignTeam(model.findTeam(t))
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _matchBlocks(self, m):
+        return set([b for b, ((startMatch, endMatch), sessions) in enumerate(self.blocks)
+                    if startMatch is not None and startMatch <= m <= endMatch])
+
+    def _sessionBlocks(self, event, sess):
+        return set([b for b, (matchRange, sessions) in enumerate(self.blocks)
+                    for en, startSess, endSess in sessions if en == event.index and startSess <= sess.index <= endSess])
+
+    def _tryJudging(self, start, noise, maxPasses):
+        '''One try: from start, or the events one after the other, then passes round the events
+        (at least one, so a start from the model is solved) until one does not lower the penalty.
+        None if some team did not fit.'''
+
+        events = list(self.events)
+        if noise:
+            self.random.shuffle(events)
+
+        if start is not None:
+            assignment = dict(start)
+        else:
+            assignment = {}
+            for event in events:
+                if not self._solveEvent(event, assignment, noise):
+                    return None
+
+        penalty = self._penalty(assignment)
+        for p in range(max(maxPasses, 1)):
+            for event in events:
+                self._solveEvent(event, assignment, noise)
+            before, penalty = penalty, self._penalty(assignment)
+            if penalty >= before:
+                break
+        return assignment
+
+    def _modelJudging(self):
+        '''The judging in the model, or None unless every team has a session of every event'''
+
+        assignment = {}
+        for event in self.events:
+            for sess in event.sessions:
+                for team in sess.teams:
+                    if team is not None:
+                        assignment[(event.index, team.index)] = sess.index
+        if len(assignment) < len(self.events) * len(self.teams):
+            return None
+        return assignment
+
+    def _penalty(self, assignment):
+        return sum([self.model.findJudgeEvent(en).findSession(j).penalty for (en, t), j in assignment.items()])
+
+    def _missingBlocks(self, t, assignment, skip=None):
+        '''Schedule blocks team t is not in, leaving out event skip.
+        Empty for a team with no matches, which its matches can still cover.'''
+
+        if not self.matchBusy[t]:
+            return set()
+        missing = set(range(len(self.blocks))) - self.matchBlocks[t]
+        for event in self.events:
+            if event.index != skip and (event.index, t) in assignment:
+                missing -= self.sessionBlocks[(event.index, assignment[(event.index, t)])]
+        return missing
+
+    def _solveEvent(self, event, assignment, noise=False, blocks=True):
+        '''Optimal sessions of event around the matches and the other events in assignment.
+        Updates assignment, returns False (and leaves it) if some team does not fit.
+        noise: break ties between equal penalty sessions at random. blocks: steer teams into
+        the schedule blocks they miss (off for the lower bound, which has to be a relaxation).'''
+
+        teams = self.teams
+        sessions = event.sessions
+        ranges = [sess.timeBlockRange(padded=True) for sess in sessions]
+
+        # costs stay integral: the noise of all the teams together is less than one penalty point
+        scale = 1
+        if noise:
+            scale = 10 * len(teams) + 1
+
+        # nodes: source, teams, sessions, sink
+        source = 0
+        sink = len(teams) + len(sessions) + 1
+        flow = min_cost_flow.SimpleMinCostFlow()
+        arcs = {}
+        for i, t in enumerate(teams):
+            flow.add_arc_with_capacity_and_unit_cost(source, 1 + i, 1, 0)
+            busy = list(self.matchBusy[t])
+            for other in self.events:
+                if other.index != event.index and (other.index, t) in assignment:
+                    busy.append(other.findSession(assignment[(other.index, t)]).timeBlockRange(padded=True))
+
+            allowed = [j for j, r in enumerate(ranges) if all([r.stop <= b.start or b.stop <= r.start for b in busy])]
+            # a team missing a schedule block gets sessions in it, if there are any
+            missing = set()
+            if blocks:
+                missing = self._missingBlocks(t, assignment, skip=event.index)
+            covering = [j for j in allowed if self.sessionBlocks[(event.index, sessions[j].index)] & missing]
+            if covering:
+                allowed = covering
+            for j in allowed:
+                cost = sessions[j].penalty * scale
+                if noise:
+                    cost += self.random.randrange(10)
+                arcs[(t, j)] = flow.add_arc_with_capacity_and_unit_cost(1 + i, 1 + len(teams) + j, 1, cost)
+        for j, sess in enumerate(sessions):
+            flow.add_arc_with_capacity_and_unit_cost(1 + len(teams) + j, sink, len(event.rooms), 0)
+        flow.set_node_supply(source, len(teams))
+        flow.set_node_supply(sink, -len(teams))
+
+        if flow.solve() != flow.OPTIMAL:
+            return False
+
+        for (t, j), arc in arcs.items():
+            if flow.flow(arc) > 0:
+                assignment[(event.index, t)] = sessions[j].index
+        return True
@@ -0,0 +1,117 @@
+'''Solve the MIP with the rematches and teamLocation rows added lazily.
+
+Most of the rematches and teamLocation rows are never binding, but they are the
+bulk of the model. LazySolver starts without them, solves, reads the schedule back
+into the model and checks it: any pair of teams playing twice and any team in two
+places at once gets its rows added, and the model is solved again, warm started from
+the previous schedule. This repeats until the schedule is clean, which then is a
+solution of the full model.
+
+The teams are interchangeable, so a violation by one team is usually made by another
+in the next round. Adding only the violated rows takes many rounds; instead a clique
+with a clash gets its row for every team, and a rematch adds the rows for all the
+pairs of the two teams.'''
+
+import sys
+import time
+
+from mipSolver import MIPSolver
+from schedulingModel import JudgeSession
+
+
+class LazySolver(MIPSolver):
+    def __init__(self, model, fixedJudging=False):
+        MIPSolver.__init__(self, model, fixedJudging=fixedJudging)
+        self.pairs = set()          # (t1, t2) with rematches rows
+        self.locations = set()      # (t, clique number) with teamLocation rows
+        self.nRounds = 0
+        return
+
+    def solve(self, timeLimit=None, threads=None, msg=False, solverName=None, maxRounds=50):
+        '''Solve, adding the violated rows, until the schedule breaks none of them.
+        The time limit covers all the rounds.'''
+
+        if self.prob is None:
+            self.build()
+        cliques = self.model.locationCliques(judging=not self.fixedJudging)
+
+        startT = time.time()
+        for rnd in range(1, maxRounds + 1):
+            self.nRounds = rnd
+            limit = None
+            if timeLimit is not None:
+                limit = timeLimit - (time.time() - startT)
+                if limit < 1:
+                    print('Lazy rows: out of time after {} rounds'.format(rnd - 1), file=sys.stderr)
+                    return False
+
+            if not MIPSolver.solve(self, timeLimit=limit, threads=threads, msg=msg, solverName=solverName):
+                return False
+
+            # check the schedule in the model, and leave the model empty for the caller's assignResults()
+            self.model.clearSchedule()
+            self.assignResults()
+            pairs = self._rematches() - self.pairs
+            locations = self._clashes(cliques) - self.locations
+            print('Round {} ({:.0f}s): {} rows, {} new rematches rows, {} new teamLocation rows'.format(
+                rnd, time.time() - startT, len(self.prob.constraints), len(pairs), len(locations)), file=sys.stderr)
+            if not pairs and not locations:
+                self.model.clearSchedule()
+                return True
+
+            if pairs:
+                self.pairs.update(pairs)
+                MIPSolver._addRematches(self, pairs)
+            if locations:
+                self.locations.update(locations)
+                MIPSolver._addTeamLocation(self, locations)
+            self.setInitialValues()
+            self.model.clearSchedule()
+
+        print('Lazy rows: schedule not clean after {} rounds'.format(maxRounds), file=sys.stderr)
+        return False
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _addRematches(self, pairs=None):
+        # none up front
+        return
+
+    def _addTeamLocation(self, rows=None):
+        # none up front
+        return
+
+    def _rematches(self):
+        '''(t1, t2) of all the pairs of the teams which play someone more than once'''
+
+        nTeams = len(self.model.teams)
+        seen = set()
+        twice = set()
+        for match in self.model.matchList.matches:
+            inMatch = sorted([t.index for t in match.teams if t is not None and t.index <= nTeams])
+            if len(inMatch) < 2:
+                continue
+            pair = tuple(inMatch)
+            if pair in seen:
+                twice.update(pair)
+            seen.add(pair)
+        return set([(t1, t2) for t1 in range(1, nTeams + 1) for t2 in range(t1 + 1, nTeams + 1)
+                    if t1 in twice or t2 in twice])
+
+    def _clashes(self, cliques):
+        '''(t, clique number) for all the teams, of the cliques where some team is in more than one place'''
+
+        bad = set()
+        for team in self.model.teams:
+            busy = set()
+            for evt, slot in team.schedule:
+                if isinstance(evt, JudgeSession):
+                    busy.add((evt.event.index, evt.index))
+                else:
+                    busy.add(evt.index)
+            for c, (tm, sessions, matches) in enumerate(cliques, 1):
+                if c in bad:
+                    continue
+                if len(busy.intersection(sessions)) + len(busy.intersection(matches)) > 1:
+                    bad.add(c)
+        return set([(team.index, c) for team in self.model.teams for c in bad])
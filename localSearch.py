@@ -0,0 +1,409 @@
+'''Simulated annealing over complete schedules, for events too big for the exact models.
+
+Every team always has all its matches and judge sessions. Clashes (using the padded
+end times, so this includes the travel time), rematches, missed schedule blocks and
+too many matches on one field are penalized, as are duplicate tables and the judge
+session penalties. Moves are built from add/remove steps on single team slots, and
+each step updates the counters and the cost incrementally, so a move costs the same
+no matter how big the event is.'''
+
+import sys
+import math
+import time
+import random
+import numpy
+
+from occupancy import OccupancyIndex
+
+
+class AnnealingScheduler(object):
+    # penalty weights
+    hardWeight = 100
+    tableWeight = 1
+
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.random = random.Random(seed)
+
+        self.nTeams = len(model.teams)
+        self.nGames = model.matchList.nGamesPerTeam
+        self.maxPerField = model.matchList.maxTeamMatchesPerFields
+        nFields = sum([len(x) for x in model.matchList.tableNames])
+
+        self.index = OccupancyIndex(model)
+        index = self.index
+        self.nBlocks = index.scheduleBlocks.shape[1]
+
+        # table side names -> column
+        tableIndex = {}
+        for match in model.matchList.matches:
+            for slot in (0, 1):
+                tableIndex.setdefault(match.tableName(slot), len(tableIndex))
+
+        # per match: (padded time block range, field, (table column per slot), schedule blocks)
+        self.matchInfo = []
+        for row, match in enumerate(model.matchList.matches):
+            tables = (tableIndex[match.tableName(0)], tableIndex[match.tableName(1)])
+            self.matchInfo.append((self._slotRange(row), row % nFields, tables, self._slotBlocks(row)))
+        self.nMatches = len(self.matchInfo)
+        self.dummyMatch = self.nMatches - 1 if model.matchList.dummyTeam else None
+
+        # per judge event, per session: (padded time block range, penalty, schedule blocks)
+        self.events = index.events
+        self.sessionInfo = []
+        for event in self.events:
+            info = []
+            for sess in event.sessions:
+                row = index.sessionRow[(event.index, sess.index)]
+                info.append((self._slotRange(row), sess.penalty, self._slotBlocks(row)))
+            self.sessionInfo.append(info)
+
+        self.nTimeBlocks = index.nTimeBlocks
+        self.nFields = nFields
+        self.nTables = len(tableIndex)
+
+        self.best = None
+        self.bestCost = None
+        return
+
+    def _slotRange(self, row):
+        return (int(self.index.slotStart[row]), int(self.index.slotStop[row]))
+
+    def _slotBlocks(self, row):
+        return tuple([int(b) for b in numpy.nonzero(self.index.scheduleBlocks[row])[0]])
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def run(self, timeLimit=60, maxIter=None, startTemp=None, reportEvery=10):
+        '''Anneal until the time limit (seconds) runs out or maxIter moves have been tried.
+
+        The best schedule so far is kept in self.best, so run() can be stopped
+        at any time (including with Ctrl-C). Returns True if it has no hard violations.'''
+
+        if self.best is None:
+            self.initialize()
+
+        if startTemp is None:
+            startTemp = 2.0 * self.hardWeight
+        endTemp = 0.05
+        startT = time.time()
+        lastReport = startT
+        it = 0
+        temp = startTemp
+        try:
+            while self.bestCost != (0, 0) and (maxIter is None or it < maxIter):
+                if it % 1000 == 0:
+                    now = time.time()
+                    frac = (now - startT) / timeLimit if timeLimit else it / maxIter
+                    if frac >= 1:
+                        break
+                    # geometric cooling over the run
+                    temp = startTemp * (endTemp / startTemp) ** frac
+                    if reportEvery and now - lastReport >= reportEvery:
+                        self._report(it, temp)
+                        lastReport = now
+                it += 1
+
+                delta, undo = self._randomMove()
+                if undo is None:
+                    continue
+                if delta <= 0 or self.random.random() < math.exp(-delta / temp):
+                    self.cost += delta
+                    if (self.hard > 0, self.cost) < (self.bestCost[0] > 0, self.bestTotal):
+                        self._saveBest()
+                else:
+                    self._undo(undo)
+        except KeyboardInterrupt:
+            print('Interrupted', file=sys.stderr)
+
+        self._report(it, temp)
+        return self.bestCost[0] == 0
+
+    def assignResults(self):
+        '''Put the best schedule found into the model'''
+
+        model = self.model
+        slots, judged = self.best
+        model.clearSchedule()
+        for m in range(self.nMatches):
+            match = model.matchList.matches[m]
+            for s in (0, 1):
+                if slots[m, s] >= 0:
+                    match.assignTeam(model.teams[slots[m, s]], s)
+        for e, event in enumerate(self.events):
+            for j, sess in enumerate(event.sessions):
+                for t in judged[e][j]:
+                    sess.assignTeam(model.teams[t])
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+    # Starting point
+
+    def initialize(self):
+        '''Start from the schedule in the model if there is one, otherwise a random one'''
+
+        nTeams = self.nTeams
+        self.occupancy = numpy.zeros((nTeams, self.nTimeBlocks), dtype=numpy.int16)
+        self.pairs = numpy.zeros((nTeams, nTeams), dtype=numpy.int16)
+        self.blockCount = numpy.zeros((nTeams, max(1, self.nBlocks)), dtype=numpy.int16)
+        self.fieldCount = numpy.zeros((nTeams, self.nFields), dtype=numpy.int16)
+        self.tableCount = numpy.zeros((nTeams, self.nTables), dtype=numpy.int16)
+
+        # match slots hold team numbers (0 based), -1 if empty
+        self.slots = -numpy.ones((self.nMatches, 2), dtype=numpy.int32)
+        # per event, per session: list of teams
+        self.judged = [[[] for s in info] for info in self.sessionInfo]
+        # per event: team -> session
+        self.teamSession = [numpy.zeros(nTeams, dtype=numpy.int32) for e in self.events]
+
+        # all teams start out missing every schedule block
+        self.hard = nTeams * self.nBlocks
+        self.cost = self.hardWeight * self.hard
+
+        if any(t is not None for match in self.model.matchList.matches for t in match.teams):
+            self._loadModel()
+        else:
+            self._randomStart()
+        self._saveBest()
+        return
+
+    def _loadModel(self):
+        model = self.model
+        for m, match in enumerate(model.matchList.matches):
+            for s, team in enumerate(match.teams):
+                if team is not None and team.index <= self.nTeams:
+                    self.cost += self._addMatch(m, s, team.index - 1)
+        for e, event in enumerate(self.events):
+            for j, sess in enumerate(event.sessions):
+                for team in sess.teams:
+                    if team is not None:
+                        self.cost += self._addJudge(e, j, team.index - 1)
+        return
+
+    def _randomStart(self):
+        rnd = self.random
+        nTeams = self.nTeams
+
+        for e, info in enumerate(self.sessionInfo):
+            nRooms = len(self.events[e].rooms)
+            # fill the no-penalty sessions first
+            order = sorted(range(len(info)), key=lambda j: (info[j][1], rnd.random()))
+            places = [j for j in order for r in range(nRooms)]
+            teams = list(range(nTeams))
+            rnd.shuffle(teams)
+            for t, j in zip(teams, places):
+                self.cost += self._addJudge(e, j, t)
+
+        # each team appears nGames times, spread over the day
+        appearances = [t for g in range(self.nGames) for t in rnd.sample(range(nTeams), nTeams)]
+        matches = [m for m in range(self.nMatches) if m != self.dummyMatch]
+        nFull = (len(appearances) - (1 if self.dummyMatch is not None else 0)) // 2
+        used = sorted(rnd.sample(matches, nFull))
+        pos = 0
+        for m in used:
+            for s in (0, 1):
+                self.cost += self._addMatch(m, s, appearances[pos])
+                pos += 1
+        if self.dummyMatch is not None:
+            self.cost += self._addMatch(self.dummyMatch, 0, appearances[pos])
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+    # Incremental add/remove. Each returns the change in the weighted cost, and updates self.hard.
+
+    def _addTime(self, t, start, stop, blocks):
+        occ = self.occupancy[t, start:stop]
+        hard = int(numpy.count_nonzero(occ))
+        occ += 1
+        for b in blocks:
+            if self.blockCount[t, b] == 0:
+                hard -= 1
+            self.blockCount[t, b] += 1
+        return hard
+
+    def _removeTime(self, t, start, stop, blocks):
+        occ = self.occupancy[t, start:stop]
+        hard = -int(numpy.count_nonzero(occ > 1))
+        occ -= 1
+        for b in blocks:
+            self.blockCount[t, b] -= 1
+            if self.blockCount[t, b] == 0:
+                hard += 1
+        return hard
+
+    def _addMatch(self, m, s, t):
+        (start, stop), field, tables, blocks = self.matchInfo[m]
+        hard = self._addTime(t, start, stop, blocks)
+        opp = self.slots[m, 1 - s]
+        if opp >= 0:
+            if self.pairs[t, opp] > 0:
+                hard += 1
+            self.pairs[t, opp] += 1
+            self.pairs[opp, t] += 1
+        if self.maxPerField is not None and self.fieldCount[t, field] >= self.maxPerField:
+            hard += 1
+        self.fieldCount[t, field] += 1
+        soft = 1 if self.tableCount[t, tables[s]] > 0 else 0
+        self.tableCount[t, tables[s]] += 1
+        self.slots[m, s] = t
+
+        self.hard += hard
+        return self.hardWeight * hard + self.tableWeight * soft
+
+    def _removeMatch(self, m, s):
+        t = self.slots[m, s]
+        (start, stop), field, tables, blocks = self.matchInfo[m]
+        hard = self._removeTime(t, start, stop, blocks)
+        opp = self.slots[m, 1 - s]
+        if opp >= 0:
+            self.pairs[t, opp] -= 1
+            self.pairs[opp, t] -= 1
+            if self.pairs[t, opp] > 0:
+                hard -= 1
+        self.fieldCount[t, field] -= 1
+        if self.maxPerField is not None and self.fieldCount[t, field] >= self.maxPerField:
+            hard -= 1
+        self.tableCount[t, tables[s]] -= 1
+        soft = -1 if self.tableCount[t, tables[s]] > 0 else 0
+        self.slots[m, s] = -1
+
+        self.hard += hard
+        return self.hardWeight * hard + self.tableWeight * soft
+
+    def _addJudge(self, e, j, t):
+        (start, stop), penalty, blocks = self.sessionInfo[e][j]
+        hard = self._addTime(t, start, stop, blocks)
+        self.judged[e][j].append(t)
+        self.teamSession[e][t] = j
+        self.hard += hard
+        return self.hardWeight * hard + penalty
+
+    def _removeJudge(self, e, j, t):
+        (start, stop), penalty, blocks = self.sessionInfo[e][j]
+        hard = self._removeTime(t, start, stop, blocks)
+        self.judged[e][j].remove(t)
+        self.hard += hard
+        return self.hardWeight * hard - penalty
+
+    # ----------------------------------------------------------------------------------------------------
+    # Moves. Each returns (cost delta, undo list), or (0, None) if no move was possible.
+
+    def _randomMove(self):
+        r = self.random.random()
+        if r < 0.6:
+            return self._swapMatchTeams()
+        if r < 0.7:
+            return self._moveMatch()
+        if r < 0.8:
+            return self._flipTables()
+        return self._moveJudging()
+
+    def _filledMatch(self, full=True):
+        while True:
+            m = self.random.randrange(self.nMatches)
+            if self.slots[m, 0] >= 0 and (not full or self.slots[m, 1] >= 0):
+                return m
+
+    def _swapMatchTeams(self):
+        '''Swap two teams between matches'''
+        m1 = self._filledMatch(False)
+        m2 = self._filledMatch(False)
+        s1 = 0 if self.slots[m1, 1] < 0 else self.random.randrange(2)
+        s2 = 0 if self.slots[m2, 1] < 0 else self.random.randrange(2)
+        t1 = self.slots[m1, s1]
+        t2 = self.slots[m2, s2]
+        if m1 == m2 or t1 in self.slots[m2] or t2 in self.slots[m1]:
+            return 0, None
+
+        delta = self._removeMatch(m1, s1) + self._removeMatch(m2, s2)
+        delta += self._addMatch(m1, s1, t2) + self._addMatch(m2, s2, t1)
+        return delta, [('swap', m1, s1, m2, s2)]
+
+    def _moveMatch(self):
+        '''Move both teams of a match to an unused match'''
+        m2 = self.random.randrange(self.nMatches)
+        if self.slots[m2, 0] >= 0 or m2 == self.dummyMatch:
+            return 0, None
+        m1 = self._filledMatch()
+        if m1 == self.dummyMatch:
+            return 0, None
+
+        t0, t1 = self.slots[m1]
+        delta = self._removeMatch(m1, 0) + self._removeMatch(m1, 1)
+        delta += self._addMatch(m2, 0, t0) + self._addMatch(m2, 1, t1)
+        return delta, [('move', m1, m2)]
+
+    def _flipTables(self):
+        '''Swap the table sides of a match'''
+        m = self._filledMatch()
+        t0, t1 = self.slots[m]
+        delta = self._removeMatch(m, 0) + self._removeMatch(m, 1)
+        delta += self._addMatch(m, 0, t1) + self._addMatch(m, 1, t0)
+        return delta, [('flip', m)]
+
+    def _moveJudging(self):
+        '''Move a team to another judge session, swapping with a team there if it is full'''
+        e = self.random.randrange(len(self.events))
+        nSess = len(self.sessionInfo[e])
+        t = self.random.randrange(self.nTeams)
+        j1 = self.teamSession[e][t]
+        j2 = self.random.randrange(nSess)
+        if j1 == j2:
+            return 0, None
+
+        others = self.judged[e][j2]
+        if len(others) < len(self.events[e].rooms):
+            delta = self._removeJudge(e, j1, t) + self._addJudge(e, j2, t)
+            return delta, [('judge', e, j1, j2, t, None)]
+
+        u = others[self.random.randrange(len(others))]
+        delta = self._removeJudge(e, j1, t) + self._removeJudge(e, j2, u)
+        delta += self._addJudge(e, j2, t) + self._addJudge(e, j1, u)
+        return delta, [('judge', e, j1, j2, t, u)]
+
+    def _undo(self, undo):
+        for step in reversed(undo):
+            kind = step[0]
+            if kind == 'swap':
+                kind, m1, s1, m2, s2 = step
+                t2 = self.slots[m1, s1]
+                t1 = self.slots[m2, s2]
+                self._removeMatch(m1, s1)
+                self._removeMatch(m2, s2)
+                self._addMatch(m1, s1, t1)
+                self._addMatch(m2, s2, t2)
+            elif kind == 'move':
+                kind, m1, m2 = step
+                t0, t1 = self.slots[m2]
+                self._removeMatch(m2, 0)
+                self._removeMatch(m2, 1)
+                self._addMatch(m1, 0, t0)
+                self._addMatch(m1, 1, t1)
+            elif kind == 'flip':
+                m = step[1]
+                t0, t1 = self.slots[m]
+                self._removeMatch(m, 0)
+                self._removeMatch(m, 1)
+                self._addMatch(m, 0, t1)
+                self._addMatch(m, 1, t0)
+            else:
+                kind, e, j1, j2, t, u = step
+                self._removeJudge(e, j2, t)
+                if u is not None:
+                    self._removeJudge(e, j1, u)
+                    self._addJudge(e, j2, u)
+                self._addJudge(e, j1, t)
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _saveBest(self):
+        self.best = (self.slots.copy(), [[list(x) for x in sessions] for sessions in self.judged])
+        self.bestCost = (self.hard, self.cost - self.hardWeight * self.hard)
+        self.bestTotal = self.cost
+        return
+
+    def _report(self, it, temp):
+        print('Anneal: {} moves, temp {:.2f}, best hard violations {} soft cost {}'.format(
+            it, temp, self.bestCost[0], self.bestCost[1]), file=sys.stderr)
+        return
@@ -0,0 +1,391 @@
+'''Build and solve the schedule model in-process with PuLP.
+
+This creates the same constraint families as ScheduleModel.writeModel(), but skips
+the GMPL text and the result file parsing. Solutions go straight into the Match and
+JudgeSession objects of the ScheduleModel.'''
+
+import sys
+import pulp
+
+
+class MIPSolver(object):
+    def __init__(self, model, fixedJudging=False):
+        '''fixedJudging: keep the judge sessions already assigned in the model, and only
+        solve the matches. Matches which clash with a team's judging are left out.'''
+
+        self.model = model
+        self.fixedJudging = fixedJudging
+        self.prob = None
+
+        self.matchAssign = {}   # (m, t1, t2) -> var
+        self.slotAssign = {}    # (m, s, t) -> var
+        self.pairAssign = {}    # (m, t1, t2) -> var, slot model only
+        self.judgeAssign = {}   # (en, j, t) -> var
+
+        # per team, match index -> list of the match variables which include the team
+        self.teamMatchVars = {}
+        # per team, (start, padded end) of the fixed judge sessions
+        self.teamBusy = {}
+
+        self.warmStart = False
+        return
+
+    def build(self):
+        self.prob = pulp.LpProblem('fllschedule', pulp.LpMinimize)
+
+        if self.fixedJudging:
+            self._loadFixedJudging()
+        else:
+            self._addJudgeVariables()
+        if self.model.slotModel:
+            self._addSlotVariables()
+        else:
+            self._addMatchVariables()
+
+        self._addObjective()
+        if self.model.slotModel:
+            self._addSlotConstraints()
+        else:
+            self._addMatchConstraints()
+        if not self.fixedJudging:
+            self._addJudgeConstraints()
+        self._addRematches()
+        self._addTeamLocation()
+        self._addScheduleBlocks()
+        self._addFieldDistribution()
+        if self.model.symmetryBreaking:
+            self._addSymmetryBreaking()
+        return self.prob
+
+    def solve(self, timeLimit=None, threads=None, msg=True, solverName=None):
+        if self.prob is None:
+            self.build()
+
+        if solverName is None:
+            solver = pulp.PULP_CBC_CMD(msg=msg, timeLimit=timeLimit, threads=threads, warmStart=self.warmStart)
+        else:
+            solver = pulp.getSolver(solverName, msg=msg, timeLimit=timeLimit, threads=threads, warmStart=self.warmStart)
+
+        self.prob.solve(solver)
+        print('Solver status:', pulp.LpStatus[self.prob.status], file=sys.stderr)
+        return self.prob.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
+
+    def assignResults(self):
+        '''Copy the solved values into the Match and JudgeSession objects'''
+
+        model = self.model
+        for (m, t1, t2), var in self.matchAssign.items():
+            if self._isSet(var):
+                match = model.findMatch(m)
+                match.assignTeam(model.findTeam(t1))
+                match.assignTeam(model.findTeam(t2))
+
+        for (m, s, t), var in self.slotAssign.items():
+            if self._isSet(var):
+                model.findMatch(m).assignTeam(model.findTeam(t), s - 1)
+
+        if not self.fixedJudging:
+            for (en, j, t), var in self.judgeAssign.items():
+                if self._isSet(var):
+                    model.findJudgeEvent(en).findSession(j).assignTeam(model.findTeam(t))
+        return
+
+    def setInitialValues(self):
+        '''Use the schedule currently assigned in the model as the starting solution'''
+
+        if self.prob is None:
+            self.build()
+
+        model = self.model
+        maxTeams = model._maxTeams()
+        for var in list(self.matchAssign.values()) + list(self.slotAssign.values()):
+            var.setInitialValue(0)
+        if not self.fixedJudging:
+            for var in self.judgeAssign.values():
+                var.setInitialValue(0)
+
+        for match in model.matchList.matches:
+            inMatch = sorted([t.index for t in match.teams if t is not None])
+            if self.slotAssign:
+                for s, t in enumerate(match.teams):
+                    if t is not None:
+                        self.slotAssign[(match.index, s + 1, t.index)].setInitialValue(1)
+            elif inMatch:
+                if len(inMatch) == 1:
+                    inMatch.append(maxTeams)    # dummy team
+                self.matchAssign[(match.index, inMatch[0], inMatch[1])].setInitialValue(1)
+
+        if not self.fixedJudging:
+            for event in model.judgeEvents.values():
+                for sess in event.sessions:
+                    for t in sess.teams:
+                        if t is not None:
+                            self.judgeAssign[(event.index, sess.index, t.index)].setInitialValue(1)
+
+        self.warmStart = True
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _isSet(var):
+        val = var.value()
+        return val is not None and val > 0.5
+
+    def _loadFixedJudging(self):
+        '''Judging is already assigned. Use constants in place of the judgeAssign variables.'''
+
+        model = self.model
+        self.teamBusy = {team.index: [] for team in model.teams}
+        for event in model.judgeEvents.values():
+            for sess in event.sessions:
+                inSess = set([t.index for t in sess.teams if t is not None])
+                for team in model.teams:
+                    self.judgeAssign[(event.index, sess.index, team.index)] = 1 if team.index in inSess else 0
+                    if team.index in inSess:
+                        self.teamBusy[team.index].append((sess.startMinute(), sess.endMinute(padded=True)))
+        return
+
+    def _available(self, t, match):
+        '''Can team t play in match, given its fixed judging'''
+        st = match.startMinute()
+        et = match.endMinute(padded=True)
+        for bs, be in self.teamBusy.get(t, ()):
+            if bs < et and st < be:
+                return False
+        return True
+
+    def _addMatchVariables(self):
+        model = self.model
+        nTeams = len(model.teams)
+        maxTeams = model._maxTeams()
+        lastMatch = len(model.matchList.matches)
+
+        self.teamMatchVars = {t: {} for t in range(1, nTeams + 1)}
+        for match in model.matchList.matches:
+            m = match.index
+            free = set([t for t in range(1, maxTeams + 1) if self._available(t, match)])
+            for t1 in range(1, nTeams + 1):
+                if t1 not in free:
+                    continue
+                # dummyNonMatch: the dummy team only plays in the last match
+                t2Max = maxTeams if m == lastMatch else nTeams
+                for t2 in range(t1 + 1, t2Max + 1):
+                    if t2 not in free:
+                        continue
+                    var = pulp.LpVariable('matchAssign_{}_{}_{}'.format(m, t1, t2), cat=pulp.LpBinary)
+                    self.matchAssign[(m, t1, t2)] = var
+                    self.teamMatchVars[t1].setdefault(m, []).append(var)
+                    if t2 <= nTeams:
+                        self.teamMatchVars[t2].setdefault(m, []).append(var)
+        return
+
+    def _addSlotVariables(self):
+        model = self.model
+        nTeams = len(model.teams)
+
+        self.teamMatchVars = {t: {} for t in range(1, nTeams + 1)}
+        for match in model.matchList.matches:
+            m = match.index
+            free = [t for t in range(1, nTeams + 1) if self._available(t, match)]
+            for s in (1, 2):
+                for t in free:
+                    var = pulp.LpVariable('slotAssign_{}_{}_{}'.format(m, s, t), cat=pulp.LpBinary)
+                    self.slotAssign[(m, s, t)] = var
+                    self.teamMatchVars[t].setdefault(m, []).append(var)
+        # the pairAssign columns come with their pairLink rows, in _addRematches()
+        return
+
+    def _addJudgeVariables(self):
+        model = self.model
+        for event in model.judgeEvents.values():
+            for sess in event.sessions:
+                for team in model.teams:
+                    var = pulp.LpVariable('judgeAssign_{}_{}_{}'.format(event.index, sess.index, team.index), cat=pulp.LpBinary)
+                    self.judgeAssign[(event.index, sess.index, team.index)] = var
+        return
+
+    def _addObjective(self):
+        model = self.model
+        terms = []
+        if model.hasJudgePenalty and not self.fixedJudging:
+            for event in model.judgeEvents.values():
+                for sess in event.sessions:
+                    if sess.penalty > 0:
+                        for team in model.teams:
+                            terms.append((self.judgeAssign[(event.index, sess.index, team.index)], sess.penalty))
+        # PuLP does not like an empty objective
+        self.prob += pulp.LpAffineExpression(terms, constant=0 if terms else 1), 'f'
+        return
+
+    def _teamMatchSum(self, t, matchRange=None):
+        '''Expression for the number of matches (index in matchRange) that team t plays'''
+        tvars = self.teamMatchVars[t]
+        if matchRange is None:
+            matchRange = tvars.keys()
+        return pulp.lpSum(v for m in matchRange for v in tvars.get(m, ()))
+
+    def _addMatchConstraints(self):
+        model = self.model
+        nTeams = len(model.teams)
+        maxTeams = model._maxTeams()
+        nGames = model.matchList.nGamesPerTeam
+
+        for t in range(1, nTeams + 1):
+            self.prob += self._teamMatchSum(t) == nGames, 'teamMatches_{}'.format(t)
+
+        if model.matchList.dummyTeam:
+            lastMatch = len(model.matchList.matches)
+            self.prob += pulp.lpSum(self.matchAssign.get((lastMatch, t, maxTeams), 0) for t in range(1, nTeams + 1)) == 1, 'dummyMatch'
+
+        perMatch = {}
+        for (m, t1, t2), var in self.matchAssign.items():
+            perMatch.setdefault(m, []).append(var)
+
+        for m, vlist in perMatch.items():
+            self.prob += pulp.lpSum(vlist) <= 1, 'teamsPerMatch_{}'.format(m)
+        return
+
+    def _addSlotConstraints(self):
+        model = self.model
+        nTeams = len(model.teams)
+        nGames = model.matchList.nGamesPerTeam
+        nMatches = len(model.matchList.matches)
+        teamRange = range(1, nTeams + 1)
+
+        for t in teamRange:
+            self.prob += self._teamMatchSum(t) == nGames, 'teamMatches_{}'.format(t)
+
+        lastFull = nMatches
+        if model.matchList.dummyTeam:
+            lastFull = nMatches - 1
+            self.prob += pulp.lpSum(self.slotAssign.get((nMatches, 1, t), 0) for t in teamRange) == 1, 'dummyMatch'
+            self.prob += pulp.lpSum(self.slotAssign.get((nMatches, 2, t), 0) for t in teamRange) == 0, 'dummySlot'
+
+        for m in range(1, nMatches + 1):
+            for s in (1, 2):
+                self.prob += pulp.lpSum(self.slotAssign.get((m, s, t), 0) for t in teamRange) <= 1, 'teamsPerMatch_{}_{}'.format(m, s)
+            if m <= lastFull:
+                self.prob += (pulp.lpSum(self.slotAssign.get((m, 1, t), 0) for t in teamRange) ==
+                              pulp.lpSum(self.slotAssign.get((m, 2, t), 0) for t in teamRange)), 'slotFill_{}'.format(m)
+        return
+
+    def _addRematches(self, pairs=None):
+        '''No pair of teams plays twice. pairs: the (t1, t2) to add the rows for, default all'''
+
+        perPair = {}
+        if self.model.slotModel:
+            # one pairAssign column and pairLink row per match and pair: the bulk of the slot model
+            sa = self.slotAssign
+            nTeams = len(self.model.teams)
+            for match in self.model.matchList.matches:
+                m = match.index
+                free = [t for t in range(1, nTeams + 1) if (m, 1, t) in sa]
+                for i, t1 in enumerate(free):
+                    for t2 in free[i + 1:]:
+                        if pairs is not None and (t1, t2) not in pairs:
+                            continue
+                        var = pulp.LpVariable('pairAssign_{}_{}_{}'.format(m, t1, t2), lowBound=0)
+                        self.pairAssign[(m, t1, t2)] = var
+                        self.prob += (sa[(m, 1, t1)] + sa[(m, 2, t1)] + sa[(m, 1, t2)] + sa[(m, 2, t2)] - 1 <= var,
+                                      'pairLink_{}_{}_{}'.format(m, t1, t2))
+                        perPair.setdefault((t1, t2), []).append(var)
+        else:
+            for (m, t1, t2), var in self.matchAssign.items():
+                if pairs is not None and (t1, t2) not in pairs:
+                    continue
+                perPair.setdefault((t1, t2), []).append(var)
+
+        for (t1, t2), vlist in perPair.items():
+            self.prob += pulp.lpSum(vlist) <= 1, 'rematches_{}_{}'.format(t1, t2)
+        return
+
+    def _addJudgeConstraints(self):
+        model = self.model
+        for jName, event in model.judgeEvents.items():
+            for sess in event.sessions:
+                self.prob += (pulp.lpSum(self.judgeAssign[(event.index, sess.index, team.index)] for team in model.teams)
+                              <= len(event.rooms)), '{}Slots_{}'.format(jName, sess.index)
+
+        for event in model.judgeEvents.values():
+            for team in model.teams:
+                self.prob += (pulp.lpSum(self.judgeAssign[(event.index, sess.index, team.index)] for sess in event.sessions)
+                              == 1), 'teamJudgings_{}_{}'.format(event.index, team.index)
+        return
+
+    def _addTeamLocation(self, rows=None):
+        '''A team is in one place at a time. rows: the (team index, clique number) to add, default all'''
+
+        model = self.model
+
+        # fixed judging is handled by leaving out the clashing match variables
+        cliques = model.locationCliques(judging=not self.fixedJudging)
+
+        for team in model.teams:
+            t = team.index
+            tvars = self.teamMatchVars[t]
+            for c, (tm, sessions, matches) in enumerate(cliques, 1):
+                if rows is not None and (t, c) not in rows:
+                    continue
+                terms = [self.judgeAssign[(en, j, t)] for en, j in sessions]
+                for m in matches:
+                    terms.extend(tvars.get(m, ()))
+                if len(terms) > 1:
+                    self.prob += pulp.lpSum(terms) <= 1, 'teamLocation_{}_{}'.format(t, c)
+        return
+
+    def _addScheduleBlocks(self):
+        model = self.model
+        for index, ((startMatch, endMatch), sessions) in enumerate(model.scheduleBlockRanges()):
+            # a block with no matches in it is covered by judging only
+            matchRange = range(startMatch, endMatch + 1) if startMatch is not None else range(0)
+            for team in model.teams:
+                t = team.index
+                expr = self._teamMatchSum(t, matchRange)
+                for evtIndex, startSess, endSess in sessions:
+                    expr += pulp.lpSum(self.judgeAssign[(evtIndex, j, t)] for j in range(startSess, endSess + 1))
+                if self.fixedJudging and expr.constant >= 1:
+                    # already covered by the team's judging
+                    continue
+                self.prob += expr >= 1, 'scheduleBlock{}_{}'.format(index, t)
+        return
+
+    def _addFieldDistribution(self):
+        model = self.model
+        maxMatch = model.matchList.maxTeamMatchesPerFields
+        if maxMatch is None:
+            return
+
+        nMatches = len(model.matchList.matches)
+        nFields = sum([len(x) for x in model.matchList.tableNames])
+        for team in model.teams:
+            for sm in range(1, nFields + 1):
+                matchRange = range(sm, nMatches + 1, nFields)
+                self.prob += self._teamMatchSum(team.index, matchRange) <= maxMatch, 'maxPerField_{}_{}'.format(team.index, sm)
+        return
+
+    def _addSymmetryBreaking(self):
+        '''The orderings from ScheduleModel.teamOrderWindows()'''
+
+        model = self.model
+        orderEvent, windows = model.teamOrderWindows()
+        if orderEvent is not None and not self.fixedJudging:
+            # with fixed judging the teams are no longer interchangeable. The sessions outside the
+            #  windows are fixed by their bounds, rather than by rows as in the GMPL model.
+            for t, (first, last) in windows.items():
+                for sess in model.findJudgeEvent(orderEvent).sessions:
+                    if sess.index < first or sess.index > last:
+                        self.judgeAssign[(orderEvent, sess.index, t)].upBound = 0
+
+        if not model.slotModel:
+            matchVars = {}
+            for (m, t1, t2), var in self.matchAssign.items():
+                matchVars.setdefault(m, []).append((t1, var))
+
+            # key of a match: its lowest team, plus extra if it is filled
+            def matchKey(m, extra=0):
+                return pulp.lpSum((t1 + extra) * var for t1, var in matchVars.get(m, ()))
+
+            for m in model.orderedMatches():
+                self.prob += matchKey(m, extra=1) <= matchKey(m + 1), 'matchOrder_{}'.format(m)
+        return
@@ -0,0 +1,95 @@
+'''Local cache of built models and solutions, keyed by a hash of the config.
+
+Only the parts of the config which change the schedule go into the key, in a
+canonical form, so reformatting the config file does not matter. Each entry is a
+directory holding any of the model file(s), solver logs and the solution.'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+
+class ModelCache(object):
+    # config entries which define the schedule
+    configKeys = ('startTime', 'travelTime', 'teams', 'matchInfo', 'judgeEvents', 'scheduleBlocks')
+    # bump when the model or solution files change meaning
+    version = 2
+
+    def __init__(self, cacheDir, maxMB=500, maxDays=30):
+        self.cacheDir = cacheDir
+        self.maxBytes = None if maxMB is None else maxMB * 1024 * 1024
+        self.maxAge = None if maxDays is None else maxDays * 24 * 3600
+        os.makedirs(cacheDir, exist_ok=True)
+        self.evict()
+        return
+
+    @classmethod
+    def configKey(cls, config):
+        '''Hash of the canonical form of the config'''
+        data = {k: config.get(k, None) for k in cls.configKeys}
+        data['version'] = cls.version
+        text = json.dumps(data, sort_keys=True, separators=(',', ':'), default=cls._canonical)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _canonical(obj):
+        # ranges (judge rooms), sets etc.
+        if isinstance(obj, range):
+            return list(obj)
+        if isinstance(obj, (set, frozenset)):
+            return sorted(obj)
+        return repr(obj)
+
+    def get(self, key, name):
+        '''Path of a cached file, or None'''
+        path = os.path.join(self.cacheDir, key, name)
+        if not os.path.exists(path):
+            return None
+        # recently used entries are kept longest
+        os.utime(os.path.join(self.cacheDir, key))
+        return path
+
+    def put(self, key, name, text=None, srcFile=None):
+        '''Store text, or a copy of srcFile. Returns the cached path.'''
+        entry = os.path.join(self.cacheDir, key)
+        os.makedirs(entry, exist_ok=True)
+        path = os.path.join(entry, name)
+        # write then rename, so a partial file is never used
+        tmpPath = path + '.tmp'
+        if srcFile is not None:
+            shutil.copyfile(srcFile, tmpPath)
+        else:
+            with open(tmpPath, 'w') as outfile:
+                outfile.write(text)
+        os.replace(tmpPath, path)
+        os.utime(entry)
+        self.evict(keep=entry)
+        return path
+
+    def evict(self, keep=None):
+        '''Remove entries older than maxAge, then the least recently used ones until under maxBytes.
+        The entry keep (just written) always stays.'''
+
+        entries = []
+        for key in os.listdir(self.cacheDir):
+            entry = os.path.join(self.cacheDir, key)
+            if not os.path.isdir(entry):
+                continue
+            size = sum([os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)])
+            entries.append((os.path.getmtime(entry), size, entry))
+
+        now = time.time()
+        entries.sort()
+        total = sum([e[1] for e in entries])
+        for mtime, size, entry in entries:
+            tooOld = self.maxAge is not None and now - mtime > self.maxAge
+            tooBig = self.maxBytes is not None and total > self.maxBytes
+            if entry == keep or (not tooOld and not tooBig):
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            print('Cache: removed', os.path.basename(entry), file=sys.stderr)
+        return
@@ -0,0 +1,143 @@
+'''Size of the model from ScheduleModel.writeModel(), counted from the model objects.
+
+The counts are what the GMPL translator generates: one row per member of each s.t.
+domain, one column per variable member, and one nonzero per term. The objective is
+one more row.
+
+The MPS file size and the solver memory are estimates, scaled from the counts. The
+memory is what CBC needs to load the model and solve the root node. The branch and
+bound tree comes on top of that and grows with the run time (the 48 team template's
+pair model: 0.4 GB after 30s, 2.1 GB after 60s), so leave plenty of room.'''
+
+import sys
+
+
+class ModelStats(object):
+    # fitted on the templates and generated configs (GLPK's MPS writer, CBC 2.10)
+    mpsBytesPerNonzero = 33
+    mpsBytesPerRowCol = 17
+    cbcBytesPerNonzero = 60
+    cbcBytesPerRowCol = 1000
+    cbcBaseBytes = 100 * 1000 * 1000
+
+    def __init__(self, model):
+        self.model = model
+        self.families = []      # (name, rows, nonzeros)
+        self.variables = []     # (name, columns)
+        self._count()
+        return
+
+    def _count(self):
+        model = self.model
+        nTeams = len(model.teams)
+        maxTeams = model._maxTeams()
+        matches = model.matchList.matches
+        nMatches = len(matches)
+        dummy = model.matchList.dummyTeam
+        events = sorted(model.judgeEvents.items(), key=lambda e: e[1].index)
+        nSessions = sum([len(e.sessions) for n, e in events])
+        teamPairs = nTeams * (nTeams - 1) // 2
+
+        if model.slotModel:
+            # terms in _teamMatchSum() for each match
+            perMatch = 2
+            self.variables.append(('slotAssign', nMatches * 2 * nTeams))
+            self.variables.append(('pairAssign', nMatches * teamPairs))
+        else:
+            perMatch = maxTeams - 1
+            pairs = teamPairs + dummy * nTeams
+            self.variables.append(('matchAssign', nMatches * pairs))
+        self.variables.append(('judgeAssign', nSessions * nTeams))
+
+        if model.hasJudgePenalty:
+            penalized = sum([1 for n, e in events for s in e.sessions if s.penalty > 0])
+            self._add('f', 1, penalized * nTeams)
+        else:
+            self._add('f', 1, 0)
+
+        self._add('teamMatches', nTeams, nTeams * nMatches * perMatch)
+        if model.slotModel:
+            if dummy:
+                self._add('dummyMatch', 1, nTeams)
+                self._add('dummySlot', 1, nTeams)
+            self._add('teamsPerMatch', nMatches * 2, nMatches * 2 * nTeams)
+            lastFull = nMatches - 1 if dummy else nMatches
+            self._add('slotFill', lastFull, lastFull * 2 * nTeams)
+            self._add('pairLink', nMatches * teamPairs, nMatches * teamPairs * 5)
+            self._add('rematches', teamPairs, teamPairs * nMatches)
+        else:
+            if dummy:
+                self._add('dummyMatch', 1, nTeams)
+                self._add('dummyNonMatch', nTeams * (nMatches - 1), nTeams * (nMatches - 1))
+            self._add('teamsPerMatch', nMatches, nMatches * pairs)
+            self._add('rematches', pairs, pairs * nMatches)
+
+        self._add('judgeSlots', nSessions, nSessions * nTeams)
+        self._add('teamJudgings', len(events) * nTeams, nSessions * nTeams)
+
+        # team location: one row per maximal set of overlapping sessions and matches
+        cliques = model.locationCliques()
+        terms = sum([len(sessions) + len(cliqueMatches) * perMatch for tm, sessions, cliqueMatches in cliques])
+        self._add('teamLocation', nTeams * len(cliques), nTeams * terms)
+
+        if model.scheduleBlocks is not None:
+            blocks = model.scheduleBlockRanges()
+            terms = 0
+            for (startMatch, endMatch), sessions in blocks:
+                if startMatch is not None:
+                    terms += (endMatch - startMatch + 1) * perMatch
+                terms += sum([endSess - startSess + 1 for en, startSess, endSess in sessions])
+            self._add('scheduleBlock', nTeams * len(blocks), nTeams * terms)
+
+        if model.matchList.maxTeamMatchesPerFields is not None:
+            nFields = sum([len(x) for x in model.matchList.tableNames])
+            terms = sum([len(range(sm, nMatches + 1, nFields)) for sm in range(1, nFields + 1)])
+            self._add('maxPerField', nTeams * nFields, nTeams * terms * perMatch)
+
+        if model.symmetryBreaking:
+            orderEvent, windows = model.teamOrderWindows()
+            if orderEvent is not None:
+                nSess = len(model.findJudgeEvent(orderEvent).sessions)
+                fixed = [nSess - max(0, last - first + 1) for first, last in windows.values() if first > 1 or last < nSess]
+                self._add('teamOrder', len(fixed), sum(fixed))
+            if not model.slotModel:
+                ordered = len(model.orderedMatches())
+                self._add('matchOrder', ordered, ordered * 2 * pairs)
+        return
+
+    def _add(self, name, rows, nonzeros):
+        self.families.append((name, rows, nonzeros))
+        return
+
+    def rows(self):
+        return sum([f[1] for f in self.families])
+
+    def columns(self):
+        return sum([v[1] for v in self.variables])
+
+    def nonzeros(self):
+        return sum([f[2] for f in self.families])
+
+    def mpsBytes(self):
+        '''Estimated size of the expanded (MPS) model'''
+        return self.mpsBytesPerNonzero * self.nonzeros() + self.mpsBytesPerRowCol * (self.rows() + self.columns())
+
+    def memoryBytes(self):
+        '''Estimated memory for CBC to load the model and solve the root node'''
+        return self.cbcBaseBytes + self.cbcBytesPerNonzero * self.nonzeros() + \
+            self.cbcBytesPerRowCol * (self.rows() + self.columns())
+
+    def report(self, outfile=sys.stdout):
+        outfile.write('{:20s} {:>12s} {:>14s}\n'.format('Constraint', 'Rows', 'Nonzeros'))
+        for name, rows, nz in self.families:
+            outfile.write('{:20s} {:12,d} {:14,d}\n'.format(name, rows, nz))
+        outfile.write('{:20s} {:12,d} {:14,d}\n\n'.format('Total', self.rows(), self.nonzeros()))
+
+        outfile.write('{:20s} {:>12s}\n'.format('Variable', 'Columns'))
+        for name, cols in self.variables:
+            outfile.write('{:20s} {:12,d}\n'.format(name, cols))
+        outfile.write('{:20s} {:12,d}\n\n'.format('Total', self.columns()))
+
+        outfile.write('Estimated MPS size:    {:8.1f} MB\n'.format(self.mpsBytes() / 1e6))
+        outfile.write('Estimated CBC memory:  {:8.1f} MB (root node)\n'.format(self.memoryBytes() / 1e6))
+        return
@@ -0,0 +1,414 @@
+'''Write the schedule model straight to MPS or CPLEX LP, without GMPL.
+
+The constraint matrix is built as sparse (row, column, value) triplets with NumPy,
+with the same rows, columns and names as the GMPL model from writeModel(), so CBC
+can read it with no translation step, and readResults() reads the solution the same
+way. The file is written in big blocks of lines.
+
+LP format does not allow [] in names, so there the names use () instead.'''
+
+import gzip
+import numpy
+
+
+class MPSWriter(object):
+    def __init__(self, model):
+        self.model = model
+        self.rowNames = []
+        self.rowSense = []      # 'N', 'E', 'L', 'G'
+        self.rowRhs = []
+        self.colNames = []
+        self.colInteger = []    # per block of columns: (start, stop, integer)
+        self._rows = []
+        self._cols = []
+        self._vals = []
+        self.built = False
+        return
+
+    def build(self):
+        '''Build the matrix triplets. Returns (rows, columns, nonzeros).'''
+
+        model = self.model
+        self.nTeams = len(model.teams)
+        self.maxTeams = model._maxTeams()
+        self.matches = model.matchList.matches
+        self.nMatches = len(self.matches)
+        self.events = sorted(model.judgeEvents.values(), key=lambda e: e.index)
+
+        self._addColumns()
+
+        self._addObjective()
+        r = self._addRows('teamMatches', self._teamNames(), 'E', model.matchList.nGamesPerTeam)
+        self._addTeamMatches(r, 1, lambda m: 0, range(self.nMatches))
+        if model.slotModel:
+            self._addSlotRows()
+        else:
+            self._addPairRows()
+        self._addJudgeRows()
+        self._addTeamLocation()
+        self._addScheduleBlocks()
+        self._addFieldDistribution()
+        if model.symmetryBreaking:
+            self._addSymmetryBreaking()
+
+        self.rows = numpy.concatenate(self._rows)
+        self.cols = numpy.concatenate(self._cols)
+        self.vals = numpy.concatenate(self._vals)
+        self._rows = self._cols = self._vals = None
+        self.built = True
+        return len(self.rowNames), len(self.colNames), len(self.vals)
+
+    # ----------------------------------------------------------------------------------------------------
+    # columns
+
+    def _addColumns(self):
+        model = self.model
+        T = self.nTeams
+        M = self.nMatches
+
+        if model.slotModel:
+            # slotAssign[m,s,t], then pairAssign[m,t1,t2] (continuous)
+            self.slotCol0 = 0
+            self.colNames.extend(['slotAssign[{},{},{}]'.format(m, s, t)
+                                  for m in range(1, M + 1) for s in (1, 2) for t in range(1, T + 1)])
+            self.colInteger.append((0, len(self.colNames), True))
+
+            self.pT1, self.pT2 = self._pairs(T)
+            self.nPairs = len(self.pT1)
+            self.pairCol0 = len(self.colNames)
+            self.colNames.extend(['pairAssign[{},{},{}]'.format(m, t1, t2)
+                                  for m in range(1, M + 1) for t1, t2 in zip(self.pT1, self.pT2)])
+            self.colInteger.append((self.pairCol0, len(self.colNames), False))
+        else:
+            # matchAssign[m,t1,t2], the pairs include the dummy team
+            self.pT1, self.pT2 = self._pairs(self.maxTeams)
+            self.nPairs = len(self.pT1)
+            self.matchCol0 = 0
+            self.colNames.extend(['matchAssign[{},{},{}]'.format(m, t1, t2)
+                                  for m in range(1, M + 1) for t1, t2 in zip(self.pT1, self.pT2)])
+            self.colInteger.append((0, len(self.colNames), True))
+
+        # judgeAssign[en,j,t], one block of teams per session
+        self.judgeCol0 = len(self.colNames)
+        self.sessCol = {}
+        for event in self.events:
+            for sess in event.sessions:
+                self.sessCol[(event.index, sess.index)] = len(self.colNames)
+                self.colNames.extend(['judgeAssign[{},{},{}]'.format(event.index, sess.index, t) for t in range(1, T + 1)])
+        self.colInteger.append((self.judgeCol0, len(self.colNames), True))
+        return
+
+    def _pairs(self, maxTeam):
+        '''t1 < t2 <= maxTeam, in GMPL order'''
+        t1 = []
+        t2 = []
+        for a in range(1, self.nTeams + 1):
+            t1.extend([a] * (maxTeam - a))
+            t2.extend(range(a + 1, maxTeam + 1))
+        return numpy.array(t1, dtype=numpy.int64), numpy.array(t2, dtype=numpy.int64)
+
+    # ----------------------------------------------------------------------------------------------------
+    # rows
+
+    def _addRows(self, name, indices, sense, rhs):
+        '''Add a family of rows. indices are the GMPL subscripts (strings), or None for a single row.
+        Returns the first row number.'''
+        start = len(self.rowNames)
+        if indices is None:
+            self.rowNames.append(name)
+            n = 1
+        else:
+            self.rowNames.extend(['{}[{}]'.format(name, i) for i in indices])
+            n = len(indices)
+        self.rowSense.extend([sense] * n)
+        self.rowRhs.extend([rhs] * n)
+        return start
+
+    def _add(self, rows, cols, vals=1.0):
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        self._rows.append(rows)
+        self._cols.append(numpy.asarray(cols, dtype=numpy.int64))
+        self._vals.append(numpy.broadcast_to(numpy.asarray(vals, dtype=numpy.float64), rows.shape))
+        return
+
+    def _teamNames(self):
+        return [str(t) for t in range(1, self.nTeams + 1)]
+
+    def _addTeamMatches(self, row0, rowsPerTeam, rowOffset, matchIndices):
+        '''Terms of _teamMatchSum() for the (0 based) matches: each team in a match gets a 1 in
+        row row0 + (t - 1) * rowsPerTeam + rowOffset(m)'''
+
+        for m in matchIndices:
+            r = row0 + rowOffset(m)
+            if self.model.slotModel:
+                for s in range(2):
+                    col0 = self.slotCol0 + (m * 2 + s) * self.nTeams
+                    self._add(r + numpy.arange(self.nTeams) * rowsPerTeam, col0 + numpy.arange(self.nTeams))
+            else:
+                cols = self.matchCol0 + m * self.nPairs + numpy.arange(self.nPairs)
+                self._add(r + (self.pT1 - 1) * rowsPerTeam, cols)
+                real = self.pT2 <= self.nTeams
+                self._add(r + (self.pT2[real] - 1) * rowsPerTeam, cols[real])
+        return
+
+    def _addObjective(self):
+        self._addRows('f', None, 'N', 0)
+        if self.model.hasJudgePenalty:
+            for event in self.events:
+                for sess in event.sessions:
+                    if sess.penalty > 0:
+                        col0 = self.sessCol[(event.index, sess.index)]
+                        self._add(numpy.zeros(self.nTeams), col0 + numpy.arange(self.nTeams), sess.penalty)
+        return
+
+    def _addPairRows(self):
+        T = self.nTeams
+        M = self.nMatches
+        P = self.nPairs
+
+        if self.model.matchList.dummyTeam:
+            # the dummy pairs are (t, maxTeams): the last pair of each team
+            dummyPairs = numpy.nonzero(self.pT2 == self.maxTeams)[0]
+            r = self._addRows('dummyMatch', ['1'], 'E', 1)
+            self._add(numpy.full(T, r), self.matchCol0 + (M - 1) * P + dummyPairs)
+            r = self._addRows('dummyNonMatch', ['{},{}'.format(t, m) for t in range(1, T + 1) for m in range(1, M)], 'E', 0)
+            rows = r + numpy.arange(T * (M - 1))
+            cols = self.matchCol0 + numpy.arange(M - 1)[None, :] * P + dummyPairs[:, None]
+            self._add(rows, cols.ravel())
+
+        r = self._addRows('teamsPerMatch', [str(m) for m in range(1, M + 1)], 'L', 1)
+        self._add(numpy.repeat(r + numpy.arange(M), P), self.matchCol0 + numpy.arange(M * P))
+
+        r = self._addRows('rematches', ['{},{}'.format(a, b) for a, b in zip(self.pT1, self.pT2)], 'L', 1)
+        self._add(numpy.tile(r + numpy.arange(P), M), self.matchCol0 + numpy.arange(M * P))
+        return
+
+    def _addSlotRows(self):
+        T = self.nTeams
+        M = self.nMatches
+        P = self.nPairs
+        teams = numpy.arange(T)
+
+        def slotCols(m, s):
+            return self.slotCol0 + (m * 2 + s) * T + teams
+
+        if self.model.matchList.dummyTeam:
+            r = self._addRows('dummyMatch', ['1'], 'E', 1)
+            self._add(numpy.full(T, r), slotCols(M - 1, 0))
+            r = self._addRows('dummySlot', ['1'], 'E', 0)
+            self._add(numpy.full(T, r), slotCols(M - 1, 1))
+
+        r = self._addRows('teamsPerMatch', ['{},{}'.format(m, s) for m in range(1, M + 1) for s in (1, 2)], 'L', 1)
+        self._add(numpy.repeat(r + numpy.arange(2 * M), T), self.slotCol0 + numpy.arange(2 * M * T))
+
+        lastFull = M - 1 if self.model.matchList.dummyTeam else M
+        r = self._addRows('slotFill', [str(m) for m in range(1, lastFull + 1)], 'E', 0)
+        for m in range(lastFull):
+            self._add(numpy.full(T, r + m), slotCols(m, 0))
+            self._add(numpy.full(T, r + m), slotCols(m, 1), -1.0)
+
+        r = self._addRows('pairLink', ['{},{},{}'.format(m, a, b) for m in range(1, M + 1) for a, b in zip(self.pT1, self.pT2)], 'L', 1)
+        for m in range(M):
+            rows = r + m * P + numpy.arange(P)
+            for s in range(2):
+                col0 = self.slotCol0 + (m * 2 + s) * T
+                self._add(rows, col0 + self.pT1 - 1)
+                self._add(rows, col0 + self.pT2 - 1)
+            self._add(rows, self.pairCol0 + m * P + numpy.arange(P), -1.0)
+
+        r = self._addRows('rematches', ['{},{}'.format(a, b) for a, b in zip(self.pT1, self.pT2)], 'L', 1)
+        self._add(numpy.tile(r + numpy.arange(P), M), self.pairCol0 + numpy.arange(M * P))
+        return
+
+    def _addJudgeRows(self):
+        T = self.nTeams
+        teams = numpy.arange(T)
+
+        for event in self.events:
+            r = self._addRows('judgeSlots', ['{},{}'.format(event.index, s.index) for s in event.sessions], 'L', len(event.rooms))
+            for sess in event.sessions:
+                self._add(numpy.full(T, r + sess.index - 1), self.sessCol[(event.index, sess.index)] + teams)
+
+        r = self._addRows('teamJudgings', ['{},{}'.format(e.index, t) for e in self.events for t in range(1, T + 1)], 'E', 1)
+        for ei, event in enumerate(self.events):
+            for sess in event.sessions:
+                self._add(r + ei * T + teams, self.sessCol[(event.index, sess.index)] + teams)
+        return
+
+    def _addTeamLocation(self):
+        T = self.nTeams
+        cliques = self.model.locationCliques()
+        nCliques = len(cliques)
+        teams = numpy.arange(T)
+
+        r = self._addRows('teamLocation', ['{},{}'.format(t, c) for t in range(1, T + 1) for c in range(1, nCliques + 1)], 'L', 1)
+        for c, (tm, sessions, matches) in enumerate(cliques):
+            for en, j in sessions:
+                self._add(r + teams * nCliques + c, self.sessCol[(en, j)] + teams)
+            self._addTeamMatches(r, nCliques, lambda m: c, [m - 1 for m in matches])
+        return
+
+    def _addScheduleBlocks(self):
+        if self.model.scheduleBlocks is None:
+            return
+
+        T = self.nTeams
+        teams = numpy.arange(T)
+        for index, ((startMatch, endMatch), sessions) in enumerate(self.model.scheduleBlockRanges()):
+            r = self._addRows('scheduleBlock', ['{},{}'.format(index, t) for t in range(1, T + 1)], 'G', 1)
+            if startMatch is not None:
+                self._addTeamMatches(r, 1, lambda m: 0, range(startMatch - 1, endMatch))
+            for en, startSess, endSess in sessions:
+                for j in range(startSess, endSess + 1):
+                    self._add(r + teams, self.sessCol[(en, j)] + teams)
+        return
+
+    def _addFieldDistribution(self):
+        maxMatch = self.model.matchList.maxTeamMatchesPerFields
+        if maxMatch is None:
+            return
+
+        nFields = sum([len(x) for x in self.model.matchList.tableNames])
+        r = self._addRows('maxPerField', ['{},{}'.format(t, sm) for t in range(1, self.nTeams + 1) for sm in range(1, nFields + 1)],
+                          'L', maxMatch)
+        self._addTeamMatches(r, nFields, lambda m: m % nFields, range(self.nMatches))
+        return
+
+    def _addSymmetryBreaking(self):
+        '''The orderings from ScheduleModel.teamOrderWindows(). The match keys are sums of t1, with
+        1 more on the left side: the lower match must have the lower team.'''
+
+        orderEvent, windows = self.model.teamOrderWindows()
+        if orderEvent is not None:
+            nSess = len(self.model.findJudgeEvent(orderEvent).sessions)
+            fixed = [(t, first, last) for t, (first, last) in sorted(windows.items()) if first > 1 or last < nSess]
+            r = self._addRows('teamOrder', [str(t) for t, first, last in fixed], 'E', 0)
+            for i, (t, first, last) in enumerate(fixed):
+                for j in range(1, nSess + 1):
+                    if j < first or j > last:
+                        self._add([r + i], [self.sessCol[(orderEvent, j)] + t - 1])
+
+        if not self.model.slotModel:
+            P = self.nPairs
+            ordered = self.model.orderedMatches()
+            r = self._addRows('matchOrder', [str(m) for m in ordered], 'L', 0)
+            for i, m in enumerate(ordered):
+                self._add(numpy.full(P, r + i), self.matchCol0 + (m - 1) * P + numpy.arange(P), self.pT1 + 1)
+                self._add(numpy.full(P, r + i), self.matchCol0 + m * P + numpy.arange(P), -self.pT1)
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+    # output
+
+    @staticmethod
+    def _open(fname):
+        if fname.endswith('.gz'):
+            # level 1: most of the size saving, at a fraction of the time
+            return gzip.open(fname, 'wt', compresslevel=1)
+        return open(fname, 'w')
+
+    @staticmethod
+    def _numbers(vals):
+        '''Values as strings, without going through str() for each one'''
+        uniq, inv = numpy.unique(vals, return_inverse=True)
+        strs = numpy.array(['{:.12g}'.format(u) for u in uniq], dtype=object)
+        return strs[inv]
+
+    def write(self, fname):
+        '''Write MPS or LP, by the file name (.mps, .lp, with or without .gz)'''
+        if fname.endswith(('.lp', '.lp.gz')):
+            return self.writeLP(fname)
+        return self.writeMPS(fname)
+
+    def writeMPS(self, fname, blockSize=500000):
+        '''Write free MPS. The names are longer than the 8 characters of fixed MPS, and have to
+        be the GMPL names for readResults().'''
+
+        if not self.built:
+            self.build()
+
+        rowFmt = ' {} {}\n'
+        entryFmt = ' {} {} {}\n'
+
+        order = numpy.lexsort((self.rows, self.cols))
+        cols = self.cols[order]
+        rowNames = numpy.array(self.rowNames, dtype=object)[self.rows[order]]
+        colNames = numpy.array(self.colNames, dtype=object)
+        vals = self._numbers(self.vals[order])
+
+        with self._open(fname) as outfile:
+            outfile.write('NAME fllschedule\nROWS\n')
+            outfile.write(''.join([rowFmt.format(s, n) for s, n in zip(self.rowSense, self.rowNames)]))
+
+            outfile.write('COLUMNS\n')
+            marker = 0
+            for start, stop, integer in self.colInteger:
+                if integer:
+                    marker += 1
+                    outfile.write(entryFmt.format('M{:07d}'.format(marker), "'MARKER'", "'INTORG'"))
+                lo, hi = numpy.searchsorted(cols, [start, stop])
+                for b in range(lo, hi, blockSize):
+                    e = min(hi, b + blockSize)
+                    outfile.write(''.join([entryFmt.format(c, r, v) for c, r, v in
+                                           zip(colNames[cols[b:e]], rowNames[b:e], vals[b:e])]))
+                if integer:
+                    marker += 1
+                    outfile.write(entryFmt.format('M{:07d}'.format(marker), "'MARKER'", "'INTEND'"))
+
+            outfile.write('RHS\n')
+            outfile.write(''.join([entryFmt.format('RHS', n, '{:.12g}'.format(v))
+                                   for n, v in zip(self.rowNames, self.rowRhs) if v != 0]))
+
+            outfile.write('BOUNDS\n')
+            for start, stop, integer in self.colInteger:
+                if integer:
+                    outfile.write(''.join([' UP BND {} 1\n'.format(n) for n in self.colNames[start:stop]]))
+            outfile.write('ENDATA\n')
+        return
+
+    def writeLP(self, fname, termsPerLine=8):
+        '''Write CPLEX LP format'''
+
+        if not self.built:
+            self.build()
+
+        def lpName(n):
+            return n.replace('[', '(').replace(']', ')')
+
+        order = numpy.lexsort((self.cols, self.rows))
+        rows = self.rows[order]
+        colNames = numpy.array([lpName(n) for n in self.colNames], dtype=object)[self.cols[order]]
+        vals = self._numbers(self.vals[order])
+        bounds = numpy.searchsorted(rows, numpy.arange(len(self.rowNames) + 1))
+        senses = {'E': '=', 'L': '<=', 'G': '>='}
+        emptyTerm = '0 ' + lpName(self.colNames[0])
+
+        with self._open(fname) as outfile:
+            lines = []
+            for i, name in enumerate(self.rowNames):
+                if i == 1:
+                    lines.append('Subject To\n')
+                terms = ['{} {}'.format(v if v[0] == '-' else '+' + v, c)
+                         for v, c in zip(vals[bounds[i]:bounds[i + 1]], colNames[bounds[i]:bounds[i + 1]])]
+                if not terms:
+                    # an empty row (e.g. a time block with nothing in it) still needs a term
+                    terms = [emptyTerm]
+                if i == 0:
+                    lines.append('Minimize\n {}:'.format(lpName(name)))
+                else:
+                    lines.append(' {}:'.format(lpName(name)))
+                for k in range(0, len(terms), termsPerLine):
+                    lines.append(' ' + ' '.join(terms[k:k + termsPerLine]) + '\n')
+                if i > 0:
+                    lines.append('  {} {:.12g}\n'.format(senses[self.rowSense[i]], self.rowRhs[i]))
+                if len(lines) > 100000:
+                    outfile.write(''.join(lines))
+                    lines = []
+            outfile.write(''.join(lines))
+
+            outfile.write('Binaries\n')
+            for start, stop, integer in self.colInteger:
+                if integer:
+                    outfile.write(''.join([' {}\n'.format(lpName(n)) for n in self.colNames[start:stop]]))
+            outfile.write('End\n')
+        return
@@ -0,0 +1,131 @@
+'''Array form of the schedule, for fast checking and scoring.
+
+Every match and judge session is a "slot" (a row). The slot x time block matrix says
+which time blocks (TimeSlot.timeBlockRange(padded=True)) each slot covers, the same as
+the teamLocation constraints. An assigned schedule becomes a team x slot 0/1 matrix,
+and the team x time block occupancy is just the product of the two.
+
+The matrices are floats so that the products go through BLAS. The counts are small
+integers, so they are exact.'''
+
+import numpy
+
+
+class OccupancyIndex(object):
+    def __init__(self, model):
+        self.model = model
+        self.nTeams = len(model.teams)
+        self.nTimeBlocks = model.numTimeBlocks()
+        self.nGames = model.matchList.nGamesPerTeam
+        self.maxPerField = model.matchList.maxTeamMatchesPerFields
+
+        matches = model.matchList.matches
+        self.nMatches = len(matches)
+        self.events = sorted(model.judgeEvents.values(), key=lambda e: e.index)
+
+        # row of each slot. Matches come first, in index order
+        self.sessionRow = {}
+        slots = list(matches)
+        for event in self.events:
+            for sess in event.sessions:
+                self.sessionRow[(event.index, sess.index)] = len(slots)
+                slots.append(sess)
+        self.nSlots = len(slots)
+
+        # padded time block range of each slot
+        self.slotStart = numpy.zeros(self.nSlots, dtype=numpy.int32)
+        self.slotStop = numpy.zeros(self.nSlots, dtype=numpy.int32)
+        self.slotBlocks = numpy.zeros((self.nSlots, self.nTimeBlocks))
+        for row, slot in enumerate(slots):
+            tr = slot.timeBlockRange(padded=True)
+            self.slotStart[row] = tr.start
+            self.slotStop[row] = tr.stop
+            self.slotBlocks[row, tr.start:tr.stop] = 1
+
+        # which slots count for each schedule block
+        blocks = model.scheduleBlockRanges()
+        self.scheduleBlocks = numpy.zeros((self.nSlots, len(blocks)))
+        for b, ((startMatch, endMatch), sessions) in enumerate(blocks):
+            if startMatch is not None:
+                self.scheduleBlocks[startMatch - 1:endMatch, b] = 1
+            for en, startSess, endSess in sessions:
+                for j in range(startSess, endSess + 1):
+                    self.scheduleBlocks[self.sessionRow[(en, j)], b] = 1
+
+        # field of each match, for maxTeamMatchesPerFields
+        nFields = sum([len(x) for x in model.matchList.tableNames])
+        self.matchFields = numpy.zeros((self.nMatches, nFields))
+        self.matchFields[numpy.arange(self.nMatches), numpy.arange(self.nMatches) % nFields] = 1
+        return
+
+    def assignment(self):
+        '''Team x slot 0/1 matrix of the schedule assigned in the model'''
+
+        assign = numpy.zeros((self.nTeams, self.nSlots))
+        for row, match in enumerate(self.model.matchList.matches):
+            for team in match.teams:
+                # skip the dummy team
+                if team is not None and team.index <= self.nTeams:
+                    assign[team.index - 1, row] += 1
+        for event in self.events:
+            for sess in event.sessions:
+                row = self.sessionRow[(event.index, sess.index)]
+                for team in sess.teams:
+                    if team is not None:
+                        assign[team.index - 1, row] += 1
+        return assign
+
+    def occupancy(self, assign=None):
+        '''Team x time block count of events'''
+        if assign is None:
+            assign = self.assignment()
+        return assign @ self.slotBlocks
+
+    def validate(self, assign=None):
+        '''Check a full schedule. Returns a list of problems (empty if it is good).'''
+
+        if assign is None:
+            assign = self.assignment()
+        teams = self.model.teams
+        problems = []
+
+        for t, tm in zip(*numpy.nonzero(self.occupancy(assign) > 1)):
+            problems.append('Team {} has overlapping events (or too little travel time) at time block {}'.format(teams[t], tm))
+
+        matchAssign = assign[:, :self.nMatches]
+        for t in numpy.nonzero(matchAssign.sum(axis=1) != self.nGames)[0]:
+            problems.append('Team {} has {} matches, not {}'.format(teams[t], int(matchAssign[t].sum()), self.nGames))
+
+        # a match has two teams, but for the dummy team's match (in the model, or its slot left empty)
+        matches = self.model.matchList.matches
+        dummy = [m for m in range(self.nMatches) if any([t is not None and t.index > self.nTeams for t in matches[m].teams])]
+        single = [m for m in numpy.nonzero(matchAssign.sum(axis=0) == 1)[0] if m not in dummy]
+        if self.model.matchList.dummyTeam and not dummy:
+            single = single[1:]
+        for m in single:
+            problems.append('Match {} has only one team'.format(matches[m].index))
+
+        # off the diagonal: number of matches a pair of teams share
+        pairs = numpy.triu(matchAssign @ matchAssign.T, 1)
+        for t1, t2 in zip(*numpy.nonzero(pairs > 1)):
+            problems.append('Teams {} and {} meet {} times'.format(teams[t1], teams[t2], int(pairs[t1, t2])))
+
+        for event in self.events:
+            rows = [self.sessionRow[(event.index, sess.index)] for sess in event.sessions]
+            counts = assign[:, rows].sum(axis=1)
+            for t in numpy.nonzero(counts != 1)[0]:
+                problems.append('Team {} is judged {} times in {}'.format(teams[t], int(counts[t]), event.name))
+            sessCounts = assign[:, rows].sum(axis=0)
+            for sess, n in zip(event.sessions, sessCounts):
+                if n > len(event.rooms):
+                    problems.append('{} session {} has {} teams, for {} rooms'.format(event.name, sess.index, int(n), len(event.rooms)))
+
+        for t, b in zip(*numpy.nonzero(assign @ self.scheduleBlocks == 0)):
+            problems.append('Team {} has nothing in schedule block {}'.format(teams[t], b + 1))
+
+        if self.maxPerField is not None:
+            perField = matchAssign @ self.matchFields
+            for t, f in zip(*numpy.nonzero(perField > self.maxPerField)):
+                problems.append('Team {} has {} matches on field {}'.format(teams[t], int(perField[t, f]), f + 1))
+
+        return problems
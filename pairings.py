@@ -0,0 +1,492 @@
+'''Match pairings from a round robin, placed in the matches without a solver.
+
+Picking gamesPerTeam opponents for every team without rematches is picking gamesPerTeam
+rounds of a round robin. The circle method gives all the rounds at once: with the teams
+at positions 0 .. M-1 on a circle (M odd), round r pairs r - k with r + k, and team r
+plays the team in the middle (the last one, with an even number of teams) or sits out
+(odd). Every pair meets in exactly one round, so any set of rounds has no rematches.
+
+With an odd number of teams, the teams sitting out the chosen rounds are a game short.
+They play each other, in pairs whose own round was not chosen, and with an odd number
+of them the last one plays the dummy team in the last match (MatchList.dummyTeam).
+
+PairingScheduler fixes the judging first (ConstructiveScheduler.buildJudging, or the
+judging already in the model), then swaps teams around the circle so that the two teams
+of each pair have plenty of match times where both are free of judging. The pairs are
+then placed going through the matches in time order: at each start time, the pairs
+whose teams are free are taken by urgency (the team with the least room for its
+remaining games, then the earlier round), and which pair goes in which match is a small
+bipartite matching (augmenting paths), for maxTeamMatchesPerFields. A pair left over
+at the end is fitted in by moving others: a chain of pairs each moving into the match
+the next one leaves, or the pair's own clashing games moved away, or one of its teams
+swapped with another team everywhere (which keeps the games a round robin subset).
+
+If that fails, or a team misses a schedule block, it starts again with new random
+rounds and team positions. Each attempt takes polynomial time. On tight schedules it
+can fail where the MIP finds one: the judging is fixed before the games and the pairs
+before the times. That includes both shipped templates, so when all the attempts fail
+it falls back to ConstructiveScheduler (unless the judging is fixed), which is not
+tied to the rounds. The attempts only get a share of the time limit, the rest is kept
+for the fallback.'''
+
+import sys
+import time
+import random
+import itertools
+
+from heuristics import ConstructiveScheduler
+
+
+def circleRounds(nTeams):
+    '''All the rounds of a round robin of teams 0 .. nTeams-1 (circle method). Each round is
+    a list of (a, b) pairs; with an odd number of teams, the team sitting out is (a, None).'''
+
+    nCircle = nTeams if nTeams % 2 else nTeams - 1
+    rounds = []
+    for r in range(nCircle):
+        pairs = [(r, nTeams - 1 if nCircle < nTeams else None)]
+        for k in range(1, nCircle // 2 + 1):
+            pairs.append(((r - k) % nCircle, (r + k) % nCircle))
+        rounds.append(pairs)
+    return rounds
+
+
+class PairingScheduler(object):
+    def __init__(self, model, seed=None, fixedJudging=False):
+        '''fixedJudging: keep the judge sessions already assigned in the model. Otherwise the
+        judging comes from ConstructiveScheduler.buildJudging(), new for each attempt.'''
+
+        self.model = model
+        self.random = random.Random(seed)
+        self.fixedJudging = fixedJudging
+        self.nTeams = len(model.teams)
+        self.nGames = model.matchList.nGamesPerTeam
+
+        matches = model.matchList.matches
+        self.nFields = sum([len(x) for x in model.matchList.tableNames])
+        self.maxPerField = model.matchList.maxTeamMatchesPerFields
+        self.dummyMatch = matches[-1].index if model.matchList.dummyTeam else None
+        # match index -> (start, padded end)
+        self.matchTimes = {m.index: (m.startMinute(), m.endMinute(padded=True)) for m in matches}
+        # the matches (but the dummy team's) in groups with the same times, in time order
+        groups = {}
+        for m in matches:
+            if m.index != self.dummyMatch:
+                groups.setdefault(self.matchTimes[m.index], []).append(m.index)
+        self.matchGroups = [groups[key] for key in sorted(groups)]
+
+        self.sessionTimes = {}
+        for event in model.judgeEvents.values():
+            for sess in event.sessions:
+                self.sessionTimes[(event.index, sess.index)] = (sess.startMinute(), sess.endMinute(padded=True))
+
+        # per schedule block: (set of match indices, set of (event index, session index))
+        self.blocks = []
+        for (startMatch, endMatch), sessions in model.scheduleBlockRanges():
+            inMatches = set() if startMatch is None else set(range(startMatch, endMatch + 1))
+            inSessions = set([(en, j) for en, startSess, endSess in sessions for j in range(startSess, endSess + 1)])
+            self.blocks.append((inMatches, inSessions))
+
+        self.judging = ConstructiveScheduler(model, seed=self.random.random())
+        self.fixed = {}
+        if fixedJudging:
+            for event in model.judgeEvents.values():
+                for sess in event.sessions:
+                    for team in sess.teams:
+                        if team is not None:
+                            self.fixed[(event.index, team.index)] = sess.index
+
+        self.judged = {}        # (en, t) -> session index
+        self.matchTeams = {}    # m -> [t1, t2]
+        return
+
+    def solve(self, timeLimit=None, maxAttempts=500, attemptShare=0.5):
+        '''Build the pairings and place them. Returns True on success; assignResults() puts them in the model.
+        The attempts get attemptShare of timeLimit, the rest is kept for the fallback (all of it with fixed judging).'''
+
+        startT = time.time()
+        attemptLimit = timeLimit
+        if timeLimit is not None and not self.fixedJudging:
+            attemptLimit = timeLimit * attemptShare
+        attempts = 0
+        while attempts < maxAttempts and (attemptLimit is None or time.time() - startT < attemptLimit):
+            attempts += 1
+            if self._attempt():
+                print('Pairings placed after {} attempt(s), {:.2f}s'.format(attempts, time.time() - startT), file=sys.stderr)
+                return True
+
+        print('Pairings not placed after {} attempt(s)'.format(attempts), file=sys.stderr)
+        if self.fixedJudging:
+            return False
+        return self._fallback(None if timeLimit is None else timeLimit - (time.time() - startT))
+
+    def assignResults(self):
+        '''Copy the matches, and the judging if it was not fixed, into the model'''
+
+        model = self.model
+        for m, tlist in self.matchTeams.items():
+            match = model.findMatch(m)
+            for slot, t in enumerate(tlist):
+                match.assignTeam(model.findTeam(t), slot)
+
+        if not self.fixedJudging:
+            for (en, t), j in sorted(self.judged.items()):
+                model.findJudgeEvent(en).findSession(j).assignTeam(model.findTeam(t))
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _fallback(self, timeLimit):
+        '''ConstructiveScheduler, which does not stick to round robin rounds: it gets the tight
+        schedules where the pairs cannot be placed'''
+
+        if timeLimit is not None and timeLimit < 1:
+            return False
+        print('Trying the constructive heuristic', file=sys.stderr)
+        scheduler = ConstructiveScheduler(self.model, seed=self.random.random())
+        if not scheduler.build(timeLimit=timeLimit):
+            return False
+
+        # build() assigns the schedule, the caller does that with assignResults()
+        self.model.clearSchedule()
+        self.matchTeams = scheduler.matchTeams
+        self.judged = scheduler.judged
+        return True
+
+    def pairingRounds(self):
+        '''Pick gamesPerTeam rounds at random. Returns (rounds, extra, single): the rounds as lists of
+        (t1, t2) team index pairs, the pairs of the teams which sat out a round, and the team which
+        plays the dummy team (or None). Returns None if the teams sitting out cannot be paired.'''
+
+        teams = [team.index for team in self.model.teams]
+        self.random.shuffle(teams)
+        allRounds = circleRounds(self.nTeams)
+        chosen = self.random.sample(range(len(allRounds)), self.nGames)
+
+        # round of each pair of positions, to keep the extra games clear of the chosen rounds
+        roundOf = {}
+        for r, pairs in enumerate(allRounds):
+            for a, b in pairs:
+                if b is not None:
+                    roundOf[frozenset((a, b))] = r
+
+        rounds = []
+        waiting = []
+        for r in chosen:
+            pairs = []
+            for a, b in allRounds[r]:
+                if b is None:
+                    waiting.append(a)
+                else:
+                    pairs.append(tuple(sorted((teams[a], teams[b]))))
+            rounds.append(pairs)
+
+        extra = self._pairUp(waiting, set(chosen), roundOf)
+        if extra is None:
+            return None
+        single = None
+        if len(waiting) % 2:
+            single = teams[[a for a in waiting if all(a not in p for p in extra)][0]]
+        extra = [tuple(sorted((teams[a], teams[b]))) for a, b in extra]
+        return rounds, extra, single
+
+    @classmethod
+    def _pairUp(cls, waiting, chosen, roundOf):
+        '''Pair up the positions in waiting (one left over if odd), without a pair from the chosen rounds'''
+
+        if len(waiting) < 2:
+            return []
+        first = waiting[0]
+        if len(waiting) % 2:
+            # first could be the one left over
+            rest = cls._pairUp(waiting[1:], chosen, roundOf)
+            if rest is not None:
+                return rest
+        for other in waiting[1:]:
+            if roundOf[frozenset((first, other))] in chosen:
+                continue
+            rest = cls._pairUp([a for a in waiting[1:] if a != other], chosen, roundOf)
+            if rest is not None:
+                return [(first, other)] + rest
+        return None
+
+    def _attempt(self):
+        '''One try, with new judging (unless fixed) and rounds'''
+
+        if self.fixedJudging:
+            self.judged = dict(self.fixed)
+        else:
+            self.judged = self.judging.buildJudging()
+            if self.judged is None:
+                return False
+
+        pairing = self.pairingRounds()
+        if pairing is None:
+            return False
+        rounds, extra, single = pairing
+        remaining = [(r, pair) for r, pairs in enumerate(rounds + [extra]) for pair in pairs]
+
+        self.busy = {team.index: {} for team in self.model.teams}     # key -> (start, padded end)
+        for (en, t), j in self.judged.items():
+            self.busy[t][('j', en)] = self.sessionTimes[(en, j)]
+        remaining, single = self._relabel(remaining, single)
+        self.fieldCount = {team.index: [0] * self.nFields for team in self.model.teams}
+        self.matchTeams = {}
+        need = {team.index: 0 for team in self.model.teams}
+        for r, pair in remaining:
+            for t in pair:
+                need[t] += 1
+        if single is not None:
+            if not self._canPlay(single, self.dummyMatch):
+                return False
+            self._addMatch(self.dummyMatch, (single, ))
+
+        for g, group in enumerate(self.matchGroups):
+            cands = [(r, pair) for r, pair in remaining if self._isFree(pair[0], group[0]) and self._isFree(pair[1], group[0])]
+            if not cands:
+                continue
+
+            # the teams with the least room for their remaining games first, then the earlier rounds
+            room = {}
+            for t in set([t for r, pair in cands for t in pair]):
+                room[t] = need[t] / max(1, sum([1 for later in self.matchGroups[g:] if self._isFree(t, later[0])]))
+            cands.sort(key=lambda c: (-max(room[c[1][0]], room[c[1][1]]), c[0], self.random.random()))
+
+            chosen = []
+            inGroup = set()
+            for r, pair in cands:
+                if len(chosen) >= len(group):
+                    break
+                if inGroup.isdisjoint(pair):
+                    chosen.append(pair)
+                    inGroup.update(pair)
+
+            left = self._place(chosen, group)
+            for r, pair in [c for c in remaining if c[1] in chosen and c[1] not in left]:
+                remaining.remove((r, pair))
+                for t in pair:
+                    need[t] -= 1
+
+        remaining = [pair for r, pair in remaining]
+        while remaining:
+            pair = remaining.pop(0)
+            if self._repair(pair) or self._makeRoom(pair):
+                continue
+            remaining = self._exchange(pair, remaining)
+            if remaining is None:
+                return False
+        return self._blocksCovered()
+
+    def _relabel(self, remaining, single):
+        '''Swap teams around in the pairings (which keeps them a round robin subset) so that the two
+        teams of each pair have many match times where they are both free of judging'''
+
+        free = {}
+        for team in self.model.teams:
+            free[team.index] = set([g for g, group in enumerate(self.matchGroups) if self._isFree(team.index, group[0])])
+
+        opponents = {team.index: [] for team in self.model.teams}
+        for r, (t1, t2) in remaining:
+            opponents[t1].append(t2)
+            opponents[t2].append(t1)
+
+        def cost(t, opp):
+            return sum([1.0 / max(1, len(free[t] & free[o])) for o in opp])
+
+        teams = list(opponents)
+        for sweep in range(3):
+            improved = False
+            for t, u in itertools.combinations(teams, 2):
+                ot = [u if o == t else o for o in opponents[u]]
+                ou = [t if o == u else o for o in opponents[t]]
+                if cost(t, ot) + cost(u, ou) < cost(t, opponents[t]) + cost(u, opponents[u]) - 1e-9:
+                    # t takes u's opponents and the other way round
+                    for o in opponents[t]:
+                        if o != u:
+                            opponents[o] = [u if x == t else x for x in opponents[o]]
+                    for o in opponents[u]:
+                        if o != t:
+                            opponents[o] = [t if x == u else x for x in opponents[o]]
+                    opponents[t], opponents[u] = ot, ou
+                    remaining = [(r, tuple(sorted([{t: u, u: t}.get(x, x) for x in pair]))) for r, pair in remaining]
+                    single = {t: u, u: t}.get(single, single)
+                    improved = True
+            if not improved:
+                break
+        return remaining, single
+
+    def _isFree(self, t, m, leaving=None):
+        '''Team t can be in match m, if it leaves match leaving'''
+        start, end = self.matchTimes[m]
+        for key, (s, e) in self.busy[t].items():
+            if s < end and start < e and key != ('m', leaving):
+                return False
+        return True
+
+    def _canPlay(self, t, m, leaving=None):
+        if self.maxPerField is not None:
+            field = (m - 1) % self.nFields
+            count = self.fieldCount[t][field]
+            if leaving is not None and (leaving - 1) % self.nFields == field:
+                count -= 1
+            if count >= self.maxPerField:
+                return False
+        return self._isFree(t, m, leaving)
+
+    def _addMatch(self, m, pair):
+        self.matchTeams[m] = list(pair)
+        for t in pair:
+            self.busy[t][('m', m)] = self.matchTimes[m]
+            self.fieldCount[t][(m - 1) % self.nFields] += 1
+        return
+
+    def _removeMatch(self, m):
+        for t in self.matchTeams.pop(m):
+            del self.busy[t][('m', m)]
+            self.fieldCount[t][(m - 1) % self.nFields] -= 1
+        return
+
+    def _repair(self, pair, maxDepth=6):
+        '''Place a pair which did not fit, by moving others: the pair takes a match whose pair moves to
+        another match, and so on until one moves to an empty match (breadth first).'''
+
+        matches = [m for group in self.matchGroups for m in group]
+        # (pair, the match it leaves, [(pair, match it goes to), ...], teams in the chain)
+        queue = [(tuple(pair), None, [], set(pair))]
+        seen = set()
+        while queue:
+            moving, leaving, chain, teams = queue.pop(0)
+            for m in matches:
+                if m in seen or m == leaving or not all([self._canPlay(t, m, leaving) for t in moving]):
+                    continue
+                if m not in self.matchTeams:
+                    chain = chain + [(moving, m)]
+                    # from the end: each pair moves into the match the next one left
+                    for p, to in reversed(chain):
+                        for old in [x for x in self.matchTeams if self.matchTeams[x] == list(p)]:
+                            self._removeMatch(old)
+                        self._addMatch(to, p)
+                    return True
+                occupant = tuple(self.matchTeams[m])
+                if len(chain) + 1 < maxDepth and teams.isdisjoint(occupant):
+                    seen.add(m)
+                    queue.append((occupant, m, chain + [(moving, m)], teams.union(occupant)))
+        return False
+
+    def _place(self, pairs, window):
+        '''Put the pairs (no team twice) in the free matches of the window, as many as possible
+        (augmenting paths). Returns the pairs which did not fit.'''
+
+        free = [m for m in window if m not in self.matchTeams]
+        options = [[m for m in free if self._canPlay(t1, m) and self._canPlay(t2, m)] for t1, t2 in pairs]
+        owner = {}      # match -> pair number
+
+        def augment(p, seen):
+            for m in options[p]:
+                if m in seen:
+                    continue
+                seen.add(m)
+                if m not in owner or augment(owner[m], seen):
+                    owner[m] = p
+                    return True
+            return False
+
+        # the pairs with the fewest options first
+        for p in sorted(range(len(pairs)), key=lambda p: len(options[p])):
+            augment(p, set())
+
+        for m, p in owner.items():
+            self._addMatch(m, pairs[p])
+        placed = set(owner.values())
+        return [pair for p, pair in enumerate(pairs) if p not in placed]
+
+    def _makeRoom(self, pair, maxMoved=2):
+        '''Place a pair which did not fit in an empty match where only the pair's own other games
+        are in the way, and move those games elsewhere (see _repair)'''
+
+        matches = [m for group in self.matchGroups for m in group if m not in self.matchTeams]
+        self.random.shuffle(matches)
+        for m in matches:
+            start, end = self.matchTimes[m]
+            clash = set()
+            for t in pair:
+                for key, (s, e) in self.busy[t].items():
+                    if s < end and start < e:
+                        clash.add(key)
+            if len(clash) > maxMoved or any([key[0] != 'm' or key[1] == self.dummyMatch for key in clash]):
+                continue
+
+            before = dict(self.matchTeams)
+            moved = [tuple(self.matchTeams[key[1]]) for key in clash]
+            for key in clash:
+                self._removeMatch(key[1])
+            if all([self._canPlay(t, m) for t in pair]):
+                self._addMatch(m, pair)
+                if all([self._repair(p) for p in moved]):
+                    return True
+            self._restore(before)
+        return False
+
+    def _restore(self, matchTeams):
+        for m in list(self.matchTeams):
+            self._removeMatch(m)
+        for m, tlist in matchTeams.items():
+            self._addMatch(m, tlist)
+        return
+
+    def _exchange(self, pair, remaining):
+        '''Swap one team of a pair which does not fit with another team, everywhere: the games
+        stay a round robin subset, so there are still no rematches. Returns the pairs still to
+        place (with the swap), or None if no swap lets the pair in.'''
+
+        teams = [team.index for team in self.model.teams]
+        self.random.shuffle(teams)
+        for t in pair:
+            for u in teams:
+                if u in pair or not self._canSwap(t, u):
+                    continue
+                self._swap(t, u)
+                swapped = tuple(sorted([u if x == t else x for x in pair]))
+                if self._repair(swapped):
+                    return [tuple(sorted([{t: u, u: t}.get(x, x) for x in p])) for p in remaining]
+                self._swap(t, u)
+        return None
+
+    def _teamMatches(self, t):
+        return [m for m, tlist in self.matchTeams.items() if t in tlist]
+
+    def _canSwap(self, t, u):
+        '''t can play u's matches and u can play t's, around their own judging'''
+        for a, b in ((t, u), (u, t)):
+            judging = [interval for key, interval in self.busy[a].items() if key[0] == 'j']
+            for m in self._teamMatches(b):
+                start, end = self.matchTimes[m]
+                if any([s < end and start < e for s, e in judging]):
+                    return False
+        if self.maxPerField is not None:
+            return self.fieldCount[t] == self.fieldCount[u]
+        return True
+
+    def _swap(self, t, u):
+        mt = self._teamMatches(t)
+        mu = self._teamMatches(u)
+        for m in mt + mu:
+            pair = [{t: u, u: t}.get(x, x) for x in self.matchTeams[m]]
+            self._removeMatch(m)
+            self._addMatch(m, pair)
+        return
+
+    def _blocksCovered(self):
+        if not self.blocks:
+            return True
+        places = {team.index: set() for team in self.model.teams}
+        for m, tlist in self.matchTeams.items():
+            for t in tlist:
+                places[t].add(m)
+        for (en, t), j in self.judged.items():
+            places[t].add((en, j))
+        for inMatches, inSessions in self.blocks:
+            for t, p in places.items():
+                if p.isdisjoint(inMatches) and p.isdisjoint(inSessions):
+                    return False
+        return True
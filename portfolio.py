@@ -0,0 +1,280 @@
+#!/usr/bin/python3
+
+'''Run several CBC processes on the same model, with different random seeds and
+settings, and keep the first (or best) solution.
+
+The solve time of the schedule model depends a lot on the seed, so a few runs in
+parallel usually finish well before a single one. The model is built once, the runs
+are watched through their logs, and the losers are killed as soon as there is a
+winner.'''
+
+import os
+import re
+import sys
+import time
+import random
+import signal
+import subprocess
+
+
+# extra CBC settings, used in turn by the runs
+paramSets = (
+    (),
+    ('-strategy', '2'),
+    ('-cuts', 'off'),
+    ('-feas', 'on', '-passF', '100'),
+    ('-proximity', 'on'),
+    ('-rins', 'on', '-preprocess', 'off'),
+)
+
+
+class SolverRun(object):
+    incumbentExpr = re.compile(r'Integer solution of (\S+) found')
+    statusExpr = re.compile(r'^(?P<status>.*?) - objective value (?P<obj>\S+)')
+
+    def __init__(self, index, seed, params, workDir):
+        self.index = index
+        self.seed = seed
+        self.params = params
+        self.logName = os.path.join(workDir, 'solve_{}.log'.format(index))
+        self.resultName = os.path.join(workDir, 'result_{}.txt'.format(index))
+        self.proc = None
+        self.incumbent = None
+        self._logPos = 0
+        return
+
+    def start(self, cbc, importArg, threads, timeLimit):
+        cmd = [cbc, '-threads', str(threads), '-randomSeed', str(self.seed), '-randomCbcSeed', str(self.seed)]
+        cmd.extend(self.params)
+        cmd.extend(['-import', importArg])
+        if timeLimit is not None:
+            cmd.extend(['-sec', str(timeLimit)])
+        cmd.extend(['-solve', '-stat', '-solution', self.resultName])
+
+        if os.path.exists(self.resultName):
+            os.remove(self.resultName)
+        with open(self.logName, 'w') as logfile:
+            self.proc = subprocess.Popen(cmd, stdout=logfile, stderr=subprocess.STDOUT)
+        return
+
+    def running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def checkLog(self):
+        '''Read any new log output. Returns True if there is a better incumbent.'''
+        with open(self.logName) as logfile:
+            logfile.seek(self._logPos)
+            text = logfile.read()
+            self._logPos = logfile.tell()
+
+        better = False
+        for m in self.incumbentExpr.finditer(text):
+            val = float(m.group(1))
+            if self.incumbent is None or val < self.incumbent:
+                self.incumbent = val
+                better = True
+        return better
+
+    def result(self):
+        '''(status, objective) from the solution file, or None if there is no solution'''
+        if not os.path.exists(self.resultName):
+            return None
+        with open(self.resultName) as infile:
+            m = self.statusExpr.match(infile.readline())
+        if not m:
+            return None
+        status = m.group('status')
+        if 'infeasible' in status.lower() or 'no integer solution' in status.lower():
+            return None
+        return status, float(m.group('obj'))
+
+    def interrupt(self):
+        '''Stop CBC as with Ctrl-C: it still writes the best solution so far. Does not wait for it.'''
+        if self.running():
+            self.proc.send_signal(signal.SIGINT)
+        return
+
+    def wait(self, deadline):
+        '''Wait for CBC to finish, until the time deadline at the latest'''
+        if self.running():
+            try:
+                self.proc.wait(max(0, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                pass
+        return
+
+    def stop(self):
+        if self.running():
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        return
+
+    def __str__(self):
+        return 'run {} (seed {} {})'.format(self.index, self.seed, ' '.join(self.params))
+
+
+class PortfolioRunner(object):
+    def __init__(self, modelFile, workDir='.', cbc='cbc', nRuns=4, threads=1, timeLimit=None, firstFeasible=False, seed=None):
+        '''modelFile is a GMPL model (from writeModel) or an MPS file.
+        firstFeasible: at the first solution found, interrupt all the runs and take the best solution they
+        write, rather than waiting for an optimal one.'''
+
+        self.modelFile = modelFile
+        self.cbc = cbc
+        self.threads = threads
+        self.timeLimit = timeLimit
+        self.firstFeasible = firstFeasible
+
+        rnd = random.Random(seed)
+        self.runs = [SolverRun(i + 1, rnd.randrange(1, 2 ** 31 - 1), paramSets[i % len(paramSets)], workDir)
+                     for i in range(nRuns)]
+        return
+
+    def run(self, poll=1.0):
+        '''Start all the runs and wait for a winner. Returns the winning solution file, or None.'''
+
+        # CBC reads GMPL with a trailing %
+        importArg = self.modelFile
+        if not self.modelFile.lower().endswith(('.mps', '.mps.gz', '.lp')):
+            importArg += '%'
+
+        for r in self.runs:
+            r.start(self.cbc, importArg, self.threads, self.timeLimit)
+        print('Started {} CBC runs'.format(len(self.runs)), file=sys.stderr)
+
+        startT = time.time()
+        winner = None
+        try:
+            winner = self._watch(poll, startT)
+        finally:
+            for r in self.runs:
+                r.stop()
+
+        if winner is None:
+            print('No run found a solution', file=sys.stderr)
+            return None
+        status, obj = winner.result()
+        print('Winner: {} after {:.0f}s: {}, objective {}'.format(winner, time.time() - startT, status, obj), file=sys.stderr)
+        return winner.resultName
+
+    def _watch(self, poll, startT):
+        best = None
+        while True:
+            for r in self.runs:
+                if r.checkLog() and (best is None or r.incumbent < best):
+                    best = r.incumbent
+                    print('{:.0f}s: {} found a solution of {}'.format(time.time() - startT, r, best), file=sys.stderr)
+                    if self.firstFeasible:
+                        # no need to wait for the time limit, CBC writes the solution when interrupted
+                        finished = self._interruptAll()
+                        if finished:
+                            return min(finished, key=lambda r: r.result()[1])
+
+            finished = []
+            for r in self.runs:
+                if not r.running() and r.result() is not None:
+                    finished.append(r)
+                    status, obj = r.result()
+                    if self.firstFeasible or status.startswith('Optimal'):
+                        return r
+
+            if not any(r.running() for r in self.runs):
+                # none proved optimal, take the best one
+                if not finished:
+                    return None
+                return min(finished, key=lambda r: r.result()[1])
+            time.sleep(poll)
+        return None
+
+    def _interruptAll(self, timeout=60):
+        '''Interrupt all the runs, and wait for them together. Returns the runs with a solution.'''
+        for r in self.runs:
+            r.interrupt()
+        deadline = time.time() + timeout
+        for r in self.runs:
+            r.wait(deadline)
+        return [r for r in self.runs if r.result() is not None]
+
+# ====================================================================================================
+
+
+if __name__ == '__main__':
+    import argparse
+    from schedulingModel import ScheduleModel
+    from mpsWriter import MPSWriter
+    from preflight import Preflight
+
+    parser = argparse.ArgumentParser(description='Run several CBC solves of the FLL schedule in parallel')
+    parser.add_argument('-o', '--output', required=True, help='Formatted output base name')
+    parser.add_argument('-k', '--runs', type=int, help='Number of CBC runs (default: cores / threads)')
+    parser.add_argument('--threads', type=int, default=1, help='CBC threads per run (default 1)')
+    parser.add_argument('--cbc', default=os.environ.get('CBC', 'cbc'), help='CBC executable (default $CBC or cbc)')
+    parser.add_argument('--time-limit', type=int, help='Time limit per run (seconds)')
+    parser.add_argument('--first', action='store_true', help='Take the first solution, even if not proven optimal')
+    parser.add_argument('--seed', type=int, help='Seed for picking the run seeds')
+    parser.add_argument('--work', default='portfolio', help='Directory for the model, logs and solutions')
+    parser.add_argument('--model', help='Use this model file (GMPL or MPS) instead of building one')
+    parser.add_argument('-s', '--slots', action='store_true',
+                        help='Use the slot-based match model (fewer binaries, many more rows)')
+    parser.add_argument('--symmetry', action='store_true', help='Add the symmetry breaking orderings to the model')
+    parser.add_argument('--cache', metavar='DIR', help='Reuse or store the model and solution by config hash in DIR')
+    parser.add_argument('configfile', help='Config file (python)')
+
+    args = parser.parse_args()
+
+    config = {}
+    with open(args.configfile, 'rb') as file:
+        exec(file.read(), None, config)
+
+    model = ScheduleModel(config, slotModel=args.slots, symmetryBreaking=args.symmetry)
+
+    preflight = Preflight(model)
+    if preflight.check():
+        preflight.report(sys.stderr)
+        print('The config cannot be scheduled, not solving', file=sys.stderr)
+        sys.exit(2)
+
+    cache = None
+    if args.cache:
+        from modelCache import ModelCache
+
+        cache = ModelCache(args.cache)
+        cacheKey = cache.configKey(config)
+        cached = cache.get(cacheKey, 'solution.txt')
+        if cached is not None:
+            if model.readGoodResults(cached):
+                print('Using cached schedule', cached, file=sys.stderr)
+                model.writeOutput(args.output)
+                sys.exit(0)
+            print('Not using cached schedule', cached, file=sys.stderr)
+
+    os.makedirs(args.work, exist_ok=True)
+    modelFile = args.model
+    if modelFile is None:
+        # MPS straight from the model: CBC skips the GMPL translation in every run
+        modelName = '{}{}.mps'.format('model_slots' if args.slots else 'model', '_sym' if args.symmetry else '')
+        if cache is not None and cache.get(cacheKey, modelName) is not None:
+            modelFile = cache.get(cacheKey, modelName)
+        else:
+            modelFile = os.path.join(args.work, 'fllschedule.mps')
+            MPSWriter(model).writeMPS(modelFile)
+            if cache is not None:
+                cache.put(cacheKey, modelName, srcFile=modelFile)
+
+    nRuns = args.runs
+    if nRuns is None:
+        nRuns = max(1, (os.cpu_count() or 1) // args.threads)
+
+    runner = PortfolioRunner(modelFile, args.work, cbc=args.cbc, nRuns=nRuns, threads=args.threads,
+                             timeLimit=args.time_limit, firstFeasible=args.first, seed=args.seed)
+    result = runner.run()
+    if result is None:
+        sys.exit(1)
+    if cache is not None:
+        if model.readGoodResults(result):
+            cache.put(cacheKey, 'solution.txt', srcFile=result)
+        model.clearSchedule()
+    model.formatOutput(args.output, result)
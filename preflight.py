@@ -0,0 +1,209 @@
+'''Quick checks that a config can be scheduled at all, before spending hours in the solver.
+
+All checks are necessary conditions, counted from the ScheduleModel objects: a
+problem reported here means the model is infeasible, but passing does not prove
+that it is feasible.
+
+  - enough match places for gamesPerTeam, and enough different opponents
+  - maxTeamMatchesPerFields leaves room for gamesPerTeam
+  - enough judge sessions x rooms for every team
+  - one team can fit all its matches around one session of each judged event,
+    with the (padded) travel times
+  - in each time block, the teams which have to be busy then (because the matches
+    and sessions elsewhere cannot hold everyone) are not more than the teams
+  - each schedule block has places for every team'''
+
+import sys
+import itertools
+
+
+class Preflight(object):
+    # above this many session combinations, the team timeline is checked per event
+    maxCombinations = 20000
+
+    def __init__(self, model):
+        self.model = model
+        self.nTeams = len(model.teams)
+        self.nGames = model.matchList.nGamesPerTeam
+        self.matches = model.matchList.matches
+        self.dummy = int(model.matchList.dummyTeam)
+        self.events = sorted(model.judgeEvents.values(), key=lambda e: e.index)
+        self.problems = []
+        return
+
+    def check(self):
+        '''Run all the checks. Returns the list of problems (strings), empty if none found.'''
+        self.problems = []
+        self._checkMatchCount()
+        self._checkFields()
+        self._checkJudgeRooms()
+        self._checkTeamTimeline()
+        self._checkTimeBlocks()
+        self._checkScheduleBlocks()
+        return self.problems
+
+    def report(self, outfile=sys.stdout):
+        if not self.problems:
+            outfile.write('Preflight: no problems found\n')
+        for p in self.problems:
+            outfile.write('Preflight: {}\n'.format(p))
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _matchPlaces(self, m):
+        # the dummy team leaves one side of the last match empty
+        if self.dummy and m is self.matches[-1]:
+            return 1
+        return 2
+
+    @staticmethod
+    def _blocks(item):
+        r = item.timeBlockRange(padded=True)
+        return r.start, r.stop
+
+    @staticmethod
+    def _overlap(a, b):
+        return a[0] < b[1] and b[0] < a[1]
+
+    def _checkMatchCount(self):
+        need = self.nTeams * self.nGames
+        places = sum([self._matchPlaces(m) for m in self.matches])
+        if places < need:
+            self.problems.append('{} teams x {} games need {} match places, the {} matches have only {}'.format(
+                self.nTeams, self.nGames, need, len(self.matches), places))
+        if self.nGames > self.nTeams - 1:
+            self.problems.append('{} games per team without rematches needs at least {} teams, there are {}'.format(
+                self.nGames, self.nGames + 1, self.nTeams))
+        return
+
+    def _checkFields(self):
+        maxMatch = self.model.matchList.maxTeamMatchesPerFields
+        if maxMatch is None:
+            return
+        nFields = sum([len(x) for x in self.model.matchList.tableNames])
+        # maxPerField limits the matches sm, sm+nFields, ... for each sm
+        room = sum([min(maxMatch, len(range(sm, len(self.matches), nFields))) for sm in range(nFields)])
+        if room < self.nGames:
+            self.problems.append('maxTeamMatchesPerFields {} over {} fields allows only {} of the {} games per team'.format(
+                maxMatch, nFields, room, self.nGames))
+        return
+
+    def _checkJudgeRooms(self):
+        for event in self.events:
+            places = len(event.sessions) * len(event.rooms)
+            if places < self.nTeams:
+                self.problems.append('{}: {} sessions x {} rooms = {} places for {} teams'.format(
+                    event.name, len(event.sessions), len(event.rooms), places, self.nTeams))
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _maxMatches(self, busy):
+        '''Most matches one team can play, around the busy block ranges (greedy by end block is optimal
+        for intervals)'''
+        count = 0
+        lastStop = -1
+        for start, stop in self.matchBlocks:
+            if start >= lastStop and not any([self._overlap((start, stop), b) for b in busy]):
+                count += 1
+                lastStop = stop
+        return count
+
+    def _checkTeamTimeline(self):
+        self.matchBlocks = sorted([self._blocks(m) for m in self.matches], key=lambda b: b[1])
+        sessBlocks = [[(s, self._blocks(s)) for s in e.sessions] for e in self.events]
+
+        nCombos = 1
+        for sessions in sessBlocks:
+            nCombos *= len(sessions)
+
+        if nCombos <= self.maxCombinations:
+            groups = [sessBlocks]
+        else:
+            # too many to try: each event on its own, which is a weaker (but still valid) check
+            groups = [[sessions] for sessions in sessBlocks]
+
+        for group in groups:
+            best = -1
+            bestSessions = None
+            for combo in itertools.product(*group):
+                busy = [b for s, b in combo]
+                if any([self._overlap(a, b) for a, b in itertools.combinations(busy, 2)]):
+                    continue
+                n = self._maxMatches(busy)
+                if n > best:
+                    best = n
+                    bestSessions = combo
+                if best >= self.nGames:
+                    break
+
+            names = ', '.join([sessions[0][0].event.name for sessions in group])
+            if bestSessions is None:
+                self.problems.append('no choice of {} sessions for a team is free of overlaps (travel time {} min)'.format(
+                    names, self.model.clock.travelTime))
+            elif best < self.nGames:
+                times = ', '.join(['{} {}-{}'.format(s.event.name, s.startTime(), s.endTime(padded=True)) for s, b in bestSessions])
+                self.problems.append('a team fits at most {} of its {} matches around its {} sessions (best: {}); '
+                                     'the matches are too close together for the travel time ({} min)'.format(
+                                         best, self.nGames, names, times, self.model.clock.travelTime))
+        return
+
+    def _checkTimeBlocks(self):
+        nTimes = self.model.numTimeBlocks()
+        need = self.nTeams * self.nGames
+
+        # places in the matches covering each block, and outside it
+        matchPlaces = [0] * nTimes
+        for m in self.matches:
+            for tm in m.timeBlockRange(padded=True):
+                matchPlaces[tm] += self._matchPlaces(m)
+        totalPlaces = sum([self._matchPlaces(m) for m in self.matches])
+
+        judgePlaces = []
+        for event in self.events:
+            places = [0] * nTimes
+            for s in event.sessions:
+                for tm in s.timeBlockRange(padded=True):
+                    places[tm] += len(event.rooms)
+            judgePlaces.append((event, places, len(event.sessions) * len(event.rooms)))
+
+        bad = []
+        for tm in range(nTimes):
+            # the team appearances which do not fit outside this block happen in it, each by a different team
+            inMatches = max(0, need - (totalPlaces - matchPlaces[tm]))
+            judging = [(event.name, max(0, self.nTeams - (total - places[tm]))) for event, places, total in judgePlaces]
+            busy = inMatches + sum([n for name, n in judging])
+            if busy > self.nTeams:
+                bad.append((tm, busy, inMatches, judging))
+
+        for tm, busy, inMatches, judging in bad[:5]:
+            judged = ''.join([', {} in {}'.format(n, name) for name, n in judging if n > 0])
+            self.problems.append('{}: at least {} teams are needed at once ({} in matches{}), there are {} teams'.format(
+                self.model.timeBlockTime(tm), busy, inMatches, judged, self.nTeams))
+        if len(bad) > 5:
+            self.problems.append('... and {} more over-subscribed time blocks'.format(len(bad) - 5))
+        return
+
+    def _checkScheduleBlocks(self):
+        if self.model.scheduleBlocks is None:
+            return
+
+        for index, (((startMatch, endMatch), sessions), config) in enumerate(zip(self.model.scheduleBlockRanges(),
+                                                                               self.model.scheduleBlocks)):
+            matchPlaces = 0
+            nMatches = 0
+            if startMatch is not None:
+                inBlock = [m for m in self.matches if startMatch <= m.index <= endMatch]
+                nMatches = len(inBlock)
+                matchPlaces = sum([self._matchPlaces(m) for m in inBlock])
+            judgePlaces = 0
+            for evtIndex, startSess, endSess in sessions:
+                event = self.model.findJudgeEvent(evtIndex)
+                judgePlaces += (endSess - startSess + 1) * len(event.rooms)
+
+            if matchPlaces + judgePlaces < self.nTeams:
+                self.problems.append('schedule block {} ({}-{}): {} matches and {} judging places hold only {} teams, '
+                                     'all {} teams need to be in it'.format(index, config[0], config[1], nMatches, judgePlaces,
+                                                                            matchPlaces + judgePlaces, self.nTeams))
+        return
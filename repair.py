@@ -0,0 +1,341 @@
+'''Repair a finished schedule when teams drop out or are added on the day.
+
+Every team not touched by the change keeps its schedule exactly. The teams which are
+touched (the added teams, and the opponents of the dropped teams) are re-assigned with
+a small MIP, whose objective is the number of teams with a changed schedule, plus a
+penalty for each match left with only one team. Then the teams in the match rounds
+around the open tables are freed too, in widening bands, while that helps.
+
+Team indices do not change: dropped teams stay in the team list with nothing scheduled,
+and new teams go on the end. So the repaired solution goes with the old team list plus
+the new teams, and a team with nothing scheduled counts as dropped when repairing again.'''
+
+import sys
+import pulp
+
+from schedulingModel import Match
+
+
+class ScheduleRepairer(object):
+    def __init__(self, model, halfMatchPenalty=2):
+        '''model must have the existing schedule assigned (readResults).
+        halfMatchPenalty: cost of a match with one team, in changed team schedules.'''
+
+        self.model = model
+        self.halfMatchPenalty = halfMatchPenalty
+        self.nFields = sum([len(x) for x in model.matchList.tableNames])
+        self.sessions = [s for e in sorted(model.judgeEvents.values(), key=lambda e: e.index) for s in e.sessions]
+
+        # the dummy team from a pair model solution is just an empty slot here
+        nTeams = len(model.teams)
+        for match in model.matchList.matches:
+            for s, t in enumerate(match.teams):
+                if t is not None and t.index > nTeams:
+                    match.teams[s] = None
+
+        # dropped in an earlier repair
+        self.dropped = [t for t in model.teams if not t.schedule]
+        self.added = []
+        self.original = {}      # team -> set of place keys (see _placeKey) before the repair
+        self.originalRoom = {}  # (team, event index, session index) -> room
+        self.free = set()
+        self.changed = []
+        return
+
+    def dropTeams(self, teamNumbers):
+        '''Take the teams out of the schedule'''
+
+        for num in teamNumbers:
+            team = self._findNumber(num)
+            for evt, slot in list(team.schedule):
+                if self._isMatch(evt):
+                    # the opponent now plays alone
+                    other = evt.teams[1 - slot]
+                    if other is not None:
+                        self.free.add(other)
+                self._unassign(team, evt, slot)
+            self.free.discard(team)
+            self.dropped.append(team)
+            print('Repair: dropped team', num, file=sys.stderr)
+        return
+
+    def addTeams(self, teams):
+        '''Add new Team objects, with nothing scheduled yet'''
+
+        model = self.model
+        for team in teams:
+            team.index = len(model.teams) + 1
+            team.schedule = []
+            model.teams.append(team)
+            self.added.append(team)
+            self.free.add(team)
+            print('Repair: added team', team, file=sys.stderr)
+        return
+
+    def solve(self, timeLimit=5, maxRounds=3, msg=False):
+        '''Re-assign the free teams, then the teams in the match rounds around them, in
+        widening bands, until a schedule is found. Returns True on success.'''
+
+        teams = self.activeTeams()
+        self.original = {t: self._places(t) for t in teams}
+        self.originalRoom = {}
+        for t in teams:
+            for evt, slot in t.schedule:
+                if not self._isMatch(evt):
+                    self.originalRoom[(t, evt.event.index, evt.index)] = slot
+
+        matches = self.model.matchList.matches
+        nTeamMatches = len(teams) * self.model.matchList.nGamesPerTeam
+        minHalf = nTeamMatches % 2
+        if nTeamMatches > 2 * len(matches):
+            print('Repair: {} teams need {} match places, there are only {}'.format(
+                len(teams), nTeamMatches, 2 * len(matches)), file=sys.stderr)
+            return False
+        for event in self.model.judgeEvents.values():
+            places = len(event.rooms) * len(event.sessions)
+            if len(teams) > places:
+                print('Repair: {} has only {} places for {} teams'.format(event.name, places, len(teams)), file=sys.stderr)
+                return False
+
+        # widen while it helps, as far as there are matches with one team to fill
+        affected = set(self.free)
+        best = None
+        for width in range(maxRounds + 1):
+            if width > 0:
+                self.free = affected | self._neighbours(width - 1)
+            result = self._solveFree(timeLimit, msg)
+            print('Repair: {} teams free, objective {}'.format(len(self.free), 'infeasible' if result is None else result[0]), file=sys.stderr)
+            if result is not None:
+                if best is not None and result[0] > best[0] - 0.5:
+                    # a wider band did not help
+                    break
+                best = result
+            if best is not None and sum(best[3]) <= minHalf:
+                break
+            if len(self.free) == len(teams):
+                break
+
+        if best is None:
+            print('Repair: no schedule found, a full re-solve is needed', file=sys.stderr)
+            return False
+        self._apply(*best[1:3])
+
+        self.changed = [t for t in teams if self._places(t) != self.original[t]]
+        half = sum([1 for m in matches if m.teams.count(None) == 1])
+        print('Repair: {} team schedules changed ({}), {} matches with one team'.format(
+            len(self.changed), ' '.join([str(t) for t in sorted(self.changed)]), half), file=sys.stderr)
+        return True
+
+    def activeTeams(self):
+        return [t for t in self.model.teams if t not in self.dropped]
+
+    def removeDropped(self):
+        '''Take the dropped teams out of the team list, for the output. The team indices
+        change, so do this after writing the solution.'''
+
+        self.model.teams = self.activeTeams()
+        for i, t in enumerate(self.model.teams):
+            t.index = i + 1
+        return
+
+    # ----------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _isMatch(evt):
+        return isinstance(evt, Match)
+
+    def _placeKey(self, evt, slot):
+        '''Hashable key of a match side or judge session'''
+        if self._isMatch(evt):
+            return ('match', evt.index, slot)
+        return ('judge', evt.event.index, evt.index)
+
+    def _places(self, team):
+        return set([self._placeKey(evt, slot) for evt, slot in team.schedule])
+
+    def _findNumber(self, num):
+        for t in self.model.teams:
+            if t.teamNumber == num:
+                return t
+        raise Exception('Team {} is not in the schedule'.format(num))
+
+    @staticmethod
+    def _unassign(team, evt, slot):
+        evt.teams[slot] = None
+        team.schedule = [e for e in team.schedule if e[0] is not evt]
+        return
+
+    def _neighbours(self, width):
+        '''Teams which play within width match rounds of a match with an open table'''
+
+        matches = self.model.matchList.matches
+        rounds = set([m.matchNum for m in matches if None in m.teams])
+        near = set([r + d for r in rounds for d in range(-width, width + 1)])
+
+        result = set()
+        for match in matches:
+            if match.matchNum in near:
+                result.update([t for t in match.teams if t is not None])
+        return result
+
+    def _solveFree(self, timeLimit, msg):
+        model = self.model
+        free = sorted(self.free, key=lambda t: t.index)
+        matches = model.matchList.matches
+
+        # open match sides and session places, after taking out the free teams
+        fixedSide = {}
+        for match in matches:
+            for s, t in enumerate(match.teams):
+                fixedSide[(match.index, s)] = t if t not in self.free else None
+        sessRoom = {}
+        for sess in self.sessions:
+            sessRoom[(sess.event.index, sess.index)] = len(sess.teams) - sum([1 for t in sess.teams if t is not None and t not in self.free])
+
+        openSides = [(m.index, s) for m in matches for s in range(2) if fixedSide[(m.index, s)] is None]
+        openMatches = sorted(set([m for m, s in openSides]))
+        openSess = [sess for sess in self.sessions if sessRoom[(sess.event.index, sess.index)] > 0]
+
+        prob = pulp.LpProblem('repair', pulp.LpMinimize)
+        x = {}      # (team, match, side) -> var
+        y = {}      # (team, event, session) -> var
+        for t in free:
+            for m, s in openSides:
+                x[(t.index, m, s)] = pulp.LpVariable('x_{}_{}_{}'.format(t.index, m, s), cat=pulp.LpBinary)
+            for sess in openSess:
+                key = (t.index, sess.event.index, sess.index)
+                y[key] = pulp.LpVariable('y_{}_{}_{}'.format(*key), cat=pulp.LpBinary)
+
+        # objective: changed teams, and matches with one team
+        cost = []
+        for t in free:
+            if t in self.added:
+                continue
+            c = pulp.LpVariable('changed_{}'.format(t.index), lowBound=0)
+            c.setInitialValue(0)
+            cost.append(c)
+            for kind, i1, i2 in self.original[t]:
+                if kind == 'match':
+                    prob += c >= 1 - x[(t.index, i1, i2)]
+                else:
+                    prob += c >= 1 - y[(t.index, i1, i2)]
+
+        occ = {}
+        halfVars = []
+        for m, s in openSides:
+            occ[(m, s)] = pulp.lpSum([x[(t.index, m, s)] for t in free])
+            prob += occ[(m, s)] <= 1
+        for m in openMatches:
+            sides = []
+            for s in range(2):
+                sides.append(occ[(m, s)] if (m, s) in occ else 1)
+            h = pulp.LpVariable('half_{}'.format(m), lowBound=0)
+            h.setInitialValue(1 if matches[m - 1].teams.count(None) == 1 else 0)
+            prob += h >= sides[0] - sides[1]
+            prob += h >= sides[1] - sides[0]
+            cost.append(self.halfMatchPenalty * h)
+            halfVars.append(h)
+        prob += pulp.lpSum(cost)
+
+        for sess in openSess:
+            en, j = sess.event.index, sess.index
+            prob += pulp.lpSum([y[(t.index, en, j)] for t in free]) <= sessRoom[(en, j)]
+
+        nGames = model.matchList.nGamesPerTeam
+        maxPerField = model.matchList.maxTeamMatchesPerFields
+        blockRanges = model.scheduleBlockRanges()
+        for t in free:
+            ti = t.index
+            prob += pulp.lpSum([x[(ti, m, s)] for m, s in openSides]) == nGames
+            for event in model.judgeEvents.values():
+                prob += pulp.lpSum([y[(ti, sess.event.index, sess.index)] for sess in openSess if sess.event.index == event.index]) == 1
+
+            # one place at a time, with travel time
+            blocks = {}
+            for m, s in openSides:
+                for tb in matches[m - 1].timeBlockRange(padded=True):
+                    blocks.setdefault(tb, []).append(x[(ti, m, s)])
+            for sess in openSess:
+                for tb in sess.timeBlockRange(padded=True):
+                    blocks.setdefault(tb, []).append(y[(ti, sess.event.index, sess.index)])
+            for tb, terms in blocks.items():
+                if len(terms) > 1:
+                    prob += pulp.lpSum(terms) <= 1
+
+            # at most one match against each fixed team
+            opponents = {}
+            for m, s in openSides:
+                other = fixedSide[(m, 1 - s)]
+                if other is not None:
+                    opponents.setdefault(other.index, []).append(x[(ti, m, s)])
+            for terms in opponents.values():
+                if len(terms) > 1:
+                    prob += pulp.lpSum(terms) <= 1
+
+            if maxPerField is not None:
+                for f in range(self.nFields):
+                    terms = [x[(ti, m, s)] for m, s in openSides if (m - 1) % self.nFields == f]
+                    if len(terms) > maxPerField:
+                        prob += pulp.lpSum(terms) <= maxPerField
+
+            for (startMatch, endMatch), blkSessions in blockRanges:
+                terms = []
+                if startMatch is not None:
+                    terms.extend([x[(ti, m, s)] for m, s in openSides if startMatch <= m <= endMatch])
+                for en, startSess, endSess in blkSessions:
+                    terms.extend([y[(ti, en, sess.index)] for sess in openSess
+                                  if sess.event.index == en and startSess <= sess.index <= endSess])
+                prob += pulp.lpSum(terms) >= 1
+
+        # at most one match between two free teams
+        bothOpen = [m for m in openMatches if (m, 0) in occ and (m, 1) in occ]
+        for i, t1 in enumerate(free):
+            for t2 in free[i + 1:]:
+                meets = []
+                for m in bothOpen:
+                    p = pulp.LpVariable('meet_{}_{}_{}'.format(t1.index, t2.index, m), lowBound=0)
+                    p.setInitialValue(1 if t1 in matches[m - 1].teams and t2 in matches[m - 1].teams else 0)
+                    prob += p >= x[(t1.index, m, 0)] + x[(t2.index, m, 1)] - 1
+                    prob += p >= x[(t2.index, m, 0)] + x[(t1.index, m, 1)] - 1
+                    meets.append(p)
+                if len(meets) > 1:
+                    prob += pulp.lpSum(meets) <= 1
+
+        # start from the current schedule, where it is complete
+        for (ti, m, s), var in x.items():
+            var.setInitialValue(1 if matches[m - 1].teams[s] is model.findTeam(ti) else 0)
+        for (ti, en, j), var in y.items():
+            var.setInitialValue(1 if model.findTeam(ti) in model.findJudgeEvent(en).findSession(j).teams else 0)
+
+        prob.solve(pulp.PULP_CBC_CMD(msg=msg, timeLimit=timeLimit, warmStart=True))
+        if prob.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+            return None
+
+        matchPlaces = [(model.findTeam(ti), m, s) for (ti, m, s), var in x.items() if var.varValue > 0.5]
+        judgePlaces = [(model.findTeam(ti), en, j) for (ti, en, j), var in y.items() if var.varValue > 0.5]
+        halves = [1 if h.varValue > 0.5 else 0 for h in halfVars]
+        return pulp.value(prob.objective), matchPlaces, judgePlaces, halves
+
+    def _apply(self, matchPlaces, judgePlaces):
+        '''Move the teams to their new places'''
+
+        model = self.model
+        for team in set([p[0] for p in matchPlaces + judgePlaces]):
+            for evt, slot in list(team.schedule):
+                self._unassign(team, evt, slot)
+        for team, m, s in matchPlaces:
+            model.findMatch(m).assignTeam(team, s)
+
+        # teams staying in their session keep their room, then the others fill in
+        moved = []
+        for team, en, j in judgePlaces:
+            sess = model.findJudgeEvent(en).findSession(j)
+            room = self.originalRoom.get((team, en, j), None)
+            if room is not None and sess.teams[room] is None:
+                sess.teams[room] = team
+                team.addEvent(sess, room)
+            else:
+                moved.append((team, sess))
+        for team, sess in moved:
+            sess.assignTeam(team)
+        return
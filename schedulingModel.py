@@ -4,28 +4,35 @@ import sys
 import datetime
 import math
 import re
+import io
 import csv
-import copy
+import gzip
+import shutil
+import contextlib
 import functools
 from dateutil.parser import parse as dateparse
 from random import shuffle, seed
+
+from tableSides import TableSideAssigner
 # from pprint import pprint
 
 
 @functools.total_ordering
 class EventTime(object):
-    # share startT across all instances
-    eventStartTime = None
-    eventEndTime = None   # integer
+    '''Minutes from the event start. Only used at the edges (config and output);
+    the time slots themselves keep plain integers.'''
+
+    __slots__ = ('_minutes', '_clock')
 
-    def __init__(self, tm):
+    def __init__(self, tm, clock):
+        # clock: the EventClock of the model
+        self._clock = clock
         if isinstance(tm, str):
-            dt = dateparse(tm)
-            self._minutes = int((dt - self.eventStartTime).total_seconds() // 60)
+            self._minutes = clock.parse(tm)
         else:
             self._minutes = tm
-        if self.eventEndTime is not None:
-            self._minutes = min(self.eventEndTime, self._minutes)
+        if clock.endMinute is not None:
+            self._minutes = min(clock.endMinute, self._minutes)
         return
 
     def __int__(self):
@@ -39,8 +46,8 @@ class EventTime(object):
             raise TypeError
 
         val = self._minutes + min_incr
-        if self.eventEndTime is not None:
-            val = min(self.eventEndTime, val)
+        if self._clock.endMinute is not None:
+            val = min(self._clock.endMinute, val)
         self._minutes = val
         return self
 
@@ -49,9 +56,9 @@ class EventTime(object):
             raise TypeError
 
         val = self._minutes + min_incr
-        if self.eventEndTime is not None:
-            val = min(self.eventEndTime, val)
-        return EventTime(val)
+        if self._clock.endMinute is not None:
+            val = min(self._clock.endMinute, val)
+        return EventTime(val, self._clock)
 
     def __sub__(self, other):
         if type(other) != type(self):
@@ -72,12 +79,49 @@ class EventTime(object):
         return self._minutes < other._minutes
 
     def __str__(self):
-        return (self.eventStartTime + datetime.timedelta(minutes=self._minutes)).strftime('%H:%M')
+        return self._clock.format(self._minutes)
 
     def __repr__(self):
         return "EventTime('%s')" % str(self)
 
 
+class EventClock(object):
+    '''The time state of one model: the event start and end, the travel time and the
+    time blocks. Each model has its own, so several models can live in one process.'''
+
+    def __init__(self, startTime, travelTime=0):
+        self.startTime = dateparse(startTime)
+        self.endMinute = None         # integer, once the schedule is built
+        self.travelTime = travelTime
+        self.timeBlockBoundaries = []    # integer minutes
+        self.timeBlock2Index = {}
+        self._parsed = {}             # string -> minutes, the config repeats times a lot
+        return
+
+    def parse(self, tm):
+        '''Minutes from the event start for a time string'''
+        minutes = self._parsed.get(tm, None)
+        if minutes is None:
+            minutes = int((dateparse(tm) - self.startTime).total_seconds() // 60)
+            self._parsed[tm] = minutes
+        return minutes
+
+    def format(self, minutes):
+        '''HH:MM string for minutes from the event start'''
+        start = self.startTime
+        h, m = divmod((start.hour * 60 + start.minute + minutes) % (24 * 60), 60)
+        return '{:02d}:{:02d}'.format(h, m)
+
+    def setTimeBlocks(self, alltimes):
+        self.timeBlockBoundaries = list(sorted(alltimes))
+        self.timeBlock2Index = {t: i for i, t in enumerate(self.timeBlockBoundaries)}
+        return
+
+    def numTimeBlocks(self):
+        # 1 less because we are counting regions. timeBlockBoundaries holds the edges
+        return len(self.timeBlock2Index) - 1
+
+
 class Team(object):
     def __init__(self, index, teamNumber, name):
         self.index = index
@@ -106,11 +150,11 @@ class Team(object):
     def travelTime(self):
         minTravel = 10000
         prevET = None
-        for evt, slot in sorted(self.schedule, key=lambda e: e[0].startTime()):
+        for evt, slot in sorted(self.schedule, key=lambda e: e[0].startMinute()):
             if prevET is not None:
-                dt = evt.startTime() - prevET
+                dt = evt.startMinute() - prevET
                 minTravel = min(minTravel, dt)
-            prevET = evt.endTime()
+            prevET = evt.endMinute()
         return minTravel
 
     def inventoryTables(self):
@@ -128,21 +172,6 @@ class Team(object):
 
         return sum([len(t) - 1 for t in self.inventoryTables().values()])
 
-    def minimizeDuplicateTables(self):
-        tbls = self.inventoryTables()
-        matchsets = sorted(tbls.values(), key=lambda t: len(t), reverse=True)
-
-        swapped = False
-        for mlist in matchsets:
-            if len(mlist) == 1:
-                break
-            for match in mlist:
-                if match.trySwapTeams():
-                    swapped = True
-                    break
-
-        return swapped
-
     def outputSchedule(self, outCSV):
         outCSV.writerow((self.teamNumber, self.name))
         outCSV.writerow(('Event', 'Room/Table', 'StartTime', 'EndTime'))
@@ -153,50 +182,70 @@ class Team(object):
 
 @functools.total_ordering
 class TimeSlot(object):
-    travelTime = 0
-    timeBlockBoundaries = []
-    timeBlock2Index = {}
-
-    def __init__(self, index, startT, endT):
+    def __init__(self, clock, index, startT, endT):
+        self.clock = clock
         self.index = index
-        self._startT = copy.copy(startT)
-        self._endT = copy.copy(endT)
+        # plain minutes. EventTime objects are only made for output
+        self._start = int(startT)
+        self._end = int(endT)
         self.extendEnd = 0
         return
 
-    @classmethod
-    def setTimeBlocks(cls, alltimes):
-        cls.timeBlockBoundaries = list(sorted(alltimes))
-        cls.timeBlock2Index = {t: i for i, t in enumerate(cls.timeBlockBoundaries)}
-        return
+    def startMinute(self):
+        return self._start
 
-    @classmethod
-    def numTimeBlocks(cls):
-        # 1 less because we are counting regions. timeBlockBoundaries holds the edges
-        return len(cls.timeBlock2Index) - 1
+    def endMinute(self, padded=False):
+        if padded:
+            et = self._end + self.clock.travelTime + self.extendEnd
+            if self.clock.endMinute is not None:
+                et = min(self.clock.endMinute, et)
+            return et
+        return self._end
 
     def startTime(self):
-        return self._startT
+        return EventTime(self._start, self.clock)
 
     def endTime(self, padded=False):
-        if padded:
-            return self._endT + (self.travelTime + self.extendEnd)
-        return self._endT
+        return EventTime(self.endMinute(padded), self.clock)
 
     def timeBlockRange(self, padded=False):
-        return range(self.timeBlock2Index[self._startT], self.timeBlock2Index[self.endTime(padded)])
+        return range(self.clock.timeBlock2Index[self._start], self.clock.timeBlock2Index[self.endMinute(padded)])
 
     def __eq__(self, other):
         if not isinstance(other, TimeSlot):
             raise TypeError("Unsupported type %s" % type(other))
 
-        return self._startT == other._startT
+        return self._start == other._start
 
     def __lt__(self, other):
         if not isinstance(other, TimeSlot):
             raise TypeError
 
-        return self._startT < other._startT
+        return self._start < other._start
+
+
+@functools.lru_cache(maxsize=None)
+def latinRotation(nRooms, roomCounts):
+    '''Sub-event rotation for the nRooms teams of a block judging session: for each team, per
+    sub-session, (sub-event index, room index). roomCounts is the number of rooms of each
+    sub-event, and there is one sub-session per sub-event.
+
+    The rows of a cyclic Latin square: a team with shift g does sub-event (s + g) % k in
+    sub-session s. The teams are spread over the k shifts as evenly as possible, so at most
+    ceil(nRooms / k) teams share a shift, and those are the teams in one sub-event at one time;
+    they take its rooms in order. That fits whenever nRooms <= k * min(roomCounts), which any
+    rotation needs anyway (each team visits each sub-event in one of the k sub-sessions).'''
+
+    k = len(roomCounts)
+    if nRooms > k * min(roomCounts):
+        return None
+
+    rotations = []
+    for rmIndex in range(nRooms):
+        shift = rmIndex * k // nRooms
+        first = -(-shift * nRooms // k)     # first team with this shift
+        rotations.append(tuple([((s + shift) % k, rmIndex - first) for s in range(k)]))
+    return tuple(rotations)
 
 
 class JudgeEvent(object):
@@ -221,50 +270,33 @@ class JudgeEvent(object):
 
         times = []
         sT = 0
-        evtRoom = []
         for se in config['events']:
             eT = sT + sessLen
             times.append((sT, eT))
 
             self.blockEvents[se['name']] = se['rooms']
-            nRooms1 = len(se['rooms'])
-            for r in se['rooms']:
-                evtRoom.append((se['name'], r))
 
             sT += deltaT
 
-        step = 0
-        results = {}
+        nRooms = len(self.rooms)
+        roomCounts = tuple([len(se['rooms']) for se in config['events']])
+        for se, nSubRooms in zip(config['events'], roomCounts):
+            # each team goes to the sub-event in one of the nSessions sub-sessions
+            if nRooms > nSessions * nSubRooms:
+                print('Error: {} has {} room(s) in {} sub-sessions, room for {} of the {} teams of a {} session'.format(
+                    se['name'], nSubRooms, nSessions, nSessions * nSubRooms, nRooms, self.name), file=sys.stderr)
+                sys.exit(10)
 
-        for rmIndex, rm in enumerate(self.rooms):
+        results = {}
+        for rm, rotation in zip(self.rooms, latinRotation(nRooms, roomCounts)):
             reslist = []
-
-            used = set()
-            seRmIndex = rmIndex % nRooms1
-
-            for seLoop in range(nSessions):
-                trials = 0
-                while step > 0 and seRmIndex in used:
-                    seRmIndex = (seRmIndex + 1) % nRooms1
-                    trials += 1
-                    if trials >= nRooms1:
-                        print("Error: no available room")
-                        sys.exit(10)
-
-                seIndex = (seLoop + step) % nSessions
+            for seLoop, (seIndex, seRmIndex) in enumerate(rotation):
                 reslist.append({'session': seLoop,
                                 'event': config['events'][seIndex]['name'],
                                 'room': config['events'][seIndex]['rooms'][seRmIndex],
                                 'startTM': times[seLoop][0],
                                 'endTM': times[seLoop][1]})
-
-                used.add(seRmIndex)
-                seRmIndex = (seRmIndex + step) % nRooms1
-
-            # results[rm] = sorted(reslist, key=lambda x: x['session'])
             results[rm] = reslist
-            if (rmIndex + 1) % nRooms1 == 0:
-                step += 1
 
         self.subSchedule = results
         return
@@ -294,8 +326,8 @@ class JudgeEvent(object):
 
 
 class JudgeSession(TimeSlot):
-    def __init__(self, event, index, startT, endT, penalty=0):
-        TimeSlot.__init__(self, index, startT, endT)
+    def __init__(self, clock, event, index, startT, endT, penalty=0):
+        TimeSlot.__init__(self, clock, index, startT, endT)
         self.event = event
         self.penalty = penalty
         self.teams = len(self.event.rooms) * [None, ]
@@ -346,7 +378,7 @@ class JudgeSession(TimeSlot):
             for i in range(len(self.teams)):
                 if self.teams[i] is not None:
                     row[self.event.rooms[i]] = self.teams[i].teamNumber
-            entries[self.event.name][self.startT] = row
+            entries[self.event.name][self.startMinute()] = row
         return
 
 
@@ -391,15 +423,23 @@ class MatchList(object):
 
 
 class Match(TimeSlot):
-    def __init__(self, index, startT, endT, matchNum, table):
-        TimeSlot.__init__(self, index, startT, endT)
+    def __init__(self, clock, index, startT, endT, matchNum, table):
+        TimeSlot.__init__(self, clock, index, startT, endT)
         self.matchNum = matchNum
         self.table = table
         # self.penalty = penalty
         self.teams = [None, None]
         return
 
-    def assignTeam(self, team):
+    def assignTeam(self, team, slot=None):
+        if slot is not None:
+            # slot model gives the table side directly
+            if self.teams[slot] is not None:
+                raise Exception("Match slot already filled")
+            self.teams[slot] = team
+            team.addEvent(self, slot)
+            return
+
         slots = [0, 1]
         shuffle(slots)
         for i in slots:
@@ -429,54 +469,55 @@ class Match(TimeSlot):
         t1 = self.teams[1]
         self.teams[0] = t1
         self.teams[1] = t0
-        # make sure to change the entries in the team
-        for e in t0.schedule:
-            if e[0] == self:
-                e[1] = 1
-                break
-        for e in t1.schedule:
-            if e[0] == self:
-                e[1] = 0
-                break
+        # make sure to change the entries in the team. A slot may be empty (dummy team)
+        if t0 is not None:
+            for e in t0.schedule:
+                if e[0] is self:
+                    e[1] = 1
+                    break
+        if t1 is not None:
+            for e in t1.schedule:
+                if e[0] is self:
+                    e[1] = 0
+                    break
         return
 
-    def trySwapTeams(self):
-        '''Try to swap the team slots to reduce table duplication in the teams'''
-
-        cnts_start = [t.countDuplicateTables() for t in self.teams]
-        self.swapTeams()
-        cnts_end = [t.countDuplicateTables() for t in self.teams]
-        if max(cnts_end) < max(cnts_start) or sum(cnts_end) < sum(cnts_start):
-            # success
-            return True
-        self.swapTeams()
-        return False
-
     def outputTeamSchedule(self, slot, outCSV):
         outCSV.writerow(('Match {}'.format(self.matchNum), self.tableName(slot), self.startTime(), self.endTime()))
         return
 
 
 class ScheduleModel(object):
-    # GLPK solver
-    # lineExpr = r'^\s*[0-9]+ matchAssign\[(?P<m>[^,]+),(?P<t1>[^,]+),(?P<t2>[^,]+)\]\s+\*\s+(?P<val>[0-9]+)'
-
-    # CBC solver (seems to be faster)
-    modelLineExpr = r'^\s*[0-9]+ (?P<type>match|judge)Assign\[(?P<i1>[^,]+),(?P<i2>[^,]+),(?P<i3>[^,]+)\]\s+(?P<val>[0-9]+)'
-
-    def __init__(self, config):
-        EventTime.eventStartTime = dateparse(config['startTime'])
-
+    # Solution files. The patterns skip the zero entries themselves, so only nonzeros reach python:
+    #   CBC:  "  118 matchAssign[4,1,15]   1   0" (long names wrap the values onto the next line,
+    #         "**" flags infeasibilities, -printingOptions all lists the zeros too)
+    #   CBC csv: "matchAssign[4,1,15],1"
+    #   GLPK --output: "  118 matchAssign[4,1,15]" then "  *  1  0  1" on the next line
+    #   LP format models (mpsWriter) name the variables matchAssign(4,1,15)
+    # One pattern per variable, as a literal start makes the scan much faster.
+    resultExprs = [(kind, re.compile(kind + r'Assign[\[(]([0-9]+),([0-9]+),([0-9]+)[\])]"?[\s,]+(?:\*\s+)?'
+                                     r'(?!-?0(?:\.0*)?(?:[\s,]|$))([-+]?[0-9.]+(?:[eE][-+]?[0-9]+)?)'))
+                   for kind in ('match', 'slot', 'judge')]
+
+    def __init__(self, config, slotModel=False, symmetryBreaking=False):
+        # slotModel: assign teams to match slots instead of pairs (see _teamMatchSum)
+        self.slotModel = slotModel
+        # symmetryBreaking: order the interchangeable teams and matches (see teamOrderWindows)
+        self.symmetryBreaking = symmetryBreaking
+
+        self.clock = EventClock(config['startTime'], config['travelTime'])
         self.eventDuration = 0
-        TimeSlot.travelTime = config['travelTime']
 
         self.teams = ScheduleModel._readTeams(config['teams'])
+        # the number of teams the matches and judge sessions are laid out for: a repaired
+        # schedule keeps the layout of the original event (see --drop/--add)
+        self.layoutTeams = config.get('layoutTeams', len(self.teams))
 
         self._createMatches(config['matchInfo'])
 
         self.hasJudgePenalty = False
         self._createJudgeSessions(config['judgeEvents'])
-        EventTime.eventEndTime = self.eventDuration
+        self.clock.endMinute = self.eventDuration
 
         self.scheduleBlocks = config.get('scheduleBlocks', None)
 
@@ -505,18 +546,109 @@ class ScheduleModel(object):
                 return e
         return None
 
+    def numTimeBlocks(self):
+        return self.clock.numTimeBlocks()
+
+    def timeBlockTime(self, tm):
+        '''Start of time block tm'''
+        return EventTime(self.clock.timeBlockBoundaries[tm], self.clock)
+
+    def locationCliques(self, judging=True):
+        '''The maximal sets of sessions and matches which overlap in time (padded), for teamLocation.
+
+        Returns a list of (tm, sessions, matches): a time block where the clique is active, the
+        (event index, session index) pairs and the match indices. Slots are intervals of time blocks,
+        so each maximal clique is the set of slots covering some block, one not covered by a neighbour.
+        judging=False leaves out the judge sessions (for fixed judging).'''
+
+        nTimes = self.numTimeBlocks()
+        sessions = [set() for tm in range(nTimes)]
+        matches = [set() for tm in range(nTimes)]
+        if judging:
+            for event in self.judgeEvents.values():
+                for s in event.sessions:
+                    for tm in s.timeBlockRange(padded=True):
+                        sessions[tm].add((event.index, s.index))
+        for match in self.matchList.matches:
+            for tm in match.timeBlockRange(padded=True):
+                matches[tm].add(match.index)
+
+        cliques = []
+        for tm in range(nTimes):
+            if not sessions[tm] and not matches[tm]:
+                continue
+            # keep the first of equal neighbours
+            if tm > 0 and sessions[tm] <= sessions[tm - 1] and matches[tm] <= matches[tm - 1]:
+                continue
+            if tm < nTimes - 1 and sessions[tm] <= sessions[tm + 1] and matches[tm] <= matches[tm + 1] \
+                    and (sessions[tm] != sessions[tm + 1] or matches[tm] != matches[tm + 1]):
+                continue
+            cliques.append((tm, sorted(sessions[tm]), sorted(matches[tm])))
+        return cliques
+
+    def teamOrderWindows(self):
+        '''The judge sessions each team may have in one event, for the teamOrder symmetry breaking.
+
+        Symmetry breaking (with symmetryBreaking set) adds two orderings, neither of which loses a schedule:
+          - teamOrder: nothing in the model depends on a team's index (the dummy team stays last), so
+            any schedule can have its teams relabelled in order of their session in one judged event.
+            With at most R teams per session, team t then has a session from ceil(t / R) to
+            nSessions + 1 - ceil((nTeams - t + 1) / R); the sessions outside that are fixed to 0.
+            (Ordering rows on the session numbers say more, but CBC finds solutions far slower with them.)
+          - matchOrder (pair model): matches with the same (padded) times, in the same schedule blocks
+            and with no field limits, can swap teams. That changes neither the relabelling nor the
+            judging, so they can then be sorted by their lowest team, empty matches first (see
+            orderedMatches). In the slot model this, and putting the lower team on side 1, made CBC
+            slower, so it only gets teamOrder.
+        Each step keeps the schedule feasible with the same objective. Only the tables the teams
+        play on can differ, and the table sides are optimised afterwards anyway.
+
+        The event is the one which fixes the most sessions. Returns (event index, {team index: (first,
+        last session)}), or (None, {}) if no session can be fixed.'''
+
+        best = (0, None, {})
+        nTeams = len(self.teams)
+        for event in sorted(self.judgeEvents.values(), key=lambda e: e.index):
+            nRooms = len(event.rooms)
+            nSess = len(event.sessions)
+            windows = {}
+            for t in range(1, nTeams + 1):
+                windows[t] = (int(math.ceil(float(t) / nRooms)), nSess + 1 - int(math.ceil(float(nTeams - t + 1) / nRooms)))
+            fixed = sum([nSess - max(0, last - first + 1) for first, last in windows.values()])
+            if fixed > best[0]:
+                best = (fixed, event.index, windows)
+        return best[1], best[2]
+
+    def orderedMatches(self):
+        '''Match indices m where matches m and m+1 are interchangeable, for the matchOrder symmetry
+        breaking (see teamOrderWindows)'''
+
+        if self.matchList.maxTeamMatchesPerFields is not None:
+            # the field limits tell the tables apart
+            return []
+
+        matches = self.matchList.matches
+        lastFull = len(matches) - 1 if self.matchList.dummyTeam else len(matches)
+        blocks = [r for r, sessions in self.scheduleBlockRanges() if r[0] is not None]
+
+        def signature(m):
+            return (m.startMinute(), m.endMinute(), m.endMinute(padded=True),
+                    tuple([st <= m.index <= et for st, et in blocks]))
+
+        return [m.index for m, m2 in zip(matches[:lastFull - 1], matches[1:lastFull]) if signature(m) == signature(m2)]
+
     def setTimeBlocks(self):
         alltimes = set()
         for e in self.judgeEvents.values():
             for s in e.sessions:
-                alltimes.add(s.startTime())
-                alltimes.add(s.endTime(padded=True))
+                alltimes.add(s.startMinute())
+                alltimes.add(s.endMinute(padded=True))
 
         for e in self.matchList.matches:
-            alltimes.add(e.startTime())
-            alltimes.add(e.endTime(padded=True))
+            alltimes.add(e.startMinute())
+            alltimes.add(e.endMinute(padded=True))
 
-        TimeSlot.setTimeBlocks(alltimes)
+        self.clock.setTimeBlocks(alltimes)
         return
 
     # ----------------------------------------------------------------------------------------------------
@@ -534,8 +666,8 @@ class ScheduleModel(object):
     def _readBreaks(self, times):
         breaks = []
         for brkSt, brkEt in times:
-            st = EventTime(brkSt)
-            et = EventTime(brkEt)
+            st = EventTime(brkSt, self.clock)
+            et = EventTime(brkEt, self.clock)
             breaks.append((st, et))
         return breaks
 
@@ -548,7 +680,7 @@ class ScheduleModel(object):
 
         resetAfterBreak = config.get('resetAfterBreak', False)
 
-        nTeams = len(self.teams)
+        nTeams = self.layoutTeams
         nMatchesFloat = float(nTeams) * self.matchList.nGamesPerTeam / 2 + config.get('extraMatches', 0)
         nMatches = int(math.ceil(nMatchesFloat))
 
@@ -557,19 +689,19 @@ class ScheduleModel(object):
         breakTimes = self._readBreaks(config['breakTimes'])
 
         if 'resetAfterBreak' in config:
-            resetAfterBreak = [EventTime(t) for t in config['resetAfterBreak']]
+            resetAfterBreak = [EventTime(t, self.clock) for t in config['resetAfterBreak']]
         else:
             resetAfterBreak = ()
 
         if 'oneFieldOnly' in config:
-            oneFieldOnly = [EventTime(t) for t in config['oneFieldOnly']]
+            oneFieldOnly = [EventTime(t, self.clock) for t in config['oneFieldOnly']]
         else:
             oneFieldOnly = {}
 
         # ------------------------------
         # compute matches times, names
 
-        startT = EventTime(0)
+        startT = EventTime(0, self.clock)
         mLen = config['matchLen']
         dt = mLen + self.matchList.breakTime
 
@@ -585,7 +717,7 @@ class ScheduleModel(object):
 
             for tbl in config['tableNames'][tblSet]:
                 matchIndex += 1
-                self.matchList.matches.append(Match(matchIndex, startT, endT, matchSession, tbl))
+                self.matchList.matches.append(Match(self.clock, matchIndex, startT, endT, matchSession, tbl))
                 if matchIndex >= nMatches:
                     break
                 if oneField:
@@ -611,11 +743,11 @@ class ScheduleModel(object):
             # extend over breaks so teams have decent amount of time
             # can help if breaks don't happen because of overruns
             for st, et, delT in config['extendSessions']:
-                startT1 = EventTime(st)
-                endT1 = EventTime(et)
+                startT1 = int(EventTime(st, self.clock))
+                endT1 = int(EventTime(et, self.clock))
 
                 for m in self.matchList.matches:
-                    if m.startTime() >= startT1 and m.startTime() < endT1:
+                    if m.startMinute() >= startT1 and m.startMinute() < endT1:
                         m.extendEnd = delT
 
         return
@@ -630,12 +762,12 @@ class ScheduleModel(object):
             event.rooms = judgeInfo['rooms']
 
             breakTimes = self._readBreaks(judgeInfo['breakTimes'])
-            startT = EventTime(0)
+            startT = EventTime(0, self.clock)
             sLen = judgeInfo['sessionLen']
             dt = sLen + judgeInfo['sessionBreak']
 
-            nSessFull = len(self.teams) / len(judgeInfo['rooms'])
-            nSess = int(math.ceil(len(self.teams) / len(judgeInfo['rooms'])))
+            nSessFull = self.layoutTeams / len(judgeInfo['rooms'])
+            nSess = int(math.ceil(self.layoutTeams / len(judgeInfo['rooms'])))
 
             for sessIndex in range(1, nSess+1):
                 pen = 0
@@ -643,7 +775,7 @@ class ScheduleModel(object):
                     pen = 10
                     self.hasJudgePenalty = True
                 endT = startT + sLen
-                session = JudgeSession(event, sessIndex, startT, endT, pen)
+                session = JudgeSession(self.clock, event, sessIndex, startT, endT, pen)
                 event.sessions.append(session)
 
                 startT += dt
@@ -655,12 +787,12 @@ class ScheduleModel(object):
 
             if 'extendSessions' in judgeInfo:
                 # extend over lunch so teams have decent amount of time
-                st = EventTime(judgeInfo['extendSessions'][0])
-                et = EventTime(judgeInfo['extendSessions'][1])
+                st = int(EventTime(judgeInfo['extendSessions'][0], self.clock))
+                et = int(EventTime(judgeInfo['extendSessions'][1], self.clock))
                 delT = judgeInfo['extendSessions'][2]
 
                 for jS in event.sessions:
-                    if jS.startT >= st and jS.startT < et:
+                    if jS.startMinute() >= st and jS.startMinute() < et:
                         jS.extendEnd = delT
 
             if 'subEvents' in judgeInfo:
@@ -675,91 +807,132 @@ class ScheduleModel(object):
     # ----------------------------------------------------------------------------------------------------
     # Output model file
 
-    def writeModel(self):
+    def writeModel(self, data=True):
+        '''The model section is the same for every event (it is shipped as fllschedule.mod and
+        fllschedule_slots.mod), everything from the config goes into the data section.'''
         self._writeParams()
         self._writeObjective()
         self._handleScheduleBlocks()
         self._handleFieldDistribution()
-        self._writeData()
+        self._writeSymmetryBreaking()
+        if data:
+            self.writeData()
+        else:
+            print('end;')
         return
 
-    def _writeParams(self):
+    def _maxTeams(self):
         maxTeams = len(self.teams)
         if self.matchList.dummyTeam:
             maxTeams += 1
+        return maxTeams
+
+    def _teamMatchSum(self, matchSet='m in matches'):
+        '''GMPL expression for the number of matches in matchSet which team t plays.'''
 
-        print('# Model created', datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if self.slotModel:
+            return '(sum{{{0}, s in slots}} slotAssign[m,s,t])'.format(matchSet)
+        return ('(sum{{{0}, t2 in 1 .. t-1}} matchAssign[m,t2,t]) +\n'
+                '     (sum{{{0}, t2 in t+1 .. maxTeams}} matchAssign[m,t,t2])').format(matchSet)
+
+    def _writeParams(self):
+        print('# FLL schedule model ({} matches)'.format('slot' if self.slotModel else 'pair'))
 
         print()
-        print('set teams := 1 .. %d;' % len(self.teams))
-        print('set matches := 1 .. %d;' % len(self.matchList.matches))
+        print('param nTeams, integer, > 0;')
+        print('# 1 if the last match has only one team')
+        print('param dummyTeam, binary, default 0;')
+        print('param maxTeams := nTeams + dummyTeam;')
+        print('param nMatches, integer, > 0;')
+        print('param gamesPerTeam, integer, > 0;')
+        print('param nJudgeEvents, integer, > 0;')
+        print('# maximal sets of overlapping sessions and matches')
+        print('param nCliques, integer, > 0;')
 
-        print('set judgeEvents := 1 .. %d;' % len(self.judgeEvents))
+        print()
+        print('set teams := 1 .. nTeams;')
+        print('set matches := 1 .. nMatches;')
+
+        print('set judgeEvents := 1 .. nJudgeEvents;')
         print('param nJudgeSessions{en in judgeEvents};')
+        print('param judgeRooms{en in judgeEvents};')
         print('set judgeSessions{en in judgeEvents} := 1 .. nJudgeSessions[en];')
 
-        print('set times := 0 .. %d;' % (TimeSlot.numTimeBlocks() - 1))
+        print('set cliques := 1 .. nCliques;')
+        print('set cliqueSessions{c in cliques}, dimen 2;')
+        print('set cliqueMatches{c in cliques};')
 
         print()
-        print('var matchAssign{m in matches, t1 in teams, t2 in t1+1 .. %d}, binary;' % maxTeams)
+        if self.slotModel:
+            # teams go into the 2 sides of a match. pairAssign only links the pairs
+            #  to catch rematches, so it does not need to be integer. It is still a column
+            #  (and a pairLink row) per match and pair: most of the model.
+            print('set slots := 1 .. 2;')
+            print('var slotAssign{m in matches, s in slots, t in teams}, binary;')
+            print('var pairAssign{m in matches, t1 in teams, t2 in t1+1 .. nTeams}, >= 0;')
+        else:
+            print('var matchAssign{m in matches, t1 in teams, t2 in t1+1 .. maxTeams}, binary;')
         # if self.hasMatchPenalty:
         #     print('param matchPenalties{m in matches}, default 0, >= 0;')
 
         print('var judgeAssign{en in judgeEvents, j in judgeSessions[en], t in teams}, binary;')
-        if self.hasJudgePenalty:
-            print('param judgePenalties{en in judgeEvents,j in judgeSessions[en]}, default 0, >= 0;')
-
-        print()
-        print('param judgeEventTimes{en in judgeEvents,judgeSessions[en], tm in times}, binary, default 0;')
-        print('param matchTimes{m in matches, tm in times}, binary, default 0;')
+        print('param judgePenalties{en in judgeEvents,j in judgeSessions[en]}, default 0, >= 0;')
 
         return
 
     def _writeObjective(self):
-        maxTeams = len(self.teams)
-        if self.matchList.dummyTeam:
-            maxTeams += 1
-
         print()
         print('minimize f:')
-        done = False
         # if self.hasMatchPenalty:
         #    print('    sum{m in matches,t in teams,t2 in t+1 ..', nTeams+1, '} matchPenalties[m] * matchAssign[m,t,t2] +'.format_map(params))
         #    print('    sum{m in matches,t in 1 ..', nTeams, ',t2 in 1 .. t-1} matchPenalties[m] * matchAssign[m,t2,t]', end='')
-        #    done = True
-        if self.hasJudgePenalty:
-            if done:
-                print(' +')
-            print('    sum{en in judgeEvents,j in judgeSessions[en],t in teams} judgePenalties[en,j] * judgeAssign[en,j,t]', end='')
-            done = True
-        if not done:
-            print('    1', end='')
-        print(';')
+        # without penalties (all 0) the objective is empty, which is fine
+        print('    sum{en in judgeEvents,j in judgeSessions[en],t in teams} judgePenalties[en,j] * judgeAssign[en,j,t];')
 
         print()
         print('# number of matches for each team')
         print('s.t. teamMatches{t in teams}:')
-        print('     (sum{m in matches, t2 in 1 .. t-1} matchAssign[m,t2,t]) +')
-        print('     (sum{m in matches, t2 in t+1 .. %d} matchAssign[m,t,t2]) = %d;' % (maxTeams, self.matchList.nGamesPerTeam))
-        if self.matchList.dummyTeam:
-            print('s.t. dummyMatch:')
-            print('     (sum{{t in teams}} matchAssign[{},t,{}]) = 1;'.format(len(self.matchList.matches), maxTeams))
-            print('s.t. dummyNonMatch{{t in teams,m in 1 .. {}}}:'.format(len(self.matchList.matches)-1))
-            print('     matchAssign[m,t,{}] = 0;'.format(maxTeams))
+        print('     %s = gamesPerTeam;' % self._teamMatchSum())
+
+        # the dummy constraints have a {1 .. dummyTeam} domain, so they only exist with a dummy team
+        if self.slotModel:
+            # the dummy team is just an empty 2nd slot in the last match
+            print('s.t. dummyMatch{d in 1 .. dummyTeam}:')
+            print('     sum{t in teams} slotAssign[nMatches,1,t] = 1;')
+            print('s.t. dummySlot{d in 1 .. dummyTeam}:')
+            print('     sum{t in teams} slotAssign[nMatches,2,t] = 0;')
+
+            print('# only one team per match slot')
+            print('s.t. teamsPerMatch{m in matches, s in slots}:')
+            print('     sum{t in teams} slotAssign[m,s,t] <= 1;')
+            print('# both sides are filled, or neither')
+            print('s.t. slotFill{m in 1 .. nMatches - dummyTeam}:')
+            print('     sum{t in teams} slotAssign[m,1,t] = sum{t in teams} slotAssign[m,2,t];')
+
+            print('# no re-matches')
+            print('s.t. pairLink{m in matches, t1 in teams, t2 in t1+1 .. nTeams}:')
+            print('     sum{s in slots} (slotAssign[m,s,t1] + slotAssign[m,s,t2]) - 1 <= pairAssign[m,t1,t2];')
+            print('s.t. rematches{t1 in teams, t2 in t1+1 .. nTeams}:')
+            print('     sum{m in matches} pairAssign[m,t1,t2] <= 1;')
 
-        print('# only one pair per match')
-        print('s.t. teamsPerMatch{m in matches}:')
-        print('     sum{t1 in teams, t2 in t1+1 .. %d} matchAssign[m,t1,t2] <= 1;' % maxTeams)
+        else:
+            print('s.t. dummyMatch{d in 1 .. dummyTeam}:')
+            print('     (sum{t in teams} matchAssign[nMatches,t,maxTeams]) = 1;')
+            print('s.t. dummyNonMatch{t in teams, m in 1 .. nMatches - 1: dummyTeam = 1}:')
+            print('     matchAssign[m,t,maxTeams] = 0;')
+
+            print('# only one pair per match')
+            print('s.t. teamsPerMatch{m in matches}:')
+            print('     sum{t1 in teams, t2 in t1+1 .. maxTeams} matchAssign[m,t1,t2] <= 1;')
 
-        print('# no re-matches')
-        print('s.t. rematches{t1 in teams, t2 in t1+1 .. %d}:' % maxTeams)
-        print('     sum{m in matches} matchAssign[m,t1,t2] <= 1;')
+            print('# no re-matches')
+            print('s.t. rematches{t1 in teams, t2 in t1+1 .. maxTeams}:')
+            print('     sum{m in matches} matchAssign[m,t1,t2] <= 1;')
 
         print()
         print('# number of teams per judge slot')
-        for jName, event in self.judgeEvents.items():
-            print('s.t. {}Slots{{j in judgeSessions[{}]}}:'.format(jName, event.index))
-            print('     sum{t in teams} judgeAssign[%d,j,t] <= %d;' % (event.index, len(event.rooms)))
+        print('s.t. judgeSlots{en in judgeEvents, j in judgeSessions[en]}:')
+        print('     sum{t in teams} judgeAssign[en,j,t] <= judgeRooms[en];')
 
         print('# teams get judged exactly once per event type')
         print('s.t. teamJudgings{en in judgeEvents,t in teams}:')
@@ -767,81 +940,118 @@ class ScheduleModel(object):
 
         print()
         print('# team can only be in once place at a time')
-        print('s.t. teamLocation{t in teams,tm in times}:')
-        print('     (sum{je in judgeEvents, j in judgeSessions[je]} judgeAssign[je,j,t] * judgeEventTimes[je,j,tm]) +')
-        print('     (sum{t2 in 1 .. t-1, m in matches} matchAssign[m,t2,t] * matchTimes[m,tm]) +')
-        print('     (sum{t2 in t+1 .. %d, m in matches} matchAssign[m,t,t2] * matchTimes[m,tm]) <= 1;' % maxTeams)
+        print('s.t. teamLocation{t in teams,c in cliques}:')
+        print('     (sum{(je,j) in cliqueSessions[c]} judgeAssign[je,j,t]) +')
+        print('     %s <= 1;' % self._teamMatchSum('m in cliqueMatches[c]'))
 
         return
 
-    def _handleScheduleBlocks(self):
-        if self.scheduleBlocks is None:
-            return
+    def scheduleBlockRanges(self):
+        '''Find the matches and judge sessions which fall in each schedule block.
 
-        maxTeams = len(self.teams)
-        if self.matchList.dummyTeam:
-            maxTeams += 1
+        Returns a list of ((startMatch, endMatch), [(evtIndex, startSess, endSess), ...])'''
 
-        print()
-        index = 0
+        if self.scheduleBlocks is None:
+            return []
+
+        blocks = []
         for st, et, judgeEvts in self.scheduleBlocks:
-            startT = EventTime(st)
-            endT = EventTime(et)
+            startT = int(EventTime(st, self.clock))
+            endT = int(EventTime(et, self.clock))
 
             startMatch = None
             endMatch = None
             for m in self.matchList.matches:
-                if startMatch is None and m.startTime() >= startT:
+                if startMatch is None and m.startMinute() >= startT:
                     startMatch = m.index
-                if m.endTime() <= endT:
+                if m.endMinute() <= endT:
                     endMatch = m.index
             if startMatch is not None and endMatch is None:
-                endMatch = self.matches.matchList[-1].index
-
-            print('s.t. scheduleBlock{}{{t in teams}}:'.format(index))
-            print('    (sum{{m in {0} .. {1}, t2 in t+1 .. {2}}} matchAssign[m,t,t2])'.format(startMatch, endMatch, maxTeams))
-            print('    + (sum{{m in {0} .. {1}, t2 in 1 .. t-1}} matchAssign[m,t2,t])'.format(startMatch, endMatch))
+                endMatch = self.matchList.matches[-1].index
 
+            sessions = []
             for m in judgeEvts:
                 startSess = None
                 endSess = None
                 evtIndex = self.judgeEvents[m].index
                 for s in self.judgeEvents[m].sessions:
-                    if startSess is None and s.startTime() >= startT:
+                    if startSess is None and s.startMinute() >= startT:
                         startSess = s.index
-                    if s.endTime() <= endT:
+                    if s.endMinute() <= endT:
                         endSess = s.index
                 if startSess is not None:
-                    if startSess == endSess:
-                        print('    + judgeAssign[{0},{1},t]'.format(evtIndex, startSess))
-                    else:
-                        print('    + (sum{{j in {1} .. {2}}} judgeAssign[{0},j,t])'.format(evtIndex, startSess, endSess))
+                    sessions.append((evtIndex, startSess, endSess))
 
-            print('    >= 1;')
-            index += 1
+            blocks.append(((startMatch, endMatch), sessions))
 
-        return
+        return blocks
 
-    def _handleFieldDistribution(self):
-        maxMatch = self.matchList.maxTeamMatchesPerFields
-        if maxMatch is None:
-            return
+    def _handleScheduleBlocks(self):
+        print()
+        print('# each team has a match or a judging session in each schedule block')
+        print('param nScheduleBlocks, integer, >= 0, default 0;')
+        print('set scheduleBlocks := 0 .. nScheduleBlocks - 1;')
+        print('param blockFirstMatch{b in scheduleBlocks}, integer;')
+        print('param blockLastMatch{b in scheduleBlocks}, integer;')
+        print('set blockSessions{b in scheduleBlocks}, dimen 2;')
+        print('s.t. scheduleBlock{b in scheduleBlocks, t in teams}:')
+        print('    ' + self._teamMatchSum('m in blockFirstMatch[b] .. blockLastMatch[b]'))
+        print('    + (sum{(en,j) in blockSessions[b]} judgeAssign[en,j,t])')
+        print('    >= 1;')
 
-        nMatches = len(self.matchList.matches)
-        nFields = sum([len(x) for x in self.matchList.tableNames])
+        return
 
+    def _handleFieldDistribution(self):
         print()
         print('# Add constraints to spread the teams across the different fields')
         print('#  Not required, and may slow down the model solving!!')
-        print('s.t. maxPerField{t in teams, sm in 1 .. %d}:' % nFields)
-        print('    (sum{{m in sm .. {} by {}, t2 in t+1 .. {}}} matchAssign[m,t,t2])'.format(nMatches, nFields, len(self.teams)))
-        print('    + (sum{{m in sm .. {} by {}, t2 in 1 .. t-1}} matchAssign[m,t2,t]) <= {};'.format(nMatches, nFields, maxMatch))
+        print('param nFields, integer, > 0;')
+        print('# 0: no limit')
+        print('param maxMatchesPerField, integer, >= 0, default 0;')
+        print('s.t. maxPerField{t in teams, sm in 1 .. nFields: maxMatchesPerField > 0}:')
+        print('    %s <= maxMatchesPerField;' % self._teamMatchSum('m in sm .. nMatches by nFields'))
 
         return
 
-    def _writeData(self):
+    def _writeSymmetryBreaking(self):
         print()
+        print('# optional symmetry breaking, see ScheduleModel.teamOrderWindows()')
+        print('# teams in order of their session in event orderEvent (0: none)')
+        print('param orderEvent, integer, >= 0, default 0;')
+        print('param orderSessions := if orderEvent > 0 then nJudgeSessions[orderEvent] else 0;')
+        print('param orderFirst{t in teams} := if orderEvent > 0 then ceil(t / judgeRooms[orderEvent]) else 1;')
+        print('param orderLast{t in teams} :=')
+        print('    if orderEvent > 0 then orderSessions + 1 - ceil((nTeams - t + 1) / judgeRooms[orderEvent]) else 0;')
+        print('s.t. teamOrder{t in teams: orderFirst[t] > 1 or orderLast[t] < orderSessions}:')
+        print('    sum{j in judgeSessions[orderEvent]: j < orderFirst[t] or j > orderLast[t]} judgeAssign[orderEvent,j,t] = 0;')
+        if not self.slotModel:
+            print('# m and m+1 are interchangeable: order them by their lowest team, empty first')
+            print('set orderedMatches within matches, default {};')
+            print('s.t. matchOrder{m in orderedMatches}:')
+            print('    sum{t1 in teams, t2 in t1+1 .. maxTeams} (t1 + 1) * matchAssign[m,t1,t2] <=')
+            print('    sum{t1 in teams, t2 in t1+1 .. maxTeams} t1 * matchAssign[m+1,t1,t2];')
+
+        return
+
+    def writeData(self):
+        '''GMPL data section for the model from writeModel()'''
+
+        print()
+        print('# Data created', datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         print('data;')
+        print('param nTeams := {};'.format(len(self.teams)))
+        print('param dummyTeam := {};'.format(int(self.matchList.dummyTeam)))
+        print('param nMatches := {};'.format(len(self.matchList.matches)))
+        print('param gamesPerTeam := {};'.format(self.matchList.nGamesPerTeam))
+        print('param nJudgeEvents := {};'.format(len(self.judgeEvents)))
+        cliques = self.locationCliques()
+        print('param nCliques := {};'.format(len(cliques)))
+        print('param nFields := {};'.format(sum([len(x) for x in self.matchList.tableNames])))
+        if self.matchList.maxTeamMatchesPerFields is not None:
+            print('param maxMatchesPerField := {};'.format(self.matchList.maxTeamMatchesPerFields))
+
+        print('param judgeRooms :=')
+        print(',\n'.join(['     {} {}'.format(event.index, len(event.rooms)) for event in self.judgeEvents.values()]) + ';')
 
         print('param nJudgeSessions :=')
         first = True
@@ -852,6 +1062,26 @@ class ScheduleModel(object):
             first = False
         print(';')
 
+        if self.scheduleBlocks is not None:
+            blocks = self.scheduleBlockRanges()
+            # a block with no matches in it gets the empty match range 1 .. 0
+            ranges = [(1, 0) if startMatch is None else (startMatch, endMatch) for (startMatch, endMatch), sessions in blocks]
+            print('param nScheduleBlocks := {};'.format(len(blocks)))
+            print('param blockFirstMatch := {};'.format(', '.join(['{} {}'.format(i, r[0]) for i, r in enumerate(ranges)])))
+            print('param blockLastMatch := {};'.format(', '.join(['{} {}'.format(i, r[1]) for i, r in enumerate(ranges)])))
+            for index, ((startMatch, endMatch), sessions) in enumerate(blocks):
+                print('set blockSessions[{}] :='.format(index), end='')
+                for evtIndex, startSess, endSess in sessions:
+                    print(''.join([' ({},{})'.format(evtIndex, j) for j in range(startSess, endSess + 1)]), end='')
+                print(';')
+
+        if self.symmetryBreaking:
+            orderEvent, windows = self.teamOrderWindows()
+            if orderEvent is not None:
+                print('param orderEvent := {};'.format(orderEvent))
+            if not self.slotModel:
+                print('set orderedMatches :={};'.format(''.join([' {}'.format(m) for m in self.orderedMatches()])))
+
         if self.hasJudgePenalty:
             print('param judgePenalties :=')
             first = True
@@ -875,30 +1105,10 @@ class ScheduleModel(object):
         #     #         first = False
         #     print(';')
 
-        print('param judgeEventTimes :=')
-        first = True
-        commentStr = ''
-        for name, event in self.judgeEvents.items():
-            for s in event.sessions:
-                for t in s.timeBlockRange(padded=True):
-                    if not first:
-                        print(',  # %s' % commentStr)
-                    print("      [%d,%d,%d] 1" % (event.index, s.index, t), end='')
-                    commentStr = str(TimeSlot.timeBlockBoundaries[t])
-                    first = False
-        print(';  # %s' % commentStr)
-
-        print('param matchTimes :=')
-        first = True
-        commentStr = ''
-        for match in self.matchList.matches:
-            for t in match.timeBlockRange(padded=True):
-                if not first:
-                    print(',  # %s' % commentStr)
-                print("      [%d,%d] 1" % (match.index, t), end='')
-                commentStr = str(TimeSlot.timeBlockBoundaries[t])
-                first = False
-        print(';  # %s' % commentStr)
+        for c, (tm, sessions, matches) in enumerate(cliques, 1):
+            print('set cliqueSessions[{}] :={};  # {}'.format(c, ''.join([' ({},{})'.format(en, j) for en, j in sessions]),
+                                                         self.clock.format(self.clock.timeBlockBoundaries[tm])))
+            print('set cliqueMatches[{}] :={};'.format(c, ''.join([' {}'.format(m) for m in matches])))
 
         print('end;')
 
@@ -914,10 +1124,18 @@ class ScheduleModel(object):
         return
 
     def formatOutput(self, outputBase, results):
-        with open(results) as infile:
+        with self.openResults(results) as infile:
             self.readResults(infile)
 
-        self.minimizeDuplicateTables()
+        self.writeOutput(outputBase)
+        return
+
+    def writeOutput(self, outputBase, assignSides=True):
+        '''Write the CSV files for an assigned schedule.
+        assignSides: pick the table sides, rather than keep the ones in the matches.'''
+
+        if assignSides:
+            self.minimizeDuplicateTables()
 
         fname = '{}_matches.csv'.format(outputBase)
         with open(fname, 'w') as outfile:
@@ -943,50 +1161,180 @@ class ScheduleModel(object):
         print('Total duplicate tables =', totalDuplicateTables)
         return
 
-    def readResults(self, infile):
-        while 1:
+    @staticmethod
+    def openResults(fname):
+        '''Open a solution file for readResults(), gzip'd or not'''
+        with open(fname, 'rb') as infile:
+            magic = infile.read(2)
+        if magic == b'\x1f\x8b':
+            return gzip.open(fname, 'rt')
+        return open(fname)
+
+    @classmethod
+    def resultsStatus(cls, fname):
+        '''Status of a solution file: its first line, up to the objective value'''
+        with cls.openResults(fname) as infile:
             line = infile.readline()
-            if not line:
+        return line.split(' - objective value')[0].strip()
+
+    @staticmethod
+    def statusHasSolution(status):
+        '''CBC writes a solution when optimal, or when stopped after finding one (writeSolution() says Feasible)'''
+        if status.startswith(('Optimal', 'Feasible')):
+            return True
+        return status.startswith('Stopped') and 'no integer solution' not in status
+
+    def readGoodResults(self, fname):
+        '''Read a solution file if it has a solution and the schedule passes checkSchedule().
+        Returns True if so, otherwise the model is left with no schedule.'''
+
+        status = self.resultsStatus(fname)
+        if not self.statusHasSolution(status):
+            print('{}: {}, no schedule'.format(fname, status), file=sys.stderr)
+            return False
+        with self.openResults(fname) as infile:
+            self.readResults(infile)
+        if not checkSchedule(self):
+            self.clearSchedule()
+            return False
+        return True
+
+    def readResults(self, infile, chunkSize=1 << 20):
+        '''Read the nonzero assignments from a solution file, in big chunks'''
+
+        matches = self.matchList.matches
+        sessions = {(e.index, s.index): s for e in self.judgeEvents.values() for s in e.sessions}
+
+        carry = ''
+        while True:
+            chunk = infile.read(chunkSize)
+            buf = carry + chunk
+            if chunk:
+                # an entry can wrap onto the next line, so hold back the last 2 lines
+                split = buf.rfind('\n', 0, max(0, buf.rfind('\n')))
+                if split < 0:
+                    carry = buf
+                    continue
+            else:
+                split = len(buf)
+
+            for kind, expr in self.resultExprs:
+                for m in expr.finditer(buf):
+                    if m.start() >= split:
+                        break
+                    i1, i2, i3, val = m.groups()
+                    if float(val) < 0.5:
+                        continue
+
+                    if kind == 'match':
+                        # match assignment
+                        match = matches[int(i1) - 1]
+                        match.assignTeam(self.findTeam(int(i2)))
+                        match.assignTeam(self.findTeam(int(i3)))
+                    elif kind == 'slot':
+                        # match slot assignment
+                        matches[int(i1) - 1].assignTeam(self.findTeam(int(i3)), int(i2) - 1)
+                    else:
+                        # judge assignment
+                        sessions[(int(i1), int(i2))].assignTeam(self.findTeam(int(i3)))
+
+            if not chunk:
                 break
+            carry = buf[split:]
+        return
 
-            if re.match(r'^\s*[0-9]+ (matchAssign|judgeAssign)\[.*\]\s*$', line):
-                # line must be continued
-                line2 = infile.readline()
-                line += line2
-
-            #   14914 matchAssign[50,7,17]                1                       0
-            m = re.search(ScheduleModel.modelLineExpr, line)
-            if m:
-                if m.group('type') == 'match':
-                    # match assignment
-                    val = int(m.group('val'))
-                    if val:
-                        match = self.findMatch(int(m.group('i1')))
-                        match.assignTeam(self.findTeam(int(m.group('i2'))))
-                        match.assignTeam(self.findTeam(int(m.group('i3'))))
-                else:
-                    # judge assignment
-                    val = int(m.group('val'))
-                    if val:
-                        evtInd = int(m.group('i1'))
-                        sessInd = int(m.group('i2'))
-                        session = self.findJudgeEvent(evtInd).findSession(sessInd)
-                        session.assignTeam(self.findTeam(int(m.group('i3'))))
+    def writeSolution(self, outfile):
+        '''Write the assigned schedule in the CBC solution layout, nonzeros only, for readResults().
+        Matches are written as slotAssign, which keeps the table sides.'''
 
+        penalty = 0
+        for event in self.judgeEvents.values():
+            for sess in event.sessions:
+                penalty += sess.penalty * sum([1 for t in sess.teams if t is not None])
+        outfile.write('Feasible - objective value {}\n'.format(penalty))
+
+        index = 0
+        for match in self.matchList.matches:
+            for s, t in enumerate(match.teams):
+                if t is not None and t.index <= len(self.teams):
+                    outfile.write('{} slotAssign[{},{},{}] 1\n'.format(index, match.index, s + 1, t.index))
+                    index += 1
+        for event in self.judgeEvents.values():
+            for sess in event.sessions:
+                for t in sess.teams:
+                    if t is not None:
+                        outfile.write('{} judgeAssign[{},{},{}] 1\n'.format(index, event.index, sess.index, t.index))
+                        index += 1
         return
 
-    def minimizeDuplicateTables(self):
-        dopass = True
-        while dopass:
-            dopass = False
-            cnt = 0
-            for team in self.teams:
-                cnt += team.countDuplicateTables()
-                if team.minimizeDuplicateTables():
-                    dopass = True
-            print("Minimize dup tables: total =", cnt)
+    def writeMipStart(self, outfile):
+        '''Write the assigned schedule as a CBC MIP start.
+
+        This is the same layout as the CBC solution file, and the names match the GMPL model.'''
+
+        nTeams = len(self.teams)
+        maxTeams = self._maxTeams()
+
+        penalty = 0
+        for event in self.judgeEvents.values():
+            for sess in event.sessions:
+                penalty += sess.penalty * sum([1 for t in sess.teams if t is not None])
+        outfile.write('Feasible - objective value {}\n'.format(penalty))
+
+        index = 0
+        for match in self.matchList.matches:
+            inMatch = [t.index for t in match.teams if t is not None]
+            if self.slotModel:
+                for s in range(2):
+                    t = match.teams[s]
+                    for t1 in range(1, nTeams + 1):
+                        val = 1 if t is not None and t.index == t1 else 0
+                        outfile.write('{} slotAssign[{},{},{}] {}\n'.format(index, match.index, s + 1, t1, val))
+                        index += 1
+            else:
+                if len(inMatch) == 1:
+                    inMatch.append(maxTeams)    # dummy team
+                for t1 in range(1, nTeams + 1):
+                    for t2 in range(t1 + 1, maxTeams + 1):
+                        val = 1 if t1 in inMatch and t2 in inMatch else 0
+                        outfile.write('{} matchAssign[{},{},{}] {}\n'.format(index, match.index, t1, t2, val))
+                        index += 1
+
+        for event in self.judgeEvents.values():
+            for sess in event.sessions:
+                inSess = set([t.index for t in sess.teams if t is not None])
+                for t in range(1, nTeams + 1):
+                    val = 1 if t in inSess else 0
+                    outfile.write('{} judgeAssign[{},{},{}] {}\n'.format(index, event.index, sess.index, t, val))
+                    index += 1
+        return
+
+    def clearSchedule(self):
+        '''Remove all team assignments'''
+
+        for team in self.teams:
+            team.schedule = []
+        for match in self.matchList.matches:
+            match.teams = [None, None]
+        for event in self.judgeEvents.values():
+            for sess in event.sessions:
+                sess.teams = len(event.rooms) * [None, ]
         return
 
+    def clearJudging(self):
+        '''Remove the judge session assignments, and keep the matches'''
+
+        for team in self.teams:
+            team.schedule = [e for e in team.schedule if not isinstance(e[0], JudgeSession)]
+        for event in self.judgeEvents.values():
+            for sess in event.sessions:
+                sess.teams = len(event.rooms) * [None, ]
+        return
+
+    def minimizeDuplicateTables(self):
+        '''Pick the table sides of all the matches (see tableSides.py)'''
+        return TableSideAssigner(self).solve()
+
     def assignFakeSchedule(self):
         it = 0
         nt = len(self.teams)
@@ -1004,17 +1352,70 @@ class ScheduleModel(object):
                         it += 1
         return
 
+
+def checkSchedule(model):
+    '''Print any problems with the assigned schedule'''
+    from occupancy import OccupancyIndex
+
+    problems = OccupancyIndex(model).validate()
+    for p in problems:
+        print('Check:', p, file=sys.stderr)
+    print('Schedule check: {} problem(s)'.format(len(problems)), file=sys.stderr)
+    return len(problems) == 0
+
 # ====================================================================================================
 
 
 if __name__ == '__main__':
     import argparse
 
+    # the solver modules import their classes from schedulingModel: make that this module,
+    # so that isinstance() works on the model built here
+    sys.modules['schedulingModel'] = sys.modules['__main__']
+
     parser = argparse.ArgumentParser(description='FLL Schedule creater')
     parser.add_argument('-b', '--build', action='store_true', help='Build model file')
+    parser.add_argument('--data-only', action='store_true',
+                        help='-b: only the data section, for the shipped fllschedule.mod (or fllschedule_slots.mod with -s)')
+    parser.add_argument('--model-only', action='store_true', help='-b: only the model section (regenerates fllschedule.mod)')
+    parser.add_argument('--write', metavar='FILE',
+                        help='Build the model straight to free MPS or CPLEX LP (by extension: .mps, .lp, optionally .gz; CBC needs zlib for .gz), without GMPL')
     parser.add_argument('-o', '--output', help='Formatted output base name')
     parser.add_argument('-m', '--matches', action='store_true', help='Output (empty) match schedule')
     parser.add_argument('-j', '--judging', action='store_true', help='Output (empty) judge schedule')
+    parser.add_argument('-s', '--slots', action='store_true',
+                        help='Use the slot-based match model (build and output). Fewer binaries than the pair model, but many '
+                        'more rows and columns: a continuous pairAssign and a pairLink row per match and pair of teams '
+                        '(see --stats). --engine lazy only adds those for the pairs which play twice')
+    parser.add_argument('--symmetry', action='store_true',
+                        help='Add symmetry breaking orderings on the teams and matches (models, and the mip, lazy and decomp engines)')
+    parser.add_argument('--solve', action='store_true', help='Build and solve the model in-process (needs -o)')
+    parser.add_argument('--engine', choices=('mip', 'lazy', 'cpsat', 'decomp', 'anneal', 'pairing'), default='mip',
+                        help='Engine for --solve (default mip). lazy adds the rematches and teamLocation rows as they are violated. '
+                        'decomp solves judging first, then the matches. '
+                        'anneal is a local search for big events (Ctrl-C keeps the best so far). '
+                        'pairing places round robin rounds in the matches, without a solver; that only works on loose schedules, '
+                        'otherwise it falls back to the constructive heuristic')
+    parser.add_argument('--solver', help='PuLP solver name for --solve (default CBC)')
+    parser.add_argument('--time-limit', type=int, help='Solver time limit (seconds)')
+    parser.add_argument('--threads', type=int, help='Solver threads (CP-SAT workers, default 8)')
+    parser.add_argument('--mipstart', metavar='FILE',
+                        help='Construct a schedule heuristically and write it as a CBC MIP start (with -b or --solve). '
+                        '--solve also warm starts from it (mip and lazy engines)')
+    parser.add_argument('--stats', action='store_true', help='Print the model size per constraint family, and the estimated MPS size and CBC memory')
+    parser.add_argument('--max-memory', type=float, metavar='GB', help='Refuse to build or solve a model whose estimated CBC root node memory is over this')
+    parser.add_argument('--preflight', action='store_true',
+                        help='Check the config for impossible match, judging, travel and schedule block demands, and exit (--solve always checks first)')
+    parser.add_argument('--check', action='store_true', help='Check the schedule (overlaps, travel, rematches, blocks) before output')
+    parser.add_argument('--drop', type=int, nargs='+', metavar='NUM', help='Repair the schedule in resultfile: remove these team numbers (needs -o)')
+    parser.add_argument('--add', action='append', metavar='NUM:NAME', help='Repair the schedule in resultfile: add a team (needs -o, can repeat)')
+    parser.add_argument('--keep-sides', action='store_true',
+                        help='Repair: resultfile has the final table sides (a previous repair\'s _solution.txt)')
+    parser.add_argument('--rejudge', action='store_true',
+                        help='Keep the matches of the schedule in resultfile and redo the judging as min cost flows (needs -o)')
+    parser.add_argument('--cache', metavar='DIR', help='Cache models and solutions by config hash in DIR')
+    parser.add_argument('--cache-size', type=int, default=500, help='Cache size limit in MB (default 500)')
+    parser.add_argument('--cache-age', type=int, default=30, help='Cache age limit in days (default 30)')
     parser.add_argument('configfile', help='Config file (python)')
     parser.add_argument('resultfile', nargs='?', help='Model result file')
 
@@ -1028,14 +1429,81 @@ if __name__ == '__main__':
     # seed the random generator
     seed()
 
-    model = ScheduleModel(config)
+    if args.solve and args.mipstart and args.engine not in ('mip', 'lazy'):
+        parser.error('--mipstart only warm starts the mip and lazy engines')
+    if args.symmetry and args.mipstart:
+        parser.error('--mipstart does not work with --symmetry: the constructed schedule does not follow the orderings')
+    model = ScheduleModel(config, slotModel=args.slots, symmetryBreaking=args.symmetry)
 
     # for e in model.judgeEvents['Judging'].subSchedule.items():
     #     print(e)
     # sys.exit(1)
 
-    if args.build:
-        model.writeModel()
+    cache = None
+    if args.cache:
+        from modelCache import ModelCache
+
+        cache = ModelCache(args.cache, maxMB=args.cache_size, maxDays=args.cache_age)
+        cacheKey = cache.configKey(config)
+
+    if args.preflight or args.solve:
+        from preflight import Preflight
+
+        preflight = Preflight(model)
+        problems = preflight.check()
+        if args.preflight:
+            preflight.report()
+            sys.exit(2 if problems else 0)
+        if problems:
+            preflight.report(sys.stderr)
+            print('The config cannot be scheduled, not solving', file=sys.stderr)
+            sys.exit(2)
+
+    if args.stats or args.max_memory:
+        from modelStats import ModelStats
+
+        stats = ModelStats(model)
+        if args.stats:
+            stats.report()
+        if args.max_memory and stats.memoryBytes() > args.max_memory * 1e9:
+            print('Model needs about {:.1f} GB for CBC, over the {} GB limit'.format(stats.memoryBytes() / 1e9, args.max_memory),
+                  file=sys.stderr)
+            sys.exit(2)
+        if args.stats:
+            sys.exit(0)
+
+    if args.build or args.write:
+        if args.write:
+            from mpsWriter import MPSWriter
+
+            writer = MPSWriter(model)
+            rows, cols, nz = writer.build()
+            writer.write(args.write)
+            print('Wrote {}: {} rows, {} columns, {} nonzeros'.format(args.write, rows, cols, nz), file=sys.stderr)
+        elif args.model_only:
+            model.writeModel(data=False)
+        elif args.data_only:
+            model.writeData()
+        elif cache is None:
+            model.writeModel()
+        else:
+            modelName = '{}{}.mod'.format('model_slots' if args.slots else 'model', '_sym' if args.symmetry else '')
+            cached = cache.get(cacheKey, modelName)
+            if cached is None:
+                buf = io.StringIO()
+                with contextlib.redirect_stdout(buf):
+                    model.writeModel()
+                cached = cache.put(cacheKey, modelName, buf.getvalue())
+            else:
+                print('Using cached model', cached, file=sys.stderr)
+            with open(cached) as infile:
+                shutil.copyfileobj(infile, sys.stdout)
+        if args.mipstart:
+            from heuristics import ConstructiveScheduler
+
+            if ConstructiveScheduler(model).build():
+                with open(args.mipstart, 'w') as outfile:
+                    model.writeMipStart(outfile)
 
     elif args.matches:
         model.assignFakeSchedule()
@@ -1045,8 +1513,140 @@ if __name__ == '__main__':
         model.assignFakeSchedule()
         model.outputJudging()
 
+    elif args.solve:
+        if not args.output:
+            parser.error('--solve needs an output base name (-o)')
+
+        cached = None
+        if cache is not None:
+            cached = cache.get(cacheKey, 'solution.txt')
+            if cached is not None and not model.readGoodResults(cached):
+                print('Not using cached schedule', cached, file=sys.stderr)
+                cached = None
+        if cached is not None:
+            print('Using cached schedule', cached, file=sys.stderr)
+        else:
+            if args.engine == 'cpsat':
+                from cpsatSolver import CPSATSolver
+
+                solver = CPSATSolver(model)
+                found = solver.solve(timeLimit=args.time_limit, workers=args.threads)
+            elif args.engine == 'decomp':
+                from decomposition import DecomposedSolver
+
+                solver = DecomposedSolver(model)
+                found = solver.solve(timeLimit=args.time_limit, threads=args.threads, solverName=args.solver)
+            elif args.engine == 'anneal':
+                from localSearch import AnnealingScheduler
+
+                solver = AnnealingScheduler(model)
+                found = solver.run(timeLimit=args.time_limit or 300)
+            elif args.engine == 'pairing':
+                from pairings import PairingScheduler
+
+                solver = PairingScheduler(model)
+                found = solver.solve(timeLimit=args.time_limit)
+            else:
+                if args.engine == 'lazy':
+                    from lazySolver import LazySolver
+
+                    solver = LazySolver(model)
+                else:
+                    from mipSolver import MIPSolver
+
+                    solver = MIPSolver(model)
+                if args.mipstart:
+                    from heuristics import ConstructiveScheduler
+
+                    if ConstructiveScheduler(model).build():
+                        with open(args.mipstart, 'w') as outfile:
+                            model.writeMipStart(outfile)
+                        solver.setInitialValues()
+                        model.clearSchedule()
+                found = solver.solve(timeLimit=args.time_limit, threads=args.threads, solverName=args.solver)
+            if not found:
+                print('No solution found', file=sys.stderr)
+                sys.exit(1)
+            solver.assignResults()
+            if cache is not None:
+                buf = io.StringIO()
+                model.writeSolution(buf)
+                cache.put(cacheKey, 'solution.txt', buf.getvalue())
+        if args.check:
+            checkSchedule(model)
+        model.writeOutput(args.output)
+
+    elif args.drop or args.add:
+        from repair import ScheduleRepairer
+
+        if not args.output or not args.resultfile:
+            parser.error('--drop/--add need the existing schedule (resultfile) and -o')
+        with model.openResults(args.resultfile) as infile:
+            model.readResults(infile)
+        if not args.keep_sides:
+            # the same sides as the printed schedule
+            model.minimizeDuplicateTables()
+
+        repairer = ScheduleRepairer(model)
+        if args.drop:
+            repairer.dropTeams(args.drop)
+        if args.add:
+            newTeams = []
+            for a in args.add:
+                num, name = a.split(':', 1)
+                newTeams.append(Team(0, int(num), name))
+            repairer.addTeams(newTeams)
+        if not repairer.solve(timeLimit=args.time_limit or 5):
+            sys.exit(1)
+
+        # to repair again later: the new config and solution, with --keep-sides
+        with open('{}_solution.txt'.format(args.output), 'w') as outfile:
+            model.writeSolution(outfile)
+        with open(args.configfile) as infile, open('{}_config.py'.format(args.output), 'w') as outfile:
+            outfile.write(infile.read())
+            outfile.write('\n# repaired: dropped teams have nothing scheduled, new teams are at the end\n')
+            outfile.write('teams = (\n')
+            for team in model.teams:
+                outfile.write('    {!r},\n'.format((team.teamNumber, team.name)))
+            outfile.write(')\n')
+            # keep the same matches and judge sessions
+            outfile.write('layoutTeams = {}\n'.format(model.layoutTeams))
+
+        repairer.removeDropped()
+        if args.check:
+            checkSchedule(model)
+        model.writeOutput(args.output, assignSides=False)
+
+    elif args.rejudge:
+        from judgingFlow import JudgingFlow
+
+        if not args.output or not args.resultfile:
+            parser.error('--rejudge needs the existing schedule (resultfile) and -o')
+        with model.openResults(args.resultfile) as infile:
+            model.readResults(infile)
+        judging = JudgingFlow(model)
+        if not judging.solve():
+            sys.exit(1)
+        judging.assignResults()
+        if args.check:
+            checkSchedule(model)
+        model.writeOutput(args.output)
+
     elif args.output:
-        model.formatOutput(args.output, args.resultfile)
+        if cache is not None:
+            # an external solve (go.sh) of this config, only kept if it is a good schedule
+            if model.readGoodResults(args.resultfile):
+                cache.put(cacheKey, 'solution.txt', srcFile=args.resultfile)
+            else:
+                print('Not caching', args.resultfile, file=sys.stderr)
+            model.clearSchedule()
+        if args.check:
+            with model.openResults(args.resultfile) as infile:
+                model.readResults(infile)
+            checkSchedule(model)
+            model.writeOutput(args.output)
+        else:
+            model.formatOutput(args.output, args.resultfile)
 
     else:
         parser.print_help()
@@ -0,0 +1,192 @@
+'''Choose the table side of each team in each match, to minimize duplicate tables.
+
+With the pairings fixed, each match only has a choice of "as is" or "swapped". A team
+which plays k >= 2 times on the same table has at least k - 2 duplicates, plus one more
+if all k are on the same side. So each (team, table) group just wants to use both
+sides, which is a parity condition between the matches in the group.
+
+The matches split into independent components. Most components can meet every parity
+condition, and a walk through the component sets all the sides (this is exact). The
+others get a tiny IP with PuLP, if it is installed, and otherwise greedy flips.'''
+
+import sys
+
+
+class TableSideAssigner(object):
+    def __init__(self, model):
+        self.model = model
+        self.matches = [m for m in model.matchList.matches if m.teams != [None, None]]
+
+        # (team index, table) -> list of (match index, slot of the team), for teams on a table 2+ times
+        groups = {}
+        for match in self.matches:
+            for slot, team in enumerate(match.teams):
+                if team is None:
+                    continue
+                groups.setdefault((team.index, match.table), []).append((match.index, slot))
+        self.groups = [g for g in groups.values() if len(g) > 1]
+
+        # match -> groups it is in
+        self.matchGroups = {}
+        for gi, grp in enumerate(self.groups):
+            for m, slot in grp:
+                self.matchGroups.setdefault(m, []).append(gi)
+
+        # incremental counters: per group, number of members on side 1 (table "... 1")
+        self.flip = {}
+        self.side1 = [0] * len(self.groups)
+        self.proven = True
+        return
+
+    def solve(self):
+        '''Find the best sides, and swap the teams in the matches to suit.
+        Returns the number of duplicate tables.'''
+
+        self.flip = {match.index: 0 for match in self.matches}
+        for component in self._components():
+            self._propagate(component)
+            if self._cost(component) > self._lowerBound(component):
+                if not self._solveIP(component):
+                    self._greedy(component)
+                    self.proven = False
+
+        model = self.model
+        for m, f in self.flip.items():
+            if f:
+                model.findMatch(m).swapTeams()
+
+        total = self.duplicates()
+        print('Table sides: {} duplicate tables{}'.format(total, ' (optimal)' if self.proven else ''), file=sys.stderr)
+        return total
+
+    def duplicates(self, groups=None):
+        '''Duplicate tables for the current sides (all groups, or the given ones)'''
+        if groups is None:
+            groups = range(len(self.groups))
+        total = 0
+        for gi in groups:
+            k = len(self.groups[gi])
+            s1 = self.side1[gi]
+            total += max(0, s1 - 1) + max(0, k - s1 - 1)
+        return total
+
+    # ----------------------------------------------------------------------------------------------------
+
+    def _components(self):
+        '''Groups of matches linked through the (team, table) groups'''
+        seen = set()
+        for m in sorted(self.matchGroups):
+            if m in seen:
+                continue
+            comp = []
+            todo = [m]
+            seen.add(m)
+            while todo:
+                m1 = todo.pop()
+                comp.append(m1)
+                for gi in self.matchGroups[m1]:
+                    for m2, slot in self.groups[gi]:
+                        if m2 not in seen:
+                            seen.add(m2)
+                            todo.append(m2)
+            yield comp
+        return
+
+    def _onSide1(self, m, slot):
+        return (slot ^ self.flip[m]) == 1
+
+    def _setFlip(self, m, value):
+        '''Set the flip of match m, keeping the group counters up to date'''
+        if self.flip[m] == value:
+            return
+        for gi in self.matchGroups[m]:
+            for m2, slot in self.groups[gi]:
+                if m2 == m:
+                    self.side1[gi] += -1 if self._onSide1(m, slot) else 1
+        self.flip[m] = value
+        return
+
+    def _groupsOf(self, component):
+        return sorted(set([gi for m in component for gi in self.matchGroups[m]]))
+
+    def _cost(self, component):
+        return self.duplicates(self._groupsOf(component))
+
+    def _lowerBound(self, component):
+        return sum([len(self.groups[gi]) - 2 for gi in self._groupsOf(component)])
+
+    def _propagate(self, component):
+        '''Walk the component, putting each team on the side it has used least on that table'''
+
+        for gi in self._groupsOf(component):
+            self.side1[gi] = sum([1 for m, slot in self.groups[gi] if self._onSide1(m, slot)])
+
+        placed = set()
+        for start in component:
+            if start in placed:
+                continue
+            placed.add(start)
+            todo = [start]
+            while todo:
+                m1 = todo.pop()
+                for gi in self.matchGroups[m1]:
+                    for m2, slot in self.groups[gi]:
+                        if m2 in placed:
+                            continue
+                        placed.add(m2)
+                        # count the placed members of each group this match is in, with both choices
+                        costs = []
+                        for f in (0, 1):
+                            self._setFlip(m2, f)
+                            costs.append(self._placedCost(m2, placed))
+                        self._setFlip(m2, 0 if costs[0] <= costs[1] else 1)
+                        todo.append(m2)
+        return
+
+    def _placedCost(self, m, placed):
+        cost = 0
+        for gi in self.matchGroups[m]:
+            members = [(m2, slot) for m2, slot in self.groups[gi] if m2 in placed]
+            s1 = sum([1 for m2, slot in members if self._onSide1(m2, slot)])
+            cost += max(0, s1 - 1) + max(0, len(members) - s1 - 1)
+        return cost
+
+    def _greedy(self, component):
+        '''Flip single matches while it helps'''
+        improved = True
+        while improved:
+            improved = False
+            for m in component:
+                before = self.duplicates(self.matchGroups[m])
+                self._setFlip(m, 1 - self.flip[m])
+                if self.duplicates(self.matchGroups[m]) < before:
+                    improved = True
+                else:
+                    self._setFlip(m, 1 - self.flip[m])
+        return
+
+    def _solveIP(self, component):
+        '''Exact sides for a component which cannot meet every parity condition'''
+
+        try:
+            import pulp
+        except ImportError:
+            return False
+
+        prob = pulp.LpProblem('tableSides', pulp.LpMinimize)
+        x = {m: pulp.LpVariable('flip_{}'.format(m), cat=pulp.LpBinary) for m in component}
+        groups = self._groupsOf(component)
+        y = {gi: pulp.LpVariable('oneSide_{}'.format(gi), lowBound=0) for gi in groups}
+        prob += pulp.lpSum(y.values())
+        for gi in groups:
+            # number on side 1: slot 0 moves there when flipped, slot 1 stays unless flipped
+            side1 = pulp.lpSum(x[m] if slot == 0 else 1 - x[m] for m, slot in self.groups[gi])
+            prob += y[gi] >= 1 - side1
+            prob += y[gi] >= 1 - (len(self.groups[gi]) - side1)
+
+        prob.solve(pulp.PULP_CBC_CMD(msg=False))
+        if prob.status != pulp.LpStatusOptimal:
+            return False
+        for m in component:
+            self._setFlip(m, 1 if x[m].varValue > 0.5 else 0)
+        return True